@@ -12,20 +12,41 @@
 
 # In[1]:
 
-import unicodecsv
-
-## Longer version of code (replaced with shorter, equivalent version below)
-
-# enrollments = []
-# f = open('enrollments.csv', 'rb')
-# reader = unicodecsv.DictReader(f)
-# for row in reader:
-#     enrollments.append(row)
-# f.close()
-
-with open('enrollments.csv', 'rb') as f:
-    reader = unicodecsv.DictReader(f)
-    enrollments = list(reader)
+import os
+from l1_analysis.cache import load_cleaned_tables
+
+# Set L1_PROFILE=1 to get the time, CPU time, rows and memory of every stage
+# of the run (marked with stage() blocks and @instrumented functions below)
+# printed at the end; see l1_analysis/instrument.py. Off, they cost nothing.
+from l1_analysis.instrument import instrumented, stage
+
+## Longer version of code (replaced with the columnar loader below)
+
+# import unicodecsv
+# with open('enrollments.csv', 'rb') as f:
+#     reader = unicodecsv.DictReader(f)
+#     enrollments = list(reader)
+
+# The loader parses each table in one pass straight into typed NumPy columns,
+# and hands out dict-like rows, so enrollments[0]['join_date'] still works.
+# The cleaned tables are cached in .l1_cache/ as .npy column files, so only the
+# first run (or the first run after one of the CSVs changes) parses the CSVs;
+# later runs memory-map the cached columns.
+# (uncached: enrollments = l1_analysis.columnar.load_enrollments('enrollments.csv'))
+# With L1_PROCESSES set to more than 1, the CSVs are parsed by that many worker
+# processes at once (see l1_analysis/ingest.py).
+# With L1_SAMPLE set (e.g. to 0.1), only the rows of that fraction of the
+# accounts are loaded, the same accounts in every table and every run (see
+# l1_analysis/sampling.py); counts below are then about that fraction of the
+# full counts.
+from l1_analysis.sampling import sample_from_environment
+sample = sample_from_environment()
+if sample is not None:
+    print 'Using', sample.describe() + ': divide counts by', sample.fraction
+with stage('load_cleaned_tables'):
+    cleaned_tables = load_cleaned_tables('.', processes=int(os.environ.get('L1_PROCESSES', '1')),
+                                         sample=sample)
+enrollments = cleaned_tables['enrollments']
 
 
 # In[2]:
@@ -37,12 +58,8 @@ with open('enrollments.csv', 'rb') as f:
 ## Read in the data from daily_engagement.csv and project_submissions.csv 
 ## and store the results in the below variables.
 ## Then look at the first row of each table.
-with open('daily_engagement.csv', 'rb') as f:
-    reader = unicodecsv.DictReader(f)
-    daily_engagement = list(reader)
-with open('project_submissions.csv', 'rb') as f:
-    reader = unicodecsv.DictReader(f)
-    project_submissions = list(reader)
+daily_engagement = cleaned_tables['daily_engagement']
+project_submissions = cleaned_tables['project_submissions']
 
 print "enrollments\n", enrollments[0]
 print
@@ -59,11 +76,13 @@ from datetime import datetime as dt
 
 # Takes a date as a string, and returns a Python datetime object. 
 # If there is no date given, returns None
-def parse_date(date):
-    if date == '':
-        return None
-    else:
-        return dt.strptime(date, '%Y-%m-%d')
+# (replaced by the cached, strptime-free version in l1_analysis/dates.py)
+# def parse_date(date):
+#     if date == '':
+#         return None
+#     else:
+#         return dt.strptime(date, '%Y-%m-%d')
+from l1_analysis.dates import parse_date
     
 # Takes a string which is either an empty string or represents an integer,
 # and returns an int or None.
@@ -74,12 +93,13 @@ def parse_maybe_int(i):
         return int(i)
 
 # Clean up the data types in the enrollments table
-for enrollment in enrollments:
-    enrollment['cancel_date'] = parse_date(enrollment['cancel_date'])
-    enrollment['days_to_cancel'] = parse_maybe_int(enrollment['days_to_cancel'])
-    enrollment['is_canceled'] = enrollment['is_canceled'] == 'True'
-    enrollment['is_udacity'] = enrollment['is_udacity'] == 'True'
-    enrollment['join_date'] = parse_date(enrollment['join_date'])
+# (now done by load_enrollments: see ENROLLMENT_TYPES in l1_analysis/columnar.py)
+# for enrollment in enrollments:
+#     enrollment['cancel_date'] = parse_date(enrollment['cancel_date'])
+#     enrollment['days_to_cancel'] = parse_maybe_int(enrollment['days_to_cancel'])
+#     enrollment['is_canceled'] = enrollment['is_canceled'] == 'True'
+#     enrollment['is_udacity'] = enrollment['is_udacity'] == 'True'
+#     enrollment['join_date'] = parse_date(enrollment['join_date'])
     
 enrollments[0]
 
@@ -87,12 +107,13 @@ enrollments[0]
 # In[4]:
 
 # Clean up the data types in the engagement table
-for engagement_record in daily_engagement:
-    engagement_record['lessons_completed'] = int(float(engagement_record['lessons_completed']))
-    engagement_record['num_courses_visited'] = int(float(engagement_record['num_courses_visited']))
-    engagement_record['projects_completed'] = int(float(engagement_record['projects_completed']))
-    engagement_record['total_minutes_visited'] = float(engagement_record['total_minutes_visited'])
-    engagement_record['utc_date'] = parse_date(engagement_record['utc_date'])
+# (now done by load_daily_engagement: see ENGAGEMENT_TYPES in l1_analysis/columnar.py)
+# for engagement_record in daily_engagement:
+#     engagement_record['lessons_completed'] = int(float(engagement_record['lessons_completed']))
+#     engagement_record['num_courses_visited'] = int(float(engagement_record['num_courses_visited']))
+#     engagement_record['projects_completed'] = int(float(engagement_record['projects_completed']))
+#     engagement_record['total_minutes_visited'] = float(engagement_record['total_minutes_visited'])
+#     engagement_record['utc_date'] = parse_date(engagement_record['utc_date'])
     
 daily_engagement[0]
 
@@ -100,14 +121,15 @@ daily_engagement[0]
 # In[5]:
 
 # Clean up the data types in the submissions table
-for submission in project_submissions:
-    submission['completion_date'] = parse_date(submission['completion_date'])
-    submission['creation_date'] = parse_date(submission['creation_date'])
+# (now done by load_project_submissions: see SUBMISSION_TYPES in l1_analysis/columnar.py)
+# for submission in project_submissions:
+#     submission['completion_date'] = parse_date(submission['completion_date'])
+#     submission['creation_date'] = parse_date(submission['creation_date'])
 
 project_submissions[0]
 
 
-# Note when running the above cells that we are actively changing the contents of our data variables. If you try to run these cells multiple times in the same session, an error will occur.
+# Note: the loader returns rows that already have the right types, so the above cells no longer change the contents of our data variables, and can safely be run multiple times in the same session.
 # 
 # ## Investigating the Data
 
@@ -119,6 +141,7 @@ project_submissions[0]
 
 ## Find the total number of rows and the number of unique students (account keys)
 ## in each table.
+@instrumented()
 def count_unique_id(data, key):
     # sets only add an item if its not already in there (unordered)
     unique_ids = set()
@@ -154,11 +177,13 @@ print submission_num_unique_students, "submission_num_unique_students"
 #####################################
 
 ## Rename the "acct" column in the daily_engagement table to "account_key".
-for row in daily_engagement:
-    if 'acct' in row:
-      val = row['acct']
-      row['account_key'] = val
-      del row['acct']
+# The columnar table renames the whole column at once, instead of editing every row dict.
+# for row in daily_engagement:
+#     if 'acct' in row:
+#       val = row['acct']
+#       row['account_key'] = val
+#       del row['acct']
+daily_engagement.rename_column('acct', 'account_key')
 print daily_engagement[0]
 
 
@@ -172,11 +197,24 @@ print daily_engagement[0]
 
 ## Find any one student enrollments where the student is missing from the daily engagement table.
 ## Output that enrollment.
-engaged_students = set()
-for engagement in daily_engagement:
-    engaged_students.add(engagement['account_key'])
+# engaged_students = set()
+# for engagement in daily_engagement:
+#     engaged_students.add(engagement['account_key'])
+
+# Groups of students are Cohorts: compressed bitmaps over the account key
+# codes, with vectorized set operations and row filters (see
+# l1_analysis/cohorts.py). "student in engaged_students" still works.
+from l1_analysis.cohorts import Cohort
+engaged_students = Cohort.from_column(daily_engagement)
+
+# The loops below go through the enrollments one at a time, so they get them
+# as compact, typed records with fixed fields (see l1_analysis/records.py),
+# made from the cached table.
+from l1_analysis.records import EnrollmentRecord, records_from_table
+records_from_table = instrumented('records_from_table')(records_from_table)
+enrollment_records = records_from_table(enrollments, EnrollmentRecord)
     
-for enrollment in enrollments:
+for enrollment in enrollment_records:
     student = enrollment['account_key']
     if student not in engaged_students:
         print student
@@ -198,15 +236,17 @@ print
 num_unengaged_students = 0
 num_unengaged_students_enrolled_at_least_1_day = 0
 unengaged_students_enrolled_at_least_1_day = []
-for enrollment in enrollments:
-    student = enrollment['account_key']
-    if student not in engaged_students:
-        num_unengaged_students += 1
-        if enrollment['join_date'] != enrollment['cancel_date']:
-            unengaged_students_enrolled_at_least_1_day.append(enrollment) 
-            num_unengaged_students_enrolled_at_least_1_day += 1
-            print student
-            print enrollment
+with stage('unengaged_students_loop', rows_in=len(enrollment_records)) as timing:
+    for enrollment in enrollment_records:
+        student = enrollment['account_key']
+        if student not in engaged_students:
+            num_unengaged_students += 1
+            if enrollment['join_date'] != enrollment['cancel_date']:
+                unengaged_students_enrolled_at_least_1_day.append(enrollment) 
+                num_unengaged_students_enrolled_at_least_1_day += 1
+                print student
+                print enrollment
+    timing.rows_out = num_unengaged_students
 print
 print num_unengaged_students, "students cancelled same day"
 print num_unengaged_students_enrolled_at_least_1_day, "enrolled at least one day"
@@ -217,10 +257,11 @@ print num_unengaged_students_enrolled_at_least_1_day, "enrolled at least one day
 # In[10]:
 
 # Create a set of the account keys for all Udacity test accounts
-udacity_test_accounts = set()
-for enrollment in enrollments:
-    if enrollment['is_udacity']:
-        udacity_test_accounts.add(enrollment['account_key'])
+# udacity_test_accounts = set()
+# for enrollment in enrollments:
+#     if enrollment['is_udacity']:
+#         udacity_test_accounts.add(enrollment['account_key'])
+udacity_test_accounts = Cohort.from_column(enrollments, rows=enrollments['is_udacity'])
 len(udacity_test_accounts)
 
 
@@ -228,19 +269,24 @@ len(udacity_test_accounts)
 
 # Given some data with an account_key field, removes any records corresponding to Udacity test accounts
 def remove_udacity_accounts(data):
-    non_udacity_data = []
-    for data_point in data:
-        if data_point['account_key'] not in udacity_test_accounts:
-            non_udacity_data.append(data_point)
-    return non_udacity_data
+    # non_udacity_data = []
+    # for data_point in data:
+    #     if data_point['account_key'] not in udacity_test_accounts:
+    #         non_udacity_data.append(data_point)
+    # return non_udacity_data
+    return udacity_test_accounts.drop(data)
 
 
 # In[12]:
 
 # Remove Udacity test accounts from all three tables
-non_udacity_enrollments = remove_udacity_accounts(enrollments)
-non_udacity_engagement  = remove_udacity_accounts(daily_engagement)
-non_udacity_submissions = remove_udacity_accounts(project_submissions)
+# (the cleaned tables already come without them, so this is read from the cache)
+# non_udacity_enrollments = remove_udacity_accounts(enrollments)
+# non_udacity_engagement  = remove_udacity_accounts(daily_engagement)
+# non_udacity_submissions = remove_udacity_accounts(project_submissions)
+non_udacity_enrollments = cleaned_tables['non_udacity_enrollments']
+non_udacity_engagement  = cleaned_tables['non_udacity_engagement']
+non_udacity_submissions = cleaned_tables['non_udacity_submissions']
 
 print len(non_udacity_enrollments)
 print len(non_udacity_engagement)
@@ -259,14 +305,27 @@ print len(non_udacity_submissions)
 ## haven't canceled yet or who remained enrolled for more than 7 days. The keys
 ## should be account keys, and the values should be the date the student enrolled.
 
-paid_students = {}
-for enrollment in non_udacity_enrollments:    
-    student = enrollment['account_key']
-    if (enrollment['is_canceled'] == False) or ((enrollment['cancel_date'] - enrollment['join_date']).days > 7) : 
-        date_enrolled = enrollment['join_date']
-        # if student enrolled more than once, save only the most recent enrollment date
-        if (student not in paid_students) or (date_enrolled > paid_students[student]):
-            paid_students[student] = date_enrolled
+# paid_students = {}
+# for enrollment in non_udacity_enrollments:    
+#     student = enrollment['account_key']
+#     if (enrollment['is_canceled'] == False) or ((enrollment['cancel_date'] - enrollment['join_date']).days > 7) : 
+#         date_enrolled = enrollment['join_date']
+#         # if student enrolled more than once, save only the most recent enrollment date
+#         if (student not in paid_students) or (date_enrolled > paid_students[student]):
+#             paid_students[student] = date_enrolled
+
+# Vectorized version of the loop above (see l1_analysis/first_week.py):
+# one array of paid account keys, and one of their most recent join dates.
+# The account keys are int32 codes (see l1_analysis/encoding.py): decode() turns
+# them back into the account key strings.
+from l1_analysis.dates import datetime_from_day
+from l1_analysis.first_week import find_paid_students
+
+with stage('filter', rows_in=len(non_udacity_enrollments)) as timing:
+    paid_accounts, paid_join_dates = find_paid_students(non_udacity_enrollments)
+    timing.rows_out = len(paid_accounts)
+paid_students = dict(zip(non_udacity_enrollments.decode('account_key', paid_accounts).tolist(),
+                         [datetime_from_day(day) for day in paid_join_dates]))
 print len(paid_students)
 
 
@@ -292,15 +351,30 @@ def within_one_week(join_date, engagement_date):
 ## the student is one of the paid students you just found, and 
 ## the date is within one week of the student's join date.
 
-paid_engagement_in_first_week = []
-paid_students_who_engaged_in_first_week = set()
-
-for engagement in non_udacity_engagement:
-    student = engagement['account_key']
-    if student in paid_students:
-        if within_one_week(paid_students[student], engagement['utc_date']):
-            paid_engagement_in_first_week.append(engagement)
-            paid_students_who_engaged_in_first_week.add(student)
+# paid_engagement_in_first_week = []
+# paid_students_who_engaged_in_first_week = set()
+#
+# for engagement in non_udacity_engagement:
+#     student = engagement['account_key']
+#     if student in paid_students:
+#         if within_one_week(paid_students[student], engagement['utc_date']):
+#             paid_engagement_in_first_week.append(engagement)
+#             paid_students_who_engaged_in_first_week.add(student)
+
+# Vectorized version of the loop above: join the engagement table to the paid
+# students on account_key, and work out the days since joining for every row,
+# once (see l1_analysis/windows.py). The first week, or any other window of
+# days, is then a binary search per student, e.g.
+#   first_two_weeks_totals = engagement_windows.window_totals(0, 14)
+#   first_month_totals = engagement_windows.window_totals(0, 30)
+from l1_analysis.windows import DayOffsetIndex
+
+with stage('join', rows_in=len(non_udacity_engagement)) as timing:
+    engagement_windows = DayOffsetIndex(non_udacity_engagement, paid_accounts, paid_join_dates)
+    first_week_rows = engagement_windows.window_rows(0, 7)
+    paid_engagement_in_first_week = non_udacity_engagement.take(first_week_rows)
+    timing.rows_out = len(paid_engagement_in_first_week)
+paid_students_who_engaged_in_first_week = Cohort.from_column(paid_engagement_in_first_week)
             
 print len(paid_engagement_in_first_week), "engagements in first week"
 print len(paid_students_who_engaged_in_first_week),  "  paid students"
@@ -315,22 +389,57 @@ from collections import defaultdict
 
 # Create a dictionary of engagement grouped by student.
 # The keys are account keys, and the values are lists of engagement records.
-engagement_by_account = defaultdict(list)
-for engagement_record in paid_engagement_in_first_week:
-    account_key = engagement_record['account_key']
-    engagement_by_account[account_key].append(engagement_record)
+# engagement_by_account = defaultdict(list)
+# for engagement_record in paid_engagement_in_first_week:
+#     account_key = engagement_record['account_key']
+#     engagement_by_account[account_key].append(engagement_record)
+
+# Instead of another copy of the first week rows, grouped into lists, each
+# student's first week is a zero-copy slice of an on-disk engagement store,
+# partitioned by account and memory-mapped (built in .l1_cache/ on the first
+# run; see l1_analysis/engagement_store.py). Each student's rows are in date order.
+# Like non_udacity_engagement, the store leaves out the Udacity test accounts
+# (and holds only the sampled accounts, with L1_SAMPLE set).
+from l1_analysis.engagement_store import open_engagement_store
+
+with stage('engagement_by_account', rows_in=len(paid_accounts)) as timing:
+    engagement_store = open_engagement_store('.', exclude=udacity_test_accounts, sample=sample)
+    engagement_by_account = engagement_store.windows(
+        non_udacity_enrollments.decode('account_key', paid_accounts), paid_join_dates, 0, 7)
+    timing.rows_out = len(engagement_by_account)
 
 
 # In[17]:
 
 # Create a dictionary with the total minutes each student spent in the classroom during the first week.
 # The keys are account keys, and the values are numbers (total minutes)
-total_minutes_by_account = {}
-for account_key, engagement_for_student in engagement_by_account.items():
-    total_minutes = 0
-    for engagement_record in engagement_for_student:
-        total_minutes += engagement_record['total_minutes_visited']
-    total_minutes_by_account[account_key] = total_minutes
+# total_minutes_by_account = {}
+# for account_key, engagement_for_student in engagement_by_account.items():
+#     total_minutes = 0
+#     for engagement_record in engagement_for_student:
+#         total_minutes += engagement_record['total_minutes_visited']
+#     total_minutes_by_account[account_key] = total_minutes
+
+# Vectorized version of the loop above: group the first week engagement by account
+# once, and compute every per-account metric we use below in the same go
+# (num_engagements, total_minutes_visited, lessons_completed and days_visited).
+# See l1_analysis/groupby.py
+# Set the L1_PROCESSES environment variable to more than 1 to compute the totals
+# with a pool of worker processes instead (see l1_analysis/parallel.py); the
+# results are exactly the same.
+from l1_analysis.groupby import engagement_totals
+from l1_analysis.parallel import parallel_first_week_totals
+
+num_processes = int(os.environ.get('L1_PROCESSES', '1'))
+with stage('aggregate', rows_in=len(paid_engagement_in_first_week)) as timing:
+    if num_processes > 1:
+        first_week_totals = parallel_first_week_totals(non_udacity_engagement, paid_accounts, paid_join_dates,
+                                                       processes=num_processes)
+    else:
+        first_week_totals = engagement_totals(paid_engagement_in_first_week)
+    timing.rows_out = len(first_week_totals)
+total_minutes_by_account = dict(zip(first_week_totals.decode('account_key').tolist(),
+                                    first_week_totals['total_minutes_visited'].tolist()))
 
 
 # In[18]:
@@ -357,14 +466,15 @@ print 'Maximum:', np.max(total_minutes),  "minutes == ", np.max(total_minutes)/6
 ## Locate at least one surprising piece of data, output it, and take a look at it.
 minutes_in_a_week = 7*24*60.0
 print minutes_in_a_week, "minutes in a week"
-for account_key, total_minutes in total_minutes_by_account.items():
-    #print engagement_by_account[account_key][0]
-    if total_minutes > minutes_in_a_week:
-        print total_minutes/minutes_in_a_week, "weeks"
-        for engagement in engagement_by_account[account_key]:
-            print (engagement['utc_date'] - paid_students[account_key]).days, "days\n"                    "engaged;", engagement['utc_date'], "joined:", paid_students[account_key]
-            print engagement
-            print
+with stage('surprising_data_loop', rows_in=len(total_minutes_by_account)):
+    for account_key, total_minutes in total_minutes_by_account.items():
+        #print engagement_by_account[account_key][0]
+        if total_minutes > minutes_in_a_week:
+            print total_minutes/minutes_in_a_week, "weeks"
+            for engagement in engagement_by_account[account_key]:
+                print (engagement['utc_date'] - paid_students[account_key]).days, "days\n"                    "engaged;", engagement['utc_date'], "joined:", paid_students[account_key]
+                print engagement
+                print
 
 
 
@@ -396,18 +506,28 @@ def add_values_in_field(field, dataset=engagement_by_account):
     #print totals
     return totals
 
+# counts can be a list or array of values, or a RunningStats that was filled in
+# chunk by chunk, or merged from shards (see l1_analysis/stats.py); either way,
+# the values are only gone through once.
+from l1_analysis.stats import summarize
+
+@instrumented()
 def print_stats(title, counts):
+    stats = summarize(counts)
     print title
-    print 'Mean:', np.mean(counts)
-    print 'Standard deviation:', np.std(counts)
-    print 'Minimum:', np.min(counts)
-    print 'Maximum:', np.max(counts)
+    print 'Mean:', stats.mean
+    print 'Standard deviation:', stats.std
+    print 'Minimum:', stats.min
+    print 'Maximum:', stats.max
     
-total_minutes_visited = add_values_in_field('total_minutes_visited')
+# the sums were already computed, per account, in first_week_totals
+# total_minutes_visited = add_values_in_field('total_minutes_visited')
+total_minutes_visited = first_week_totals['total_minutes_visited']
 print_stats("Total Minutes Visited in a Student's First Week", total_minutes_visited)
 print
 
-total_lessons_completed = add_values_in_field('lessons_completed')
+# total_lessons_completed = add_values_in_field('lessons_completed')
+total_lessons_completed = first_week_totals['lessons_completed']
 print_stats("Total Number of Lessons Completed in a Student's First Week", total_lessons_completed)
 
 
@@ -433,7 +553,8 @@ def count_days_visited(dataset):
     #print totals
     return totals
 
-num_days_visited = count_days_visited(engagement_by_account)
+# num_days_visited = count_days_visited(engagement_by_account)
+num_days_visited = first_week_totals['days_visited']
 print_stats("Number of Days Visted by Students in the First Week (func with for loop)", num_days_visited)
 print
 
@@ -454,33 +575,64 @@ print
 subway_project_lesson_keys = ['746169184', '3176718735']
 passing_values = ['PASSED', 'DISTINCTION']
 
+# The submissions are indexed once by (lesson_key, assigned_rating, account_key),
+# so this (and any other project / rating query) is a binary search instead of
+# a pass over every submission; see l1_analysis/submissions.py. It also knows
+# when each student first passed, e.g.
+#   submission_index.passed_within(subway_project_lesson_keys, passing_values,
+#                                  paid_accounts, paid_join_dates, days=30)
+from l1_analysis.submissions import SubmissionIndex
+with stage('submission_index', rows_in=len(non_udacity_submissions)):
+    submission_index = SubmissionIndex(non_udacity_submissions)
+
+@instrumented()
 def get_list_of_students_who_passed_project1():
-    passing_students = set()
-    for project_sub in non_udacity_submissions:
-        if (project_sub['lesson_key'] in subway_project_lesson_keys) and            (project_sub['assigned_rating'] in passing_values) and            (project_sub['account_key'] in paid_students):
-            passing_students.add(project_sub['account_key'])
-    return passing_students
+    # passing_students = set()
+    # for project_sub in non_udacity_submissions:
+    #     if (project_sub['lesson_key'] in subway_project_lesson_keys) and            (project_sub['assigned_rating'] in passing_values) and            (project_sub['account_key'] in paid_students):
+    #         passing_students.add(project_sub['account_key'])
+    # return passing_students
+    passing_accounts = submission_index.students(subway_project_lesson_keys, passing_values,
+                                                 paid_accounts)
+    return Cohort.from_values(passing_accounts, non_udacity_submissions.encoders.get('account_key'))
         
 
-passing_engagement = {}
-non_passing_engagement = {}
-total_num_engagements_from_passing_students = 0
-total_num_engagements_from_non_passing_students = 0
+# passing_engagement = {}
+# non_passing_engagement = {}
+# total_num_engagements_from_passing_students = 0
+# total_num_engagements_from_non_passing_students = 0
 
 passing_students = get_list_of_students_who_passed_project1()
 
-for account_key, engagements in engagement_by_account.items():
-
-    if account_key in passing_students:
-        passing_engagement[account_key] = engagements
-        total_num_engagements_from_passing_students += len(engagements)
+# for account_key, engagements in engagement_by_account.items():
+#
+#     if account_key in passing_students:
+#         passing_engagement[account_key] = engagements
+#         total_num_engagements_from_passing_students += len(engagements)
+#     else:
+#         non_passing_engagement[account_key] = engagements
+#         total_num_engagements_from_non_passing_students += len(engagements)
+
+# Split the per-account totals (one row per student) instead of the engagement lists.
+# With L1_PROCESSES, the worker processes split the totals of their own shard.
+from l1_analysis.parallel import parallel_passing_totals
+
+with stage('split', rows_in=len(first_week_totals)) as timing:
+    if num_processes > 1:
+        passing_totals, non_passing_totals = parallel_passing_totals(
+            non_udacity_engagement, paid_accounts, paid_join_dates, passing_students.codes(),
+            processes=num_processes)
     else:
-        non_passing_engagement[account_key] = engagements
-        total_num_engagements_from_non_passing_students += len(engagements)
-
-num_passing_students = len(passing_engagement)
-num_failing_students = len(non_passing_engagement)
-print len(passing_engagement), "students passed,", len(non_passing_engagement), "failed,", len(passing_engagement) + len(non_passing_engagement), "total students"
+        is_passing = passing_students.row_mask(first_week_totals)
+        passing_totals = first_week_totals.take(is_passing)
+        non_passing_totals = first_week_totals.take(~is_passing)
+    timing.rows_out = len(passing_totals) + len(non_passing_totals)
+total_num_engagements_from_passing_students = passing_totals['num_engagements'].sum()
+total_num_engagements_from_non_passing_students = non_passing_totals['num_engagements'].sum()
+
+num_passing_students = len(passing_totals)
+num_failing_students = len(non_passing_totals)
+print num_passing_students, "students passed,", num_failing_students, "failed,", num_passing_students + num_failing_students, "total students"
 print total_num_engagements_from_passing_students, "engagements from passing students"  
 print total_num_engagements_from_non_passing_students, "engagements from failing students" 
 print 1.0*total_num_engagements_from_passing_students/num_passing_students, "ave num engagements per passing student"
@@ -501,24 +653,30 @@ print 1.0*total_num_engagements_from_non_passing_students/num_failing_students,
 ## starting point would be the metrics we looked at earlier (minutes spent
 ## in the classroom, lessons completed, and days visited).
 
-total_minutes_visited_passing = add_values_in_field('total_minutes_visited', passing_engagement)
+# total_minutes_visited_passing = add_values_in_field('total_minutes_visited', passing_engagement)
+total_minutes_visited_passing = passing_totals['total_minutes_visited']
 print_stats("Total Minutes Visited in First Week by Students who Passed Project 1", total_minutes_visited_passing)
 print
-total_minutes_visited_non_passing = add_values_in_field('total_minutes_visited', non_passing_engagement)
+# total_minutes_visited_non_passing = add_values_in_field('total_minutes_visited', non_passing_engagement)
+total_minutes_visited_non_passing = non_passing_totals['total_minutes_visited']
 print_stats("Total Minutes Visited in First Week by Students who Failed Project 1", total_minutes_visited_non_passing)
 print
 print
-total_lessons_completed_passing = add_values_in_field('lessons_completed', passing_engagement)
+# total_lessons_completed_passing = add_values_in_field('lessons_completed', passing_engagement)
+total_lessons_completed_passing = passing_totals['lessons_completed']
 print_stats("Total Number of Lessons Completed in First Week by Students who Passed Project 1", total_lessons_completed_passing)
 print
-total_lessons_completed_non_passing = add_values_in_field('lessons_completed', non_passing_engagement)
+# total_lessons_completed_non_passing = add_values_in_field('lessons_completed', non_passing_engagement)
+total_lessons_completed_non_passing = non_passing_totals['lessons_completed']
 print_stats("Total Number of Lessons Completed in First Week by Students who Failed Project 1", total_lessons_completed_non_passing)
 print
 print
-num_days_visited_passing = count_days_visited(passing_engagement)
+# num_days_visited_passing = count_days_visited(passing_engagement)
+num_days_visited_passing = passing_totals['days_visited']
 print_stats("Number of Days Visted in the First Week by Students who Passed Project 1", num_days_visited_passing)
 print
-num_days_visited_non_passing = count_days_visited(non_passing_engagement)
+# num_days_visited_non_passing = count_days_visited(non_passing_engagement)
+num_days_visited_non_passing = non_passing_totals['days_visited']
 print_stats("Number of Days Visted in the First Week by Students who Failed Project 1", num_days_visited_non_passing)
 print
 
@@ -538,39 +696,54 @@ print
 import matplotlib.pyplot as plt
 get_ipython().magic(u'matplotlib inline')
 
+# Count each metric's distinct values once; every histogram below (whatever
+# its bins and range) is worked out from these counts instead of going
+# through all the values again (see l1_analysis/histograms.py).
+from l1_analysis.histograms import histograms_of
+histograms_of = instrumented('histograms_of')(histograms_of)
+plotted_metrics = ['total_minutes_visited', 'lessons_completed', 'days_visited']
+passing_histograms = histograms_of(passing_totals, plotted_metrics)
+non_passing_histograms = histograms_of(non_passing_totals, plotted_metrics)
+
 #"Total Minutes Visited in First Week by Students who Passed Project 1"
-plt.hist(total_minutes_visited_passing)
+# plt.hist(total_minutes_visited_passing)
+passing_histograms['total_minutes_visited'].plot()
 print_stats("Total Minutes Visited in First Week by Students who Passed Project 1", total_minutes_visited_passing)
 
 
 # In[25]:
 
-plt.hist(total_minutes_visited_non_passing)
+# plt.hist(total_minutes_visited_non_passing)
+non_passing_histograms['total_minutes_visited'].plot()
 print_stats("Total Minutes Visited in First Week by Students who Failed Project 1", total_minutes_visited_non_passing)
 
 
 # In[26]:
 
-plt.hist(total_lessons_completed_passing)
+# plt.hist(total_lessons_completed_passing)
+passing_histograms['lessons_completed'].plot()
 print_stats("Total Number of Lessons Completed in First Week by Students who Passed Project 1", total_lessons_completed_passing)
 
 
 # In[27]:
 
-plt.hist(total_lessons_completed_non_passing)
+# plt.hist(total_lessons_completed_non_passing)
+non_passing_histograms['lessons_completed'].plot()
 print_stats("Total Number of Lessons Completed in First Week by Students who Failed Project 1", total_lessons_completed_non_passing)
 
 
 # In[28]:
 
-plt.hist(num_days_visited_passing, bins=8)
+# plt.hist(num_days_visited_passing, bins=8)
+passing_histograms['days_visited'].plot(bins=8)
 print_stats("Number of Days Visted in the First Week by Students who Passed Project 1", num_days_visited_passing)
 
 
 # In[29]:
 
 
-plt.hist(num_days_visited_non_passing, bins=8)
+# plt.hist(num_days_visited_non_passing, bins=8)
+non_passing_histograms['days_visited'].plot(bins=8)
 print_stats("Number of Days Visted in the First Week by Students who Failed Project 1", num_days_visited_non_passing)
 
 
@@ -595,7 +768,7 @@ import seaborn as sns
 
 # In[62]:
 
-plt.hist(num_days_visited_passing, bins=8)
+passing_histograms['days_visited'].plot(bins=8)
 plt.title("Number of Days Visted in the First Week by Students who Passed Project 1")
 plt.xlabel("Number of Days Visited, Week 1")
 plt.ylabel("Number of Students")
@@ -604,7 +777,7 @@ plt.legend(['Passing', 'Failing'])
 
 # In[69]:
 
-plt.hist(num_days_visited_non_passing, bins=8)
+non_passing_histograms['days_visited'].plot(bins=8)
 plt.title("Number of Days Visted in the First Week by Students who Failed Project 1")
 plt.xlabel("Number of Days Visited, Week 1")
 plt.ylabel("Number of Students")
@@ -634,8 +807,8 @@ print max_number_minutes
 plt.xticks(range(int(np.min(total_minutes_visited)), int(np.max(total_minutes_visited))+1, 600))
 
 
-plt.hist(total_minutes_visited_passing, num_bins_passing)
-plt.hist(total_minutes_visited_non_passing, num_bins_failing)
+passing_histograms['total_minutes_visited'].plot(num_bins_passing)
+non_passing_histograms['total_minutes_visited'].plot(num_bins_failing)
 plt.title("Total Minutes Visted in the First Week by Students who Passed/Failed Project 1")
 plt.xlabel("Number of Minutes Visited, Week 1")
 plt.ylabel("Number of Students")
@@ -657,9 +830,10 @@ max_number_minutes = 1200 #20 hours  #1800 #30 hours
 # dunno proper syntax for hist labels, basic idea is here though
 #plt.setp(plt.hist.ax.get_xticklabels()[::2], visible=False)
 
-# change scale from minutes to hours
-total_hours_visited_passing     = [mins/60.0 for mins in total_minutes_visited_passing]
-total_hours_visited_non_passing = [mins/60.0 for mins in total_minutes_visited_non_passing]
+# change scale from minutes to hours (scale=minutes_to_hours when plotting)
+# total_hours_visited_passing     = [mins/60.0 for mins in total_minutes_visited_passing]
+# total_hours_visited_non_passing = [mins/60.0 for mins in total_minutes_visited_non_passing]
+minutes_to_hours = 1 / 60.0
 
 start_num_hours = 0  #int(min_number_minutes/60)
 end_num_hours   = 20 + 1 # int(max_number_minutes/60)+1
@@ -686,8 +860,8 @@ end_num_students = 50 + 1
 plt.yticks(range(0, end_num_students, 10))
 plt.ylim([0, end_num_students])
 
-plt.hist(total_hours_visited_passing,     base_number_of_bins, range=[start_num_hours, end_num_hours])
-plt.hist(total_hours_visited_non_passing, base_number_of_bins, range=[start_num_hours, end_num_hours])
+passing_histograms['total_minutes_visited'].plot(base_number_of_bins, range=[start_num_hours, end_num_hours], scale=minutes_to_hours)
+non_passing_histograms['total_minutes_visited'].plot(base_number_of_bins, range=[start_num_hours, end_num_hours], scale=minutes_to_hours)
 plt.title("Total Hours Visted in the First Week by Students who Passed/Failed Project 1")
 plt.xlabel("Number of Hours Visited, Week 1")
 plt.ylabel("Number of Students")
@@ -703,8 +877,8 @@ lessons_to_plot = [0,41]
 # ticks/labels: every lesson for first 10 lessons, every other lesson for 10-20 lessons, then every 5 lessons
 plt.xticks(range(0, 10, 1)+range(10, 20, 2)+range(20, 41, 5))
 
-plt.hist(total_lessons_completed_passing, bins=num_bins, range=[0,41])
-plt.hist(total_lessons_completed_non_passing, bins=num_bins, range=[0,41])
+passing_histograms['lessons_completed'].plot(bins=num_bins, range=[0,41])
+non_passing_histograms['lessons_completed'].plot(bins=num_bins, range=[0,41])
 
 plt.title("Total Number of Lessons Completed in the First Week by Students who Passed/Failed Project 1")
 plt.xlabel("Number of Lessons Completed, Week 1")
@@ -724,8 +898,8 @@ lessons_to_plot = [0,15]
 plt.xticks(range(0, 6, 1)+range(6, 10, 2)+range(10, 41, 5))
 
 
-plt.hist(total_lessons_completed_passing, bins=num_bins, range=lessons_to_plot)
-plt.hist(total_lessons_completed_non_passing, bins=num_bins, range=lessons_to_plot)
+passing_histograms['lessons_completed'].plot(bins=num_bins, range=lessons_to_plot)
+non_passing_histograms['lessons_completed'].plot(bins=num_bins, range=lessons_to_plot)
 
 plt.title("Total Number of Lessons Completed in the First Week by Students who Passed/Failed Project 1")
 plt.xlabel("Number of Lessons Completed, Week 1")
@@ -735,8 +909,8 @@ plt.legend(['Passing', 'Failing'])
 
 # In[110]:
 
-plt.hist(num_days_visited_passing, bins=8)
-plt.hist(num_days_visited_non_passing, bins=8)
+passing_histograms['days_visited'].plot(bins=8)
+non_passing_histograms['days_visited'].plot(bins=8)
 
 plt.title("Number of Days Visted in the First Week by Students who Passed vs Failed Project 1")
 plt.xlabel("Number of Days Visited, Week 1")
@@ -0,0 +1,66 @@
+# Micro-benchmark of date parsing: the notebook's original strptime-based
+# parse_date against the versions in l1_analysis.dates.
+#
+# Usage:
+#   python benchmarks/bench_dates.py [num_dates] [num_distinct_days]
+#
+# The defaults (1,000,000 dates drawn from 300 distinct days) are about the
+# shape of the utc_date column in daily_engagement. tests/test_dates.py
+# checks that the versions give the same dates.
+
+import os
+import random
+import sys
+import time
+from datetime import datetime as dt, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis import dates
+
+
+# The original, from L1_Starter_Code.py
+def strptime_parse_date(date):
+    if date == '':
+        return None
+    else:
+        return dt.strptime(date, '%Y-%m-%d')
+
+def uncached_parse_date(date):
+    if date == '':
+        return None
+    return dates.parse_iso_date(date)
+
+def make_date_strings(num_dates, num_distinct_days):
+    first_day = dt(2014, 11, 1)
+    days = [(first_day + timedelta(days=i)).strftime('%Y-%m-%d').decode('ascii')
+            for i in xrange(num_distinct_days)]
+    random.seed(0)
+    return [random.choice(days) for _ in xrange(num_dates)]
+
+def time_it(function, values):
+    start = time.time()
+    result = function(values)
+    return time.time() - start, result
+
+def main(num_dates=1000000, num_distinct_days=300):
+    values = make_date_strings(int(num_dates), int(num_distinct_days))
+    dates.clear_date_caches()
+
+    benchmarks = [
+        ('strptime (original)', lambda values: [strptime_parse_date(v) for v in values]),
+        ('fixed-format parser', lambda values: [uncached_parse_date(v) for v in values]),
+        ('cached parse_date', lambda values: [dates.parse_date(v) for v in values]),
+        ('parse_date_column', dates.parse_date_column),
+    ]
+    print len(values), 'dates,', num_distinct_days, 'distinct days'
+    baseline = None
+    for name, function in benchmarks:
+        seconds, result = time_it(function, values)
+        if baseline is None:
+            baseline = seconds
+        print '%-22s %8.3f s  (%5.1fx)' % (name, seconds, baseline / seconds)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
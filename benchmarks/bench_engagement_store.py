@@ -0,0 +1,40 @@
+# Times building an engagement store (see l1_analysis/engagement_store.py)
+# for data_dir, in a temporary directory and without the Udacity test
+# accounts, and taking the paid students' first week windows from it.
+#
+# Usage:
+#   python benchmarks/bench_engagement_store.py [data_dir]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis.cache import find_udacity_test_accounts, load_cleaned_tables
+from l1_analysis.engagement_store import build_engagement_store
+from l1_analysis.first_week import find_paid_students
+
+
+def main(data_dir='.'):
+    tables = load_cleaned_tables(data_dir)
+    paid_accounts, paid_join_dates = find_paid_students(tables['non_udacity_enrollments'])
+    paid_keys = tables['non_udacity_enrollments'].decode('account_key', paid_accounts)
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        store = build_engagement_store(os.path.join(data_dir, 'daily_engagement.csv'),
+                                       os.path.join(directory, 'store'),
+                                       exclude=find_udacity_test_accounts(tables['enrollments']))
+        print store, 'built in %.3f s' % (time.time() - start)
+        start = time.time()
+        windows = store.windows(paid_keys, paid_join_dates, 0, 7)
+        print len(windows), 'first week windows in %.3f s' % (time.time() - start)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,109 @@
+# Compares the notebook's add_values_in_field / count_days_visited helpers,
+# which loop over the engagement_by_account dict of lists, with the
+# vectorized group-by in l1_analysis.groupby.
+#
+# Usage:
+#   python benchmarks/bench_groupby.py [data_dir] [scale]
+#
+# The first week engagement table is repeated `scale` times (with a distinct
+# account_key suffix for each copy) to simulate a larger cohort.
+
+from collections import defaultdict
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.columnar import Table
+from l1_analysis.encoding import KeyEncoder
+from l1_analysis.first_week import find_paid_students, first_week_engagement_rows
+from l1_analysis.groupby import engagement_totals
+
+
+## The helpers from L1_Starter_Code.py
+
+def add_values_in_field(field, dataset):
+    totals = []
+    for account_key, engagements in dataset.items():
+        total_this_account = 0
+        for engagement in engagements:
+            total_this_account += engagement[field]
+        totals.append(total_this_account)
+    return totals
+
+def count_days_visited(dataset):
+    totals = []
+    for account_key, engagements in dataset.items():
+        count = 0
+        for engagement in engagements:
+            if engagement['num_courses_visited'] > 0:
+                count += 1
+        totals.append(count)
+    return totals
+
+def dict_path(engagement):
+    engagement_by_account = defaultdict(list)
+    for engagement_record in engagement:
+        engagement_by_account[engagement_record['account_key']].append(engagement_record)
+    return {
+        'account_key': engagement_by_account.keys(),
+        'total_minutes_visited': add_values_in_field('total_minutes_visited', engagement_by_account),
+        'lessons_completed': add_values_in_field('lessons_completed', engagement_by_account),
+        'days_visited': count_days_visited(engagement_by_account),
+    }
+
+def groupby_path(engagement):
+    return engagement_totals(engagement)
+
+
+def load_first_week_engagement(data_dir, scale):
+    tables = load_cleaned_tables(data_dir)
+    engagement = tables['non_udacity_engagement']
+    paid_accounts, paid_join_dates = find_paid_students(tables['non_udacity_enrollments'])
+    first_week = engagement.take(first_week_engagement_rows(engagement, paid_accounts, paid_join_dates))
+    account_keys = first_week.decode('account_key')
+    copies = []
+    for copy in xrange(scale):
+        columns = dict(first_week.columns)
+        columns['account_key'] = np.char.add(account_keys, u'-%d' % copy)
+        copies.append(Table(columns, first_week.names))
+    engagement = Table.concat(copies)
+    # encode the new keys, like the loader does
+    encoder = KeyEncoder()
+    engagement.columns['account_key'] = encoder.encode(engagement['account_key'])
+    engagement.encoders['account_key'] = encoder
+    return engagement
+
+# Checks that both paths give the same value for every account.
+def same_totals(by_dict, by_groupby):
+    for field in ['total_minutes_visited', 'lessons_completed', 'days_visited']:
+        expected = dict(zip(by_dict['account_key'], by_dict[field]))
+        actual = dict(zip(by_groupby.decode('account_key').tolist(), by_groupby[field].tolist()))
+        if expected != actual:
+            return False
+    return True
+
+def main(data_dir='.', scale=1):
+    engagement = load_first_week_engagement(data_dir, int(scale))
+    print len(engagement), 'first week engagement records'
+
+    start = time.time()
+    by_dict = dict_path(engagement)
+    dict_seconds = time.time() - start
+
+    start = time.time()
+    by_groupby = groupby_path(engagement)
+    groupby_seconds = time.time() - start
+
+    print '%-30s %8.3f s' % ('dict of lists + helpers', dict_seconds)
+    print '%-30s %8.3f s  (%.1fx)' % ('groupby.engagement_totals', groupby_seconds,
+                                      dict_seconds / groupby_seconds)
+    print 'per-account totals match:', same_totals(by_dict, by_groupby)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
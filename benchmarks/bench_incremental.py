@@ -0,0 +1,29 @@
+# Times an update of the incremental first week state (see
+# l1_analysis/incremental.py): a build from scratch the first time, and
+# after that only the rows appended to daily_engagement.csv since the last
+# run. With L1_SAMPLE set, the state of that sample of the accounts is
+# updated.
+#
+# Usage:
+#   python benchmarks/bench_incremental.py [data_dir]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis.incremental import update_first_week_state
+from l1_analysis.sampling import sample_from_environment
+
+
+def main(data_dir='.'):
+    start = time.time()
+    state, result = update_first_week_state(data_dir, sample=sample_from_environment())
+    print result, 'in %.3f s' % (time.time() - start)
+    print state.aggregates.num_engagements, "engagements in first week"
+    print len(state.aggregates.students), "  paid students"
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
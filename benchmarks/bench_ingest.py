@@ -0,0 +1,34 @@
+# Times loading the three CSVs with the serial loader (columnar.load_table)
+# and with l1_analysis/ingest.py's pool of workers, for two sizes of byte
+# range.
+#
+# Usage:
+#   python benchmarks/bench_ingest.py [data_dir] [processes]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis.columnar import load_table
+from l1_analysis.encoding import make_encoders
+from l1_analysis.ingest import CHUNK_BYTES, FILES, load_all_parallel
+
+
+def main(data_dir='.', processes=None):
+    processes = int(processes) if processes else None
+    start = time.time()
+    encoders = make_encoders()
+    for name, filename, types in FILES:
+        load_table(os.path.join(data_dir, filename), types, encoders=encoders)
+    print 'serial:   %.3f s' % (time.time() - start)
+
+    for chunk_bytes in [CHUNK_BYTES, 1 << 20]:
+        start = time.time()
+        load_all_parallel(data_dir, processes, make_encoders(), chunk_bytes=chunk_bytes)
+        print 'parallel: %.3f s (%d byte ranges)' % (time.time() - start, chunk_bytes)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,171 @@
+# Compares the original list-of-dicts CSV ingest (unicodecsv.DictReader followed
+# by the type-fixing loops) with the __slots__ records in l1_analysis.records
+# and the columnar loader in l1_analysis.columnar.
+#
+# Each loader runs in its own child process, so the peak RSS reported for one
+# is not affected by the memory the other one used.
+#
+# Usage:
+#   python benchmarks/bench_loader.py [data_dir]
+#
+# data_dir defaults to the current directory, and should contain
+# enrollments.csv, daily_engagement.csv and project_submissions.csv.
+# Tables whose CSV file is missing are skipped.
+
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime as dt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import unicodecsv
+
+from l1_analysis import columnar, records
+from l1_analysis.encoding import make_encoders
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+TABLES = ['enrollments', 'daily_engagement', 'project_submissions']
+
+
+# Takes nothing, and returns the peak resident set size of this process in MB,
+# or None if it can't be measured on this platform.
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # bytes on macOS, kilobytes on Linux
+        return peak / (1024.0 * 1024.0)
+    return peak / 1024.0
+
+
+## The original ingest, as it was written in L1_Starter_Code.py
+
+def parse_date(date):
+    if date == '':
+        return None
+    else:
+        return dt.strptime(date, '%Y-%m-%d')
+
+def parse_maybe_int(i):
+    if i == '':
+        return None
+    else:
+        return int(i)
+
+def read_dicts(filename):
+    with open(filename, 'rb') as f:
+        reader = unicodecsv.DictReader(f)
+        return list(reader)
+
+def legacy_load(table_name, filename):
+    data = read_dicts(filename)
+    if table_name == 'enrollments':
+        for enrollment in data:
+            enrollment['cancel_date'] = parse_date(enrollment['cancel_date'])
+            enrollment['days_to_cancel'] = parse_maybe_int(enrollment['days_to_cancel'])
+            enrollment['is_canceled'] = enrollment['is_canceled'] == 'True'
+            enrollment['is_udacity'] = enrollment['is_udacity'] == 'True'
+            enrollment['join_date'] = parse_date(enrollment['join_date'])
+    elif table_name == 'daily_engagement':
+        for engagement_record in data:
+            engagement_record['lessons_completed'] = int(float(engagement_record['lessons_completed']))
+            engagement_record['num_courses_visited'] = int(float(engagement_record['num_courses_visited']))
+            engagement_record['projects_completed'] = int(float(engagement_record['projects_completed']))
+            engagement_record['total_minutes_visited'] = float(engagement_record['total_minutes_visited'])
+            engagement_record['utc_date'] = parse_date(engagement_record['utc_date'])
+    elif table_name == 'project_submissions':
+        for submission in data:
+            submission['completion_date'] = parse_date(submission['completion_date'])
+            submission['creation_date'] = parse_date(submission['creation_date'])
+    return data
+
+
+## The columnar loader
+
+COLUMN_TYPES = {
+    'enrollments': columnar.ENROLLMENT_TYPES,
+    'daily_engagement': columnar.ENGAGEMENT_TYPES,
+    'project_submissions': columnar.SUBMISSION_TYPES,
+}
+
+def columnar_load(table_name, filename):
+    return columnar.load_table(filename, COLUMN_TYPES[table_name])
+
+## Typed __slots__ records, one object per row
+
+RECORD_LOADERS = {
+    'enrollments': records.load_enrollment_records,
+    'daily_engagement': records.load_engagement_records,
+    'project_submissions': records.load_submission_records,
+}
+
+def records_load(table_name, filename):
+    return RECORD_LOADERS[table_name](filename)
+
+# account_key and lesson_key stored as int32 codes
+ENCODERS = make_encoders()
+
+def encoded_columnar_load(table_name, filename):
+    return columnar.load_table(filename, COLUMN_TYPES[table_name], encoders=ENCODERS)
+
+
+LOADERS = {
+    'dicts': legacy_load,
+    'records': records_load,
+    'columnar': columnar_load,
+    'encoded': encoded_columnar_load,
+}
+
+# Runs in a child process: loads every table with one loader, and sends back
+# the load time, the number of rows and the peak RSS.
+def run_loader(loader_name, files, results):
+    load = LOADERS[loader_name]
+    rss_before = peak_rss_mb()
+    start = time.time()
+    num_rows = 0
+    tables = []
+    for table_name, filename in files:
+        table = load(table_name, filename)
+        num_rows += len(table)
+        # keep every table alive, like the notebook does
+        tables.append(table)
+    seconds = time.time() - start
+    results.put((loader_name, seconds, num_rows, rss_before, peak_rss_mb()))
+
+def format_mb(value):
+    if value is None:
+        return 'n/a'
+    return '%.1f MB' % value
+
+def main(data_dir='.'):
+    files = []
+    for table_name in TABLES:
+        filename = os.path.join(data_dir, table_name + '.csv')
+        if os.path.exists(filename):
+            files.append((table_name, filename))
+        else:
+            print 'skipping', table_name, '(no', filename + ')'
+    if not files:
+        print 'no CSV files found in', data_dir
+        return
+
+    results = multiprocessing.Queue()
+    for loader_name in ['dicts', 'records', 'columnar', 'encoded']:
+        process = multiprocessing.Process(target=run_loader, args=(loader_name, files, results))
+        process.start()
+        loader_name, seconds, num_rows, rss_before, rss_after = results.get()
+        process.join()
+        print '%-10s %8.3f s  %9d rows  peak RSS %s (%s before loading)' % (
+            loader_name, seconds, num_rows, format_mb(rss_after), format_mb(rss_before))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
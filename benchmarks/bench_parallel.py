@@ -0,0 +1,75 @@
+# Times l1_analysis.parallel's first week totals, to show how the work
+# splits up as the number of shards grows.
+#
+# Usage:
+#   python benchmarks/bench_parallel.py [data_dir] [max_processes]
+#
+# For 1, 2, 4, ... up to max_processes shards (default: the number of CPUs,
+# at least 4), it prints
+#   - the time to share the columns and partition the rows by shard, once,
+#     in the parent
+#   - the slowest shard's time, running the shards one after another in
+#     this process: that's the critical path of a pool with one process per
+#     shard, and it should shrink about in proportion to 1 / shards
+#   - the sum of the shards' times, which should stay about the same as for
+#     one shard (no worker scans the rows of the others)
+#   - the wall clock time of parallel_first_week_totals with that many
+#     processes (which only goes down with enough idle cores)
+# Generate a larger data set with generate_data.py for clearer numbers.
+
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis import parallel
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.first_week import find_paid_students, first_week_engagement_rows
+from l1_analysis.groupby import engagement_totals
+
+
+# Runs each shard's work in this process, and returns (share seconds,
+# list of seconds per shard).
+def time_shards(engagement, paid_accounts, paid_join_dates, num_shards):
+    start = time.time()
+    shared_columns, bounds, encoder = parallel._share_first_week_columns(
+        engagement, paid_accounts, paid_join_dates, num_shards)
+    share_seconds = time.time() - start
+    parallel._init_worker(shared_columns)
+    shard_seconds = []
+    for shard in xrange(num_shards):
+        start = time.time()
+        parallel._shard_first_week_totals((bounds[shard], bounds[shard + 1], 7))
+        shard_seconds.append(time.time() - start)
+    return share_seconds, shard_seconds
+
+def main(data_dir='.', max_processes=None):
+    max_processes = int(max_processes) if max_processes else max(multiprocessing.cpu_count(), 4)
+    tables = load_cleaned_tables(data_dir)
+    engagement = tables['non_udacity_engagement']
+    paid_accounts, paid_join_dates = find_paid_students(tables['non_udacity_enrollments'])
+    print len(engagement), 'engagement records,', multiprocessing.cpu_count(), 'CPUs'
+
+    start = time.time()
+    engagement_totals(engagement.take(first_week_engagement_rows(engagement, paid_accounts,
+                                                                 paid_join_dates)))
+    print 'serial: %.3f s' % (time.time() - start)
+    print '%7s %10s %10s %10s %10s' % ('shards', 'share', 'slowest', 'sum', 'pool')
+    num_shards = 1
+    while num_shards <= max_processes:
+        share_seconds, shard_seconds = time_shards(engagement, paid_accounts,
+                                                       paid_join_dates, num_shards)
+        start = time.time()
+        parallel.parallel_first_week_totals(engagement, paid_accounts, paid_join_dates,
+                                            processes=num_shards)
+        pool_seconds = time.time() - start
+        print '%7d %10.4f %10.4f %10.4f %10.3f' % (num_shards, share_seconds,
+                                                   max(shard_seconds), sum(shard_seconds),
+                                                   pool_seconds)
+        num_shards *= 2
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
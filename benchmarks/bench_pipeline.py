@@ -0,0 +1,371 @@
+# Times every stage of the L1_Starter_Code.py pipeline separately, for both
+# the notebook's original list-of-dicts code and the l1_analysis versions,
+# and writes the results as JSON so runs can be compared over time.
+#
+# Usage:
+#   python benchmarks/bench_pipeline.py [--scale N] [--data-dir DIR] [--output FILE]
+#                                       [--only notebook|library]
+#
+# Without --data-dir, synthetic CSVs are generated (see generate_data.py) at
+# N times the size of the sample data (default 1) in a temporary directory.
+# The results go to FILE (default bench_pipeline-scale<N>-<timestamp>.json).
+#
+# Each implementation runs in its own child process. For every stage, the
+# results hold the wall clock and CPU time, the number of rows the stage
+# produced, and the peak RSS of the process once the stage has finished
+# (peak memory can't be measured on Windows, and is reported as null there).
+
+from collections import defaultdict
+from datetime import datetime
+import json
+import multiprocessing
+import optparse
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import unicodecsv
+
+import generate_data
+from l1_analysis import columnar
+from l1_analysis.encoding import make_encoders
+from l1_analysis.first_week import find_passing_students, find_paid_students, first_week_engagement_rows
+from l1_analysis.groupby import engagement_totals
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+TABLES = ['enrollments', 'daily_engagement', 'project_submissions']
+
+SUBWAY_PROJECT_LESSON_KEYS = ['746169184', '3176718735']
+PASSING_VALUES = ['PASSED', 'DISTINCTION']
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak / (1024.0 * 1024.0)
+    return peak / 1024.0
+
+def cpu_seconds():
+    times = os.times()
+    return times[0] + times[1]
+
+
+## The notebook's original code. Each stage takes the dict of results so far
+## (starting with data_dir), adds its own, and returns the number of rows
+## (or keys) it produced.
+
+def parse_date(date):
+    if date == '':
+        return None
+    else:
+        return datetime.strptime(date, '%Y-%m-%d')
+
+def parse_maybe_int(i):
+    if i == '':
+        return None
+    else:
+        return int(i)
+
+def notebook_load_csv(state):
+    for table_name in TABLES:
+        with open(os.path.join(state['data_dir'], table_name + '.csv'), 'rb') as f:
+            state[table_name] = list(unicodecsv.DictReader(f))
+    return sum(len(state[table_name]) for table_name in TABLES)
+
+def notebook_fix_types(state):
+    for enrollment in state['enrollments']:
+        enrollment['cancel_date'] = parse_date(enrollment['cancel_date'])
+        enrollment['days_to_cancel'] = parse_maybe_int(enrollment['days_to_cancel'])
+        enrollment['is_canceled'] = enrollment['is_canceled'] == 'True'
+        enrollment['is_udacity'] = enrollment['is_udacity'] == 'True'
+        enrollment['join_date'] = parse_date(enrollment['join_date'])
+    for engagement_record in state['daily_engagement']:
+        engagement_record['lessons_completed'] = int(float(engagement_record['lessons_completed']))
+        engagement_record['num_courses_visited'] = int(float(engagement_record['num_courses_visited']))
+        engagement_record['projects_completed'] = int(float(engagement_record['projects_completed']))
+        engagement_record['total_minutes_visited'] = float(engagement_record['total_minutes_visited'])
+        engagement_record['utc_date'] = parse_date(engagement_record['utc_date'])
+    for submission in state['project_submissions']:
+        submission['completion_date'] = parse_date(submission['completion_date'])
+        submission['creation_date'] = parse_date(submission['creation_date'])
+    return sum(len(state[table_name]) for table_name in TABLES)
+
+def count_unique_id(data, key):
+    unique_ids = set()
+    for row in data:
+        unique_ids.add(row[key])
+    return len(unique_ids)
+
+def notebook_count_unique_id(state):
+    return (count_unique_id(state['enrollments'], 'account_key') +
+            count_unique_id(state['daily_engagement'], 'acct') +
+            count_unique_id(state['project_submissions'], 'account_key'))
+
+def notebook_rename_acct(state):
+    for row in state['daily_engagement']:
+        if 'acct' in row:
+            val = row['acct']
+            row['account_key'] = val
+            del row['acct']
+    return len(state['daily_engagement'])
+
+def notebook_remove_udacity_accounts(state):
+    udacity_test_accounts = set()
+    for enrollment in state['enrollments']:
+        if enrollment['is_udacity']:
+            udacity_test_accounts.add(enrollment['account_key'])
+
+    def remove_udacity_accounts(data):
+        non_udacity_data = []
+        for data_point in data:
+            if data_point['account_key'] not in udacity_test_accounts:
+                non_udacity_data.append(data_point)
+        return non_udacity_data
+
+    state['non_udacity_enrollments'] = remove_udacity_accounts(state['enrollments'])
+    state['non_udacity_engagement'] = remove_udacity_accounts(state['daily_engagement'])
+    state['non_udacity_submissions'] = remove_udacity_accounts(state['project_submissions'])
+    return (len(state['non_udacity_enrollments']) + len(state['non_udacity_engagement']) +
+            len(state['non_udacity_submissions']))
+
+def notebook_paid_students(state):
+    paid_students = {}
+    for enrollment in state['non_udacity_enrollments']:
+        student = enrollment['account_key']
+        if (enrollment['is_canceled'] == False) or ((enrollment['cancel_date'] - enrollment['join_date']).days > 7):
+            date_enrolled = enrollment['join_date']
+            if (student not in paid_students) or (date_enrolled > paid_students[student]):
+                paid_students[student] = date_enrolled
+    state['paid_students'] = paid_students
+    return len(paid_students)
+
+def within_one_week(join_date, engagement_date):
+    time_delta = engagement_date - join_date
+    return (time_delta.days < 7) and (time_delta.days >= 0)
+
+def notebook_first_week_filter(state):
+    paid_students = state['paid_students']
+    paid_engagement_in_first_week = []
+    for engagement in state['non_udacity_engagement']:
+        student = engagement['account_key']
+        if student in paid_students:
+            if within_one_week(paid_students[student], engagement['utc_date']):
+                paid_engagement_in_first_week.append(engagement)
+    state['paid_engagement_in_first_week'] = paid_engagement_in_first_week
+    return len(paid_engagement_in_first_week)
+
+def add_values_in_field(field, dataset):
+    totals = []
+    for account_key, engagements in dataset.items():
+        total_this_account = 0
+        for engagement in engagements:
+            total_this_account += engagement[field]
+        totals.append(total_this_account)
+    return totals
+
+def count_days_visited(dataset):
+    totals = []
+    for account_key, engagements in dataset.items():
+        count = 0
+        for engagement in engagements:
+            if engagement['num_courses_visited'] > 0:
+                count += 1
+        totals.append(count)
+    return totals
+
+def notebook_first_week_totals(state):
+    engagement_by_account = defaultdict(list)
+    for engagement_record in state['paid_engagement_in_first_week']:
+        engagement_by_account[engagement_record['account_key']].append(engagement_record)
+    state['total_minutes_visited'] = add_values_in_field('total_minutes_visited', engagement_by_account)
+    state['lessons_completed'] = add_values_in_field('lessons_completed', engagement_by_account)
+    state['days_visited'] = count_days_visited(engagement_by_account)
+    return len(engagement_by_account)
+
+def notebook_passing_students(state):
+    passing_students = set()
+    for project_sub in state['non_udacity_submissions']:
+        if (project_sub['lesson_key'] in SUBWAY_PROJECT_LESSON_KEYS) and \
+           (project_sub['assigned_rating'] in PASSING_VALUES) and \
+           (project_sub['account_key'] in state['paid_students']):
+            passing_students.add(project_sub['account_key'])
+    state['passing_students'] = passing_students
+    return len(passing_students)
+
+
+## The l1_analysis versions of the same stages. The columnar loader parses
+## and types the columns in one pass, so there is no separate fix_types stage.
+
+COLUMN_TYPES = {
+    'enrollments': columnar.ENROLLMENT_TYPES,
+    'daily_engagement': columnar.ENGAGEMENT_TYPES,
+    'project_submissions': columnar.SUBMISSION_TYPES,
+}
+
+def library_load_csv(state):
+    encoders = make_encoders()
+    for table_name in TABLES:
+        state[table_name] = columnar.load_table(os.path.join(state['data_dir'], table_name + '.csv'),
+                                                COLUMN_TYPES[table_name], encoders=encoders)
+    return sum(len(state[table_name]) for table_name in TABLES)
+
+def library_count_unique_id(state):
+    return (len(np.unique(state['enrollments']['account_key'])) +
+            len(np.unique(state['daily_engagement']['acct'])) +
+            len(np.unique(state['project_submissions']['account_key'])))
+
+def library_rename_acct(state):
+    state['daily_engagement'].rename_column('acct', 'account_key')
+    return len(state['daily_engagement'])
+
+def library_remove_udacity_accounts(state):
+    enrollments = state['enrollments']
+    udacity_accounts = enrollments['account_key'][enrollments['is_udacity']]
+    udacity_test_accounts = set(enrollments.decode('account_key', udacity_accounts).tolist())
+    for table_name, non_udacity_name in [('enrollments', 'non_udacity_enrollments'),
+                                         ('daily_engagement', 'non_udacity_engagement'),
+                                         ('project_submissions', 'non_udacity_submissions')]:
+        state[non_udacity_name] = columnar.remove_accounts(state[table_name], udacity_test_accounts)
+    return (len(state['non_udacity_enrollments']) + len(state['non_udacity_engagement']) +
+            len(state['non_udacity_submissions']))
+
+def library_paid_students(state):
+    state['paid_accounts'], state['paid_join_dates'] = find_paid_students(state['non_udacity_enrollments'])
+    return len(state['paid_accounts'])
+
+def library_first_week_filter(state):
+    engagement = state['non_udacity_engagement']
+    rows = first_week_engagement_rows(engagement, state['paid_accounts'], state['paid_join_dates'])
+    state['paid_engagement_in_first_week'] = engagement.take(rows)
+    return len(rows)
+
+def library_first_week_totals(state):
+    state['first_week_totals'] = engagement_totals(state['paid_engagement_in_first_week'])
+    return len(state['first_week_totals'])
+
+def library_passing_students(state):
+    state['passing_students'] = find_passing_students(state['non_udacity_submissions'],
+                                                      SUBWAY_PROJECT_LESSON_KEYS, PASSING_VALUES,
+                                                      state['paid_accounts'])
+    return len(state['passing_students'])
+
+
+IMPLEMENTATIONS = {
+    'notebook': [
+        ('load_csv', notebook_load_csv),
+        ('fix_types', notebook_fix_types),
+        ('count_unique_id', notebook_count_unique_id),
+        ('rename_acct', notebook_rename_acct),
+        ('remove_udacity_accounts', notebook_remove_udacity_accounts),
+        ('paid_students', notebook_paid_students),
+        ('first_week_filter', notebook_first_week_filter),
+        ('first_week_totals', notebook_first_week_totals),
+        ('passing_students', notebook_passing_students),
+    ],
+    'library': [
+        ('load_csv', library_load_csv),
+        ('count_unique_id', library_count_unique_id),
+        ('rename_acct', library_rename_acct),
+        ('remove_udacity_accounts', library_remove_udacity_accounts),
+        ('paid_students', library_paid_students),
+        ('first_week_filter', library_first_week_filter),
+        ('first_week_totals', library_first_week_totals),
+        ('passing_students', library_passing_students),
+    ],
+}
+
+
+# Runs in a child process: runs every stage of one implementation in order,
+# and sends back a list of per-stage results.
+def run_implementation(name, data_dir, results):
+    state = {'data_dir': data_dir}
+    stages = []
+    for stage_name, stage in IMPLEMENTATIONS[name]:
+        rss_before = peak_rss_mb()
+        wall_start = time.time()
+        cpu_start = cpu_seconds()
+        rows = stage(state)
+        stages.append({
+            'stage': stage_name,
+            'seconds': time.time() - wall_start,
+            'cpu_seconds': cpu_seconds() - cpu_start,
+            'rows_out': rows,
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_rss_increase_mb': None if rss_before is None else peak_rss_mb() - rss_before,
+        })
+    results.put(stages)
+
+def count_rows(data_dir):
+    counts = {}
+    for table_name in TABLES:
+        with open(os.path.join(data_dir, table_name + '.csv'), 'rb') as f:
+            counts[table_name] = sum(1 for line in f) - 1
+    return counts
+
+def main(argv):
+    parser = optparse.OptionParser()
+    parser.add_option('--scale', type='float', default=1,
+                      help='size of the generated data, as a multiple of the sample data')
+    parser.add_option('--data-dir', help='use the CSVs in this directory instead of generating them')
+    parser.add_option('--output', help='JSON file to write the results to')
+    parser.add_option('--only', choices=sorted(IMPLEMENTATIONS), help='run one implementation only')
+    parser.add_option('--seed', type='int', default=0, help='seed for the generated data')
+    options, args = parser.parse_args(argv)
+
+    data_dir = options.data_dir
+    temp_dir = None
+    if data_dir is None:
+        temp_dir = data_dir = tempfile.mkdtemp()
+        print 'generating data at scale', options.scale, 'in', data_dir
+        generate_data.generate(data_dir, options.scale, options.seed)
+    try:
+        report = {
+            'created': datetime.now().isoformat(),
+            'scale': options.scale if options.data_dir is None else None,
+            'data_dir': options.data_dir,
+            'rows': count_rows(data_dir),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'implementations': {},
+        }
+        names = [options.only] if options.only else ['notebook', 'library']
+        for name in names:
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(target=run_implementation, args=(name, data_dir, results))
+            process.start()
+            stages = results.get()
+            process.join()
+            report['implementations'][name] = stages
+            print name
+            for stage in stages:
+                print '  %-25s %9.3f s  %9.3f s CPU  %10d rows  peak RSS %s' % (
+                    stage['stage'], stage['seconds'], stage['cpu_seconds'], stage['rows_out'],
+                    'n/a' if stage['peak_rss_mb'] is None else '%.1f MB' % stage['peak_rss_mb'])
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir)
+
+    output = options.output
+    if output is None:
+        output = 'bench_pipeline-scale%g-%s.json' % (options.scale, time.strftime('%Y%m%d-%H%M%S'))
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print 'results written to', output
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,42 @@
+# Loads the tables in data_dir whole and sampled (see
+# l1_analysis/sampling.py), and prints how many rows and accounts the sample
+# kept, and the times (tests/test_sampling.py checks that the sampled tables
+# hold exactly the rows of the sampled accounts).
+#
+# Usage:
+#   python benchmarks/bench_sampling.py [data_dir] [fraction]
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis.columnar import load_table
+from l1_analysis.ingest import FILES
+from l1_analysis.sampling import AccountSample
+
+
+def main(data_dir='.', fraction='0.1'):
+    sample = AccountSample(float(fraction))
+    for name, filename, types in FILES:
+        filename = os.path.join(data_dir, filename)
+        start = time.time()
+        table = load_table(filename, types)
+        full_seconds = time.time() - start
+        start = time.time()
+        sampled = load_table(filename, types, sample=sample)
+        sampled_seconds = time.time() - start
+
+        key_column = table.names[sample.key_position(table.names)]
+        num_accounts = len(np.unique(table[key_column]))
+        num_kept = len(np.unique(sampled[key_column]))
+        print '%s: kept %d of %d rows, %d of %d accounts (%.3f); %.3f s instead of %.3f s' % (
+            name, len(sampled), len(table), num_kept, num_accounts,
+            num_kept / float(num_accounts), sampled_seconds, full_seconds)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
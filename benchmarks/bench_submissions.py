@@ -0,0 +1,48 @@
+# Times l1_analysis/submissions.py's SubmissionIndex against scans of the
+# submissions (first_week.find_passing_students), for every lesson and
+# several sets of ratings.
+#
+# Usage:
+#   python benchmarks/bench_submissions.py [data_dir]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.first_week import find_paid_students, find_passing_students
+from l1_analysis.submissions import SubmissionIndex
+
+
+def main(data_dir='.'):
+    tables = load_cleaned_tables(data_dir)
+    submissions = tables['non_udacity_submissions']
+    paid_accounts, paid_join_dates = find_paid_students(tables['non_udacity_enrollments'])
+    start = time.time()
+    index = SubmissionIndex(submissions)
+    print 'index built in %.3f s' % (time.time() - start)
+
+    lesson_keys = np.unique(submissions.decode('lesson_key')).tolist()
+    rating_sets = [['PASSED', 'DISTINCTION'], ['PASSED'], ['INCOMPLETE', 'UNGRADED']]
+    scan_seconds = index_seconds = 0.0
+    for lesson_key in lesson_keys:
+        for ratings in rating_sets:
+            start = time.time()
+            find_passing_students(submissions, [lesson_key], ratings, paid_accounts)
+            scan_seconds += time.time() - start
+            start = time.time()
+            index.students([lesson_key], ratings, paid_accounts)
+            index_seconds += time.time() - start
+    print 'scans: %.3f s, index: %.3f s' % (scan_seconds, index_seconds)
+
+    within = index.passed_within(['746169184', '3176718735'], ['PASSED', 'DISTINCTION'],
+                                 paid_accounts, paid_join_dates, 30)
+    print len(within), 'paid students passed the subway project within 30 days of joining'
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,35 @@
+# Times building a DayOffsetIndex (l1_analysis/windows.py) and the totals
+# of a few windows of days since joining.
+#
+# Usage:
+#   python benchmarks/bench_windows.py [data_dir]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.first_week import find_paid_students
+from l1_analysis.windows import DayOffsetIndex
+
+
+def main(data_dir='.'):
+    tables = load_cleaned_tables(data_dir)
+    engagement = tables['non_udacity_engagement']
+    paid_accounts, paid_join_dates = find_paid_students(tables['non_udacity_enrollments'])
+
+    start = time.time()
+    index = DayOffsetIndex(engagement, paid_accounts, paid_join_dates)
+    print 'built index over %d rows in %.3f s' % (len(index), time.time() - start)
+
+    for first_day, last_day in [(0, 7), (0, 14), (7, 14), (0, 30)]:
+        start = time.time()
+        totals = index.window_totals(first_day, last_day)
+        print 'days [%d, %d): %d accounts, %d engagements, in %.3f s' % (
+            first_day, last_day, len(totals), totals['num_engagements'].sum(), time.time() - start)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
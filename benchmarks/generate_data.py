@@ -0,0 +1,200 @@
+# Generates synthetic enrollments.csv, daily_engagement.csv and
+# project_submissions.csv files, following the schemas in
+# table_descriptions.txt, at any multiple of the size of the sample data.
+#
+# Usage:
+#   python benchmarks/generate_data.py out_dir [scale] [seed]
+#
+# scale 1 is about the size of the course's sample files (1,302 students,
+# 1,640 enrollments, ~136,000 engagement records, ~3,600 submissions); 10,
+# 100 and 1000 give 10x, 100x and 1000x as much. Students are generated (and
+# written) in blocks, so memory use doesn't grow with the scale.
+#
+# The data is random, but shaped like the real thing: some students enroll
+# twice, some cancel during the free trial (a few on the day they joined, so
+# they have no engagement records), a few accounts are Udacity test accounts,
+# there is one engagement record per student per day enrolled, and the
+# submissions use the sample's lesson keys and ratings.
+
+import os
+import sys
+
+import numpy as np
+
+SAMPLE_STUDENTS = 1302
+BLOCK_SIZE = 10000
+
+FIRST_DAY = np.datetime64('2014-11-01')
+LAST_DAY = np.datetime64('2015-07-09')
+
+# Chances per student / enrollment / day (P_REENROLL: that a student who
+# canceled enrolls again)
+P_REENROLL = 0.6
+P_UDACITY = 0.005
+P_CANCELED = 0.6
+P_TRIAL_CANCEL = 0.35
+P_ENGAGED_DAY = 0.35
+SUBMISSIONS_PER_STUDENT = 2.8
+
+# From the sample project_submissions.csv
+LESSON_KEYS = ['3176718735', '3168208620', '3165188753', '3174288624', '4576183932',
+               '4582204201', '3184238632', '4110338963', '746169184', '4180859007']
+LESSON_WEIGHTS = [1503, 669, 622, 298, 193, 185, 127, 30, 8, 6]
+RATINGS = ['INCOMPLETE', 'PASSED', 'UNGRADED', 'DISTINCTION', '']
+RATING_WEIGHTS = [1912, 1630, 58, 36, 6]
+
+ENROLLMENT_HEADER = 'account_key,status,join_date,cancel_date,days_to_cancel,is_udacity,is_canceled\n'
+ENGAGEMENT_HEADER = ('acct,utc_date,num_courses_visited,total_minutes_visited,'
+                     'lessons_completed,projects_completed\n')
+SUBMISSION_HEADER = ('creation_date,completion_date,assigned_rating,account_key,'
+                     'lesson_key,processing_state\n')
+
+
+def day_strings(days):
+    return (FIRST_DAY + days).astype('datetime64[D]').astype(str).tolist()
+
+def weights_to_probabilities(weights):
+    weights = np.asarray(weights, dtype=np.float64)
+    return weights / weights.sum()
+
+def write_lines(f, columns):
+    if columns and len(columns[0]):
+        f.write('\n'.join(','.join(fields) for fields in zip(*columns)))
+        f.write('\n')
+
+
+# Returns the enrollments for a block of students, sorted by (student, join
+# day), as a dict of arrays: student, join (day number), days_to_cancel
+# (-1 if not canceled), and is_udacity.
+def make_enrollments(random, num_students):
+    num_days = int((LAST_DAY - FIRST_DAY).astype(np.int64))
+    days_to_cancel = lambda size: np.where(random.rand(size) < P_TRIAL_CANCEL,
+                                           random.randint(0, 8, size), random.randint(8, 150, size))
+
+    first_join = random.randint(0, num_days - 14, num_students)
+    first_canceled = random.rand(num_students) < P_CANCELED
+    first_days = np.where(first_canceled, days_to_cancel(num_students), -1)
+    first_days[first_join + first_days > num_days] = -1
+
+    # a second enrollment, after the first one was canceled
+    second_join = first_join + first_days + random.randint(0, 60, num_students)
+    has_second = ((random.rand(num_students) < P_REENROLL) & (first_days >= 0) &
+                  (second_join < num_days))
+    second_days = np.where(random.rand(num_students) < P_CANCELED, days_to_cancel(num_students), -1)
+    second_days[second_join + second_days > num_days] = -1
+
+    students = np.arange(num_students)
+    is_udacity = random.rand(num_students) < P_UDACITY
+    return {
+        'student': np.concatenate([students, students[has_second]]),
+        'join': np.concatenate([first_join, second_join[has_second]]),
+        'days_to_cancel': np.concatenate([first_days, second_days[has_second]]),
+        'is_udacity': np.concatenate([is_udacity, is_udacity[has_second]]),
+    }
+
+def write_enrollments(f, keys, enrollments):
+    days_to_cancel = enrollments['days_to_cancel']
+    canceled = days_to_cancel >= 0
+    cancel_dates = day_strings(enrollments['join'] + days_to_cancel)
+    write_lines(f, [
+        keys[enrollments['student']].tolist(),
+        np.where(canceled, 'canceled', 'current').tolist(),
+        day_strings(enrollments['join']),
+        [date if is_canceled else '' for date, is_canceled in zip(cancel_dates, canceled)],
+        [str(days) if days >= 0 else '' for days in days_to_cancel.tolist()],
+        np.where(enrollments['is_udacity'], 'True', 'False').tolist(),
+        np.where(canceled, 'True', 'False').tolist(),
+    ])
+
+# One engagement record per student per day enrolled (up to the cancel date,
+# or the last day of the data).
+def write_engagement(f, random, keys, enrollments):
+    num_days = int((LAST_DAY - FIRST_DAY).astype(np.int64))
+    ends = np.where(enrollments['days_to_cancel'] >= 0,
+                    enrollments['join'] + enrollments['days_to_cancel'], num_days + 1)
+    lengths = ends - enrollments['join']
+    enrollment_of_row = np.repeat(np.arange(len(lengths)), lengths)
+    days = (enrollments['join'][enrollment_of_row] +
+            np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+    num_rows = len(days)
+
+    engaged = random.rand(num_rows) < P_ENGAGED_DAY
+    courses = engaged * random.randint(1, 4, num_rows)
+    minutes = engaged * random.exponential(45.0, num_rows)
+    lessons = engaged * random.poisson(0.3, num_rows)
+    projects = engaged * (random.rand(num_rows) < 0.005)
+    write_lines(f, [
+        keys[enrollments['student'][enrollment_of_row]].tolist(),
+        day_strings(days),
+        ['%.1f' % count for count in courses.tolist()],
+        [repr(value) for value in minutes.tolist()],
+        ['%.1f' % count for count in lessons.tolist()],
+        ['%.1f' % count for count in projects.tolist()],
+    ])
+    return num_rows
+
+def write_submissions(f, random, keys, enrollments):
+    num_days = int((LAST_DAY - FIRST_DAY).astype(np.int64))
+    first = np.ones(len(enrollments['student']), dtype=bool)
+    first[1:] = enrollments['student'][1:] != enrollments['student'][:-1]
+    students = enrollments['student'][first]
+    joins = enrollments['join'][first]
+
+    counts = random.poisson(SUBMISSIONS_PER_STUDENT, len(students))
+    student_of_row = np.repeat(np.arange(len(students)), counts)
+    num_rows = len(student_of_row)
+    created = np.minimum(joins[student_of_row] + random.randint(0, 120, num_rows), num_days)
+    completed = np.minimum(created + random.randint(0, 6, num_rows), num_days)
+    ratings = random.choice(len(RATINGS), num_rows, p=weights_to_probabilities(RATING_WEIGHTS))
+    lessons = random.choice(len(LESSON_KEYS), num_rows, p=weights_to_probabilities(LESSON_WEIGHTS))
+    evaluated = np.array(RATINGS)[ratings] != ''
+    completed_dates = day_strings(completed)
+    write_lines(f, [
+        day_strings(created),
+        [date if is_evaluated else '' for date, is_evaluated in zip(completed_dates, evaluated)],
+        np.array(RATINGS)[ratings].tolist(),
+        keys[students[student_of_row]].tolist(),
+        np.array(LESSON_KEYS)[lessons].tolist(),
+        np.where(evaluated, 'EVALUATED', 'CREATED').tolist(),
+    ])
+    return num_rows
+
+
+# Writes the three CSV files into out_dir, and returns the number of rows
+# written to each.
+def generate(out_dir, scale=1, seed=0):
+    num_students = int(round(SAMPLE_STUDENTS * float(scale)))
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    counts = {'enrollments': 0, 'daily_engagement': 0, 'project_submissions': 0}
+    with open(os.path.join(out_dir, 'enrollments.csv'), 'wb') as enrollments_file, \
+            open(os.path.join(out_dir, 'daily_engagement.csv'), 'wb') as engagement_file, \
+            open(os.path.join(out_dir, 'project_submissions.csv'), 'wb') as submissions_file:
+        enrollments_file.write(ENROLLMENT_HEADER)
+        engagement_file.write(ENGAGEMENT_HEADER)
+        submissions_file.write(SUBMISSION_HEADER)
+        for block, first_student in enumerate(xrange(0, num_students, BLOCK_SIZE)):
+            random = np.random.RandomState([int(seed), block])
+            block_size = min(BLOCK_SIZE, num_students - first_student)
+            # account keys look like the sample's: numbers, as strings
+            keys = np.array([str(first_student + i) for i in xrange(block_size)])
+            enrollments = make_enrollments(random, block_size)
+            order = np.lexsort((enrollments['join'], enrollments['student']))
+            enrollments = dict((name, column[order]) for name, column in enrollments.items())
+
+            write_enrollments(enrollments_file, keys, enrollments)
+            counts['enrollments'] += len(order)
+            counts['daily_engagement'] += write_engagement(engagement_file, random, keys, enrollments)
+            counts['project_submissions'] += write_submissions(submissions_file, random, keys,
+                                                               enrollments)
+    return counts
+
+
+def main(out_dir, scale=1, seed=0):
+    counts = generate(out_dir, scale, seed)
+    for name in ['enrollments', 'daily_engagement', 'project_submissions']:
+        print '%-20s %10d rows' % (name, counts[name])
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
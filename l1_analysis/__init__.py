@@ -0,0 +1,17 @@
+# Helpers for the Lesson 1 (Udacity student engagement) analysis in
+# L1_Starter_Code.py.
+#
+# Analysis (analysis.py) runs the same analysis as a lazily evaluated graph of
+# datasets; python -m l1_analysis runs its reports from the command line.
+
+from l1_analysis.analysis import Analysis
+from l1_analysis.cohorts import Cohort
+from l1_analysis.columnar import (
+    Row,
+    Table,
+    load_daily_engagement,
+    load_enrollments,
+    load_project_submissions,
+    load_table,
+)
+from l1_analysis.encoding import KeyEncoder, make_encoders
@@ -0,0 +1,111 @@
+# Command line entry point: runs selected reports of the Lesson 1 analysis
+# headless, computing only the datasets they need (see analysis.py).
+#
+# Usage:
+#   python -m l1_analysis [--data-dir DIR] [--plot-dir DIR] [report ...]
+#   python -m l1_analysis --list
+#   python -m l1_analysis --profile [--profile-output FILE] [--cprofile FILE] [report ...]
+#   python -m l1_analysis --plot-processes N [--plot-format svg] [--skip-unchanged] [report ...]
+#
+# Without any report names, every report that doesn't plot is run. Reports
+# run in the order given; with --plot-processes, a plot report only queues
+# its figures (see render.py), so the reports after it print while they're
+# drawn, and the figures are waited for at the end. --skip-unchanged doesn't
+# draw figures whose inputs are the same as the last run's. --approximate
+# uses the fixed-size sketches of sketches.py for distinct counts, medians
+# and histograms. --streaming reads daily_engagement.csv a chunk at a time
+# instead of loading it (see streaming.py). --sample 0.1 loads only the rows
+# of a fixed 10% of the accounts (see sampling.py), and prints counts with
+# their scaled-up estimates.
+# --profile prints the time, rows and memory of every stage at the end (see
+# instrument.py).
+
+import optparse
+import sys
+import time
+
+from l1_analysis import instrument
+from l1_analysis.analysis import REPORTS, Analysis, dependency_order
+from l1_analysis.render import FORMATS, FigureRenderer
+from l1_analysis.sampling import AccountSample
+
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options] [report ...]')
+    parser.add_option('--data-dir', default='.', help='directory holding the CSV files')
+    parser.add_option('--cache-dir', help='cache directory (default: DATA_DIR/.l1_cache)')
+    parser.add_option('--plot-dir', default='.', help='directory to save figures in')
+    parser.add_option('--trial-days', type='int', default=7,
+                      help='length of the free trial in days (default: 7)')
+    parser.add_option('--plot-processes', type='int', default=0, metavar='N',
+                      help='draw figures in N background processes (default: 0, draw them '
+                           'before going on)')
+    parser.add_option('--plot-format', type='choice', choices=FORMATS, default='png',
+                      help='figure file format: %s (default: png)' % ', '.join(FORMATS))
+    parser.add_option('--skip-unchanged', action='store_true',
+                      help="don't redraw figures whose inputs haven't changed")
+    parser.add_option('--approximate', action='store_true',
+                      help='estimate distinct counts, medians and histograms with sketches')
+    parser.add_option('--streaming', action='store_true',
+                      help='aggregate daily_engagement.csv a chunk at a time, without loading it')
+    parser.add_option('--sample', type='float', metavar='FRACTION',
+                      help='only load the rows of this fraction of the accounts')
+    parser.add_option('--sample-seed', type='int', default=0, metavar='N',
+                      help='which accounts --sample picks (default: 0)')
+    parser.add_option('--list', action='store_true', help='list the reports and what they need')
+    parser.add_option('--profile', action='store_true',
+                      help='report the time, rows and memory of every stage')
+    parser.add_option('--profile-output', metavar='FILE',
+                      help='also save the stage report as JSON (implies --profile)')
+    parser.add_option('--cprofile', metavar='FILE',
+                      help='save cProfile statistics of the run (implies --profile)')
+    options, names = parser.parse_args(argv)
+
+    if options.list:
+        for name in sorted(REPORTS):
+            function, dependencies, plot = REPORTS[name]
+            order = dependency_order(name, options.streaming, options.approximate)
+            needs = [node for node in order if node != name]
+            print '%-20s%s needs: %s' % (name, ' (plot)' if plot else '', ', '.join(needs))
+        return
+
+    if not names:
+        names = sorted(name for name in REPORTS if not REPORTS[name][2])
+    unknown = [name for name in names if name not in REPORTS]
+    if unknown:
+        parser.error('unknown report(s): %s (see --list)' % ', '.join(unknown))
+
+    if options.profile or options.profile_output or options.cprofile:
+        instrument.enable(options.profile_output, options.cprofile)
+    sample = None
+    if options.sample is not None:
+        try:
+            sample = AccountSample(options.sample, options.sample_seed)
+        except ValueError as e:
+            parser.error(str(e))
+        print 'Using %s; counts in [] are scaled up to every account.' % sample.describe()
+        print
+    renderer = FigureRenderer(options.plot_dir, options.plot_processes, options.plot_format,
+                              options.skip_unchanged)
+    analysis = Analysis(options.data_dir, options.cache_dir, options.plot_dir,
+                        trial_days=options.trial_days, renderer=renderer,
+                        approximate=options.approximate, sample=sample,
+                        streaming=options.streaming)
+    for name in names:
+        start = time.time()
+        print '## %s' % name
+        analysis.run_report(name)
+        print '(%.3f s)' % (time.time() - start)
+        print
+        sys.stdout.flush()
+    if renderer.pending:
+        start = time.time()
+        print '## figures'
+        renderer.close()
+        print '(%.3f s)' % (time.time() - start)
+    sys.stdout.flush()
+    instrument.finish()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,466 @@
+# The Lesson 1 analysis as a lazily evaluated graph of datasets and reports.
+#
+# L1_Starter_Code.py is a notebook export: it runs every cell when imported
+# (IPython magics, seaborn and all the plots included), so it can't be used
+# from other code, and there's no way to run only part of it. Here each
+# intermediate result of the notebook is a named dataset, computed by a
+# function from the datasets it depends on:
+#
+#   analysis = Analysis('path/to/csvs')
+#   analysis['passing_students']
+#
+# computes passing_students and only what it needs (the cleaned enrollments
+# and submissions, and the paid students); daily_engagement isn't even
+# loaded.
+#
+# Computed datasets are kept in a memo.DerivedCache, keyed on the contents
+# of their inputs, with LRU eviction past max_bytes. Asking again is a
+# lookup; replacing a dataset with set() (or changing one passed to set() in
+# place) makes everything computed from it be recomputed on the next
+# request, and nothing else. Computed datasets are read-only (see
+# memo.freeze).
+#
+# Reports print (or, for plots, save) the notebook's results, computing the
+# datasets they need on demand. matplotlib and seaborn are only imported
+# once a plot report runs. Plot reports describe their figures as
+# render.FigureJobs; given a render.FigureRenderer, the figures are drawn in
+# background processes while the other reports carry on.
+#
+# With approximate=True, distinct counts, medians and histograms come from
+# fixed-size sketches (see sketches.py), printed with their error bounds; the
+# distinct students of each table are counted a chunk of its CSV file at a
+# time, without loading it.
+# With streaming=True, the first week totals, and the row and student counts
+# of daily_engagement.csv, are worked out a chunk of the file at a time (see
+# streaming.py), and the engagement table is never loaded whole.
+#
+# Given a sampling.AccountSample, only the rows of the sampled accounts are
+# loaded, and the reports print each count with its estimate over every
+# account.
+#
+# From the command line, see l1_analysis/__main__.py:
+#   python -m l1_analysis [--data-dir DIR] [--plot-dir DIR] [report ...]
+
+import os
+
+import numpy as np
+
+from l1_analysis.cache import find_udacity_test_accounts, load_cleaned_tables
+from l1_analysis.cohorts import Cohort
+from l1_analysis.columnar import ENGAGEMENT_TYPES, ENROLLMENT_TYPES, SUBMISSION_TYPES
+from l1_analysis.first_week import find_paid_students, unengaged_enrollments
+from l1_analysis.groupby import engagement_totals
+from l1_analysis.histograms import histograms_of
+from l1_analysis.instrument import count_rows, stage
+from l1_analysis.memo import DEFAULT_MAX_BYTES, DerivedCache, freeze
+from l1_analysis.render import FigureJob
+from l1_analysis.sketches import ApproximateStats, HyperLogLog, SampledHistogram, count_keys
+from l1_analysis.stats import summarize
+from l1_analysis.streaming import count_engagement_accounts, stream_first_week_engagement
+from l1_analysis.submissions import SubmissionIndex
+from l1_analysis.windows import DayOffsetIndex
+
+SUBWAY_PROJECT_LESSON_KEYS = ['746169184', '3176718735']
+PASSING_VALUES = ['PASSED', 'DISTINCTION']
+
+# name -> (function, names of the datasets it takes as arguments)
+DATASETS = {}
+# The same, for the datasets computed differently in streaming mode
+STREAMING_DATASETS = {}
+# and in approximate mode
+APPROXIMATE_DATASETS = {}
+# name -> (function, names of the datasets it takes, whether it plots)
+REPORTS = {}
+
+
+# Registers the decorated function as the dataset called name. The function
+# takes the Analysis, then the values of the named dependencies. With
+# streaming=True (or approximate=True), it's the version used in streaming
+# (or approximate) mode instead.
+def dataset(name, *dependencies, **options):
+    def register(function):
+        if options.get('approximate'):
+            registry = APPROXIMATE_DATASETS
+        elif options.get('streaming'):
+            registry = STREAMING_DATASETS
+        else:
+            registry = DATASETS
+        registry[name] = (function, dependencies)
+        return function
+    return register
+
+# Returns (function, dependencies) of a dataset, in streaming and
+# approximate mode or not (the approximate version wins if there are both).
+def definition(name, streaming=False, approximate=False):
+    if approximate and name in APPROXIMATE_DATASETS:
+        return APPROXIMATE_DATASETS[name]
+    if streaming and name in STREAMING_DATASETS:
+        return STREAMING_DATASETS[name]
+    return DATASETS[name]
+
+# Registers the decorated function as a report. Reports take the same
+# arguments as datasets, and print their results; plot reports save figures.
+def report(name, *dependencies, **options):
+    def register(function):
+        REPORTS[name] = (function, dependencies, options.get('plot', False))
+        return function
+    return register
+
+
+class Analysis(object):
+
+    # data_dir holds the CSVs; cache_dir defaults to data_dir/.l1_cache.
+    # plot_dir is where plot reports save their figures. trial_days is the
+    # length of the free trial (see first_week.find_paid_students).
+    # renderer is a render.FigureRenderer to hand the figures to (default:
+    # draw them here, as PNG files in plot_dir). approximate switches to the
+    # sketches. sample is a sampling.AccountSample to load only some of the
+    # accounts. streaming switches to the streaming versions of the datasets.
+    def __init__(self, data_dir='.', cache_dir=None, plot_dir='.', first_days=7,
+                 max_bytes=DEFAULT_MAX_BYTES, trial_days=7, renderer=None,
+                 approximate=False, sample=None, streaming=False):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir
+        self.plot_dir = plot_dir
+        self.first_days = first_days
+        self.trial_days = trial_days
+        self.renderer = renderer
+        self.approximate = approximate
+        self.sample = sample
+        self.streaming = streaming
+        self.cache = DerivedCache(max_bytes)
+        self._overrides = {}
+        self._pyplot = None
+
+    def __getitem__(self, name):
+        if name in self._overrides:
+            return self._overrides[name]
+        if name not in DATASETS:
+            raise KeyError('unknown dataset: %s' % name)
+        function, dependencies = definition(name, self.streaming, self.approximate)
+        inputs = [self[dependency] for dependency in dependencies]
+        return self.cache.get(name, inputs, lambda: self._compute(name, function, inputs))
+
+    # Computes a dataset, as a stage of its own (see instrument.py).
+    def _compute(self, name, function, inputs):
+        with stage(name, rows_in=count_rows(inputs[0]) if inputs else None) as timing:
+            value = freeze(function(self, *inputs), inputs)
+            timing.rows_out = count_rows(value)
+        return value
+
+    # Replaces a dataset with the given value (e.g. a filtered table); the
+    # datasets computed from it are recomputed when next asked for.
+    def set(self, name, value):
+        if name not in DATASETS:
+            raise KeyError('unknown dataset: %s' % name)
+        self._overrides[name] = value
+
+    # The names of the datasets currently cached.
+    @property
+    def computed(self):
+        return sorted(set(key[0] for key in self.cache.keys()))
+
+    # Forgets a dataset (undoing set(), and dropping its cached value), so
+    # it's computed again, and so is everything computed from it.
+    def invalidate(self, name):
+        self._overrides.pop(name, None)
+        self.cache.clear(name)
+
+    def run_report(self, name):
+        if name not in REPORTS:
+            raise KeyError('unknown report: %s' % name)
+        function, dependencies, plot = REPORTS[name]
+        inputs = [self[dependency] for dependency in dependencies]
+        with stage('plot ' + name if plot else 'report ' + name):
+            return function(self, *inputs)
+
+    # matplotlib.pyplot, imported on first use. Without a display (or when
+    # saving straight to files) the non-interactive Agg backend is used.
+    def pyplot(self):
+        if self._pyplot is None:
+            import matplotlib
+            if os.name != 'nt' and not os.environ.get('DISPLAY'):
+                matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+            try:
+                import seaborn
+            except ImportError:
+                pass
+            self._pyplot = plt
+        return self._pyplot
+
+    def save_figure(self, figure, filename):
+        if not os.path.exists(self.plot_dir):
+            os.makedirs(self.plot_dir)
+        path = os.path.join(self.plot_dir, filename)
+        figure.savefig(path)
+        self.pyplot().close(figure)
+        print 'saved', path
+
+    # Takes a list of render.FigureJobs, and draws and saves them, or queues
+    # them with the renderer.
+    def render_figures(self, jobs):
+        if self.renderer is not None:
+            self.renderer.submit(jobs)
+            return
+        plt = self.pyplot()
+        for job in jobs:
+            figure = plt.figure()
+            job.draw(plt, *job.args)
+            self.save_figure(figure, job.name + '.png')
+
+
+# Returns every dataset (and report) that name depends on, directly or not,
+# in an order they can be computed in (in streaming or approximate mode).
+def dependency_order(name, streaming=False, approximate=False):
+    order = []
+    def visit(node):
+        if node in order:
+            return
+        if node in DATASETS:
+            dependencies = definition(node, streaming, approximate)[1]
+        else:
+            dependencies = REPORTS[node][1]
+        for dependency in dependencies:
+            visit(dependency)
+        order.append(node)
+    visit(name)
+    return order
+
+
+## Datasets
+
+def _load(analysis, table_name):
+    return load_cleaned_tables(analysis.data_dir, analysis.cache_dir, names=[table_name],
+                               sample=analysis.sample)
+
+@dataset('enrollments')
+def enrollments(analysis):
+    return _load(analysis, 'enrollments')['enrollments']
+
+@dataset('non_udacity_enrollments')
+def non_udacity_enrollments(analysis):
+    return _load(analysis, 'enrollments')['non_udacity_enrollments']
+
+@dataset('daily_engagement')
+def daily_engagement(analysis):
+    return _load(analysis, 'daily_engagement')['daily_engagement']
+
+@dataset('non_udacity_engagement')
+def non_udacity_engagement(analysis):
+    return _load(analysis, 'daily_engagement')['non_udacity_engagement']
+
+@dataset('project_submissions')
+def project_submissions(analysis):
+    return _load(analysis, 'project_submissions')['project_submissions']
+
+@dataset('non_udacity_submissions')
+def non_udacity_submissions(analysis):
+    return _load(analysis, 'project_submissions')['non_udacity_submissions']
+
+# (account keys, most recent paid join dates), see first_week.find_paid_students
+@dataset('paid_students', 'non_udacity_enrollments')
+def paid_students(analysis, enrollments):
+    return find_paid_students(enrollments, analysis.trial_days)
+
+@dataset('engagement_windows', 'non_udacity_engagement', 'paid_students')
+def engagement_windows(analysis, engagement, paid):
+    paid_accounts, paid_join_dates = paid
+    return DayOffsetIndex(engagement, paid_accounts, paid_join_dates)
+
+@dataset('paid_engagement_in_first_week', 'non_udacity_engagement', 'engagement_windows')
+def paid_engagement_in_first_week(analysis, engagement, windows):
+    return engagement.take(windows.window_rows(0, analysis.first_days))
+
+# One row per paid student who engaged in the first week (see
+# groupby.engagement_totals).
+@dataset('first_week_totals', 'paid_engagement_in_first_week')
+def first_week_totals(analysis, first_week):
+    return engagement_totals(first_week)
+
+# In streaming mode: the same totals, aggregated from daily_engagement.csv a
+# chunk at a time (see streaming.py).
+@dataset('first_week_totals', 'enrollments', 'non_udacity_enrollments', 'paid_students',
+         streaming=True)
+def streamed_first_week_totals(analysis, enrollments, non_udacity_enrollments, paid):
+    paid_accounts, paid_join_dates = paid
+    paid_students = dict(zip(non_udacity_enrollments.decode('account_key', paid_accounts).tolist(),
+                             paid_join_dates))
+    aggregates = stream_first_week_engagement(
+        find_udacity_test_accounts(enrollments), paid_students,
+        os.path.join(analysis.data_dir, 'daily_engagement.csv'), days=analysis.first_days,
+        sample=analysis.sample)
+    return aggregates.to_table(non_udacity_enrollments.encoders.get('account_key'))
+
+# (number of rows, distinct account keys as strings) of daily_engagement:
+# all the table_sizes and unengaged_students reports need from it.
+@dataset('engagement_accounts', 'daily_engagement')
+def engagement_accounts(analysis, engagement):
+    return len(engagement), engagement.decode('acct', np.unique(engagement['acct']))
+
+# In streaming mode: the same, counted a chunk of daily_engagement.csv at a
+# time.
+@dataset('engagement_accounts', streaming=True)
+def streamed_engagement_accounts(analysis):
+    return count_engagement_accounts(os.path.join(analysis.data_dir, 'daily_engagement.csv'),
+                                     sample=analysis.sample)
+
+# (table, number of rows, number of distinct students) of each table, for
+# the table_sizes report.
+@dataset('table_counts', 'enrollments', 'engagement_accounts', 'project_submissions')
+def table_counts(analysis, enrollments, engagement_accounts, submissions):
+    num_engagement_rows, engaged = engagement_accounts
+    return [('enrollment', len(enrollments), len(np.unique(enrollments['account_key']))),
+            ('engagement', num_engagement_rows, len(engaged)),
+            ('submission', len(submissions), len(np.unique(submissions['account_key'])))]
+
+# The CSV file, column types and student column of each table
+TABLE_FILES = [
+    ('enrollment', 'enrollments.csv', ENROLLMENT_TYPES, 'account_key'),
+    ('engagement', 'daily_engagement.csv', ENGAGEMENT_TYPES, 'acct'),
+    ('submission', 'project_submissions.csv', SUBMISSION_TYPES, 'account_key'),
+]
+
+# In approximate mode: the students are counted in a sketches.HyperLogLog,
+# filled a chunk of each CSV file at a time.
+@dataset('table_counts', approximate=True)
+def sketched_table_counts(analysis):
+    counts = []
+    for name, filename, types, column in TABLE_FILES:
+        num_rows, students = count_keys(os.path.join(analysis.data_dir, filename), types,
+                                        column, sample=analysis.sample)
+        counts.append((name, num_rows, students))
+    return counts
+
+# The submissions indexed by (lesson_key, assigned_rating, account_key).
+@dataset('submission_index', 'non_udacity_submissions')
+def submission_index(analysis, submissions):
+    return SubmissionIndex(submissions)
+
+# The paid students who passed the subway project, as a cohorts.Cohort.
+@dataset('passing_students', 'submission_index', 'paid_students')
+def passing_students(analysis, index, paid):
+    paid_accounts, paid_join_dates = paid
+    accounts = index.students(SUBWAY_PROJECT_LESSON_KEYS, PASSING_VALUES, paid_accounts)
+    return Cohort.from_values(accounts, index.submissions.encoders.get('account_key'))
+
+@dataset('is_passing', 'first_week_totals', 'passing_students')
+def is_passing(analysis, totals, passing):
+    return passing.row_mask(totals)
+
+@dataset('passing_totals', 'first_week_totals', 'is_passing')
+def passing_totals(analysis, totals, passing):
+    return totals.take(passing)
+
+@dataset('non_passing_totals', 'first_week_totals', 'is_passing')
+def non_passing_totals(analysis, totals, passing):
+    return totals.take(~passing)
+
+# column -> histograms.Histogram (or sketches.SampledHistogram in approximate
+# mode), for each first week metric (see METRICS)
+def _histograms(analysis, table):
+    columns = [metric[0] for metric in METRICS]
+    if analysis.approximate:
+        return dict((column, SampledHistogram.from_values(table[column])) for column in columns)
+    return histograms_of(table, columns)
+
+@dataset('passing_histograms', 'passing_totals')
+def passing_histograms(analysis, passing):
+    return _histograms(analysis, passing)
+
+@dataset('non_passing_histograms', 'non_passing_totals')
+def non_passing_histograms(analysis, non_passing):
+    return _histograms(analysis, non_passing)
+
+
+## Reports
+
+# With approximate=True, also prints the median from a sketches.QuantileSketch,
+# and the range it's in 99% of the time.
+def print_stats(title, counts, approximate=False):
+    stats = ApproximateStats.from_values(counts) if approximate else summarize(counts)
+    print title
+    print 'Mean:', stats.mean
+    print 'Standard deviation:', stats.std
+    print 'Minimum:', stats.min
+    print 'Maximum:', stats.max
+    if approximate:
+        low, high = stats.quantile_bounds(0.5)
+        print 'Median: about %r (between %r and %r)' % (stats.median(), low, high)
+
+# Formats a count of rows or students (with its bounds, if it's an estimate)
+# for printing. When only a sample of the accounts was loaded, the count
+# over every account it stands for is added.
+def format_count(analysis, count, bounds=None):
+    text = str(count) if bounds is None else 'about %d (%d to %d)' % ((count,) + bounds)
+    if analysis.sample is not None:
+        text += ' [about %d in all]' % analysis.sample.scale_up(count)
+    return text
+
+# Formats a number of distinct values: exact, or a HyperLogLog's estimate
+# with its bounds (about 95% of the time).
+def distinct_count(analysis, distinct):
+    if not isinstance(distinct, HyperLogLog):
+        return format_count(analysis, distinct)
+    return format_count(analysis, distinct.count, distinct.bounds())
+
+# The first week metrics, as (column, title, x axis label, histogram bins)
+METRICS = [
+    ('total_minutes_visited', 'Total Minutes Visited', 'Number of Minutes Visited, Week 1', 60),
+    ('lessons_completed', 'Total Number of Lessons Completed', 'Number of Lessons Completed, Week 1', 10),
+    ('days_visited', 'Number of Days Visited', 'Number of Days Visited, Week 1', 8),
+]
+
+@report('table_sizes', 'table_counts')
+def table_sizes(analysis, counts):
+    for name, num_rows, students in counts:
+        print format_count(analysis, num_rows), name + '_num_rows'
+        print distinct_count(analysis, students), name + '_num_unique_students'
+
+# Like the notebook, over every enrollment, Udacity test accounts included.
+@report('unengaged_students', 'enrollments', 'engagement_accounts')
+def unengaged_students(analysis, enrollments, engagement_accounts):
+    unengaged = unengaged_enrollments(enrollments, engagement_accounts[1])
+    at_least_one_day = unengaged['join_date'] != unengaged['cancel_date']
+    print format_count(analysis, len(unengaged)), "enrollments with no engagement records"
+    print format_count(analysis, int(at_least_one_day.sum())), "of them enrolled at least one day"
+
+@report('paid_students', 'paid_students')
+def paid_students_report(analysis, paid):
+    print format_count(analysis, len(paid[0])), "paid students"
+
+@report('first_week', 'first_week_totals')
+def first_week(analysis, totals):
+    print format_count(analysis, int(totals['num_engagements'].sum())), "engagements in first week"
+    print format_count(analysis, len(totals)), "  paid students"
+    for column, title, label, bins in METRICS:
+        print
+        print_stats(title + " in a Student's First Week", totals[column], analysis.approximate)
+
+@report('passing', 'passing_totals', 'non_passing_totals')
+def passing(analysis, passing, non_passing):
+    print format_count(analysis, len(passing)), "students passed,", \
+        format_count(analysis, len(non_passing)), "failed"
+    for column, title, label, bins in METRICS:
+        print
+        print_stats(title + " in First Week by Students who Passed Project 1", passing[column],
+                    analysis.approximate)
+        print
+        print_stats(title + " in First Week by Students who Failed Project 1", non_passing[column],
+                    analysis.approximate)
+
+# Draws the passing and failing students' histograms of one metric.
+def draw_passing_failing(plt, passing, non_passing, bins, title, label):
+    passing.plot(bins)
+    non_passing.plot(bins)
+    plt.title(title + " in the First Week by Students who Passed/Failed Project 1")
+    plt.xlabel(label)
+    plt.ylabel("Number of Students")
+    plt.legend(['Passing', 'Failing'])
+
+@report('histograms', 'passing_histograms', 'non_passing_histograms', plot=True)
+def histograms(analysis, passing, non_passing):
+    analysis.render_figures([
+        FigureJob(column, draw_passing_failing,
+                  (passing[column], non_passing[column], bins, title, label))
+        for column, title, label, bins in METRICS])
@@ -0,0 +1,283 @@
+# On-disk cache of the cleaned tables.
+#
+# Every run of the notebook parses the three CSVs, fixes the data types,
+# renames daily_engagement's 'acct' column and removes the Udacity test
+# accounts before any analysis starts. load_cleaned_tables does that work
+# once, and saves every column of the resulting Tables as a .npy file:
+#
+#   <cache_dir>/manifest.json
+#   <cache_dir>/<table name>/<column>.npy
+#   <cache_dir>/<table name>/<column>.mask.npy   (masked columns only)
+#   <cache_dir>/encoders/<encoder name>.npy       (the strings behind the codes)
+#
+# account_key and lesson_key are stored as int32 codes (see encoding.py).
+# The encoders are shared by all the tables, and only ever grow, so a table
+# rebuilt on its own still uses the same codes as the others.
+#
+# On later runs the columns are memory-mapped straight from those files, so
+# nothing is parsed or copied. The manifest records the size, mtime and SHA-1
+# of each source CSV, and a table is rebuilt as soon as one of its sources
+# changes.
+#
+# The tables of a sample of the accounts (see sampling.py) are cached in a
+# directory of their own, <cache_dir>/<sample name>.
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from l1_analysis.cohorts import Cohort
+from l1_analysis.columnar import (
+    Table,
+    load_daily_engagement,
+    load_enrollments,
+    load_project_submissions,
+    remove_accounts,
+)
+from l1_analysis.encoding import ENCODED_COLUMNS, KeyEncoder, make_encoders
+from l1_analysis.ingest import load_all_parallel
+from l1_analysis.instrument import stage
+
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = '.l1_cache'
+
+# The cached tables, and the source CSVs each one is built from. Every table
+# depends on enrollments.csv, because that's where the Udacity test accounts
+# come from.
+DATASETS = [
+    ('enrollments', ['enrollments.csv']),
+    ('daily_engagement', ['daily_engagement.csv', 'enrollments.csv']),
+    ('project_submissions', ['project_submissions.csv', 'enrollments.csv']),
+]
+
+# The name of the Udacity-free version of each table, as used in the notebook.
+NON_UDACITY_NAMES = {
+    'enrollments': 'non_udacity_enrollments',
+    'daily_engagement': 'non_udacity_engagement',
+    'project_submissions': 'non_udacity_submissions',
+}
+
+
+## Source file signatures
+
+# Takes a filename and returns the SHA-1 of its contents, as a hex string.
+def file_hash(filename, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            digest.update(block)
+            block = f.read(block_size)
+    return digest.hexdigest()
+
+# Takes a filename and returns the signature saved in the manifest.
+def file_signature(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': file_hash(filename)}
+
+# Checks a source file against the signature saved when the cache was built.
+# Size and mtime are checked first; the file is only hashed when the size
+# matches but the mtime doesn't (e.g. the file was touched or copied), and in
+# that case the saved mtime is updated so the next check is cheap again.
+def source_unchanged(filename, saved):
+    if saved is None or not os.path.exists(filename):
+        return False
+    stat = os.stat(filename)
+    if stat.st_size != saved['size']:
+        return False
+    if stat.st_mtime == saved['mtime']:
+        return True
+    if file_hash(filename) != saved['sha1']:
+        return False
+    saved['mtime'] = stat.st_mtime
+    return True
+
+
+## Reading and writing Tables as .npy column files
+
+def save_table(table, directory):
+    os.makedirs(directory)
+    masked = []
+    for name in table.names:
+        column = table.columns[name]
+        if isinstance(column, np.ma.MaskedArray):
+            np.save(os.path.join(directory, name + '.mask.npy'), np.ma.getmaskarray(column))
+            column = column.data
+            masked.append(name)
+        np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(column))
+    return {'names': table.names, 'masked': masked, 'encoded': sorted(table.encoders),
+            'num_rows': len(table)}
+
+# Loads a Table saved by save_table. With mmap=True the columns are
+# read-only memory maps of the .npy files. encoders are the KeyEncoders
+# (by encoder name) for the encoded columns.
+def open_table(directory, info, mmap=True, encoders=None):
+    mmap_mode = 'r' if mmap else None
+    columns = {}
+    for name in info['names']:
+        column = np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+        if name in info['masked']:
+            mask = np.load(os.path.join(directory, name + '.mask.npy'), mmap_mode=mmap_mode)
+            column = np.ma.MaskedArray(column, mask=mask, copy=False)
+        columns[name] = column
+    table_encoders = {}
+    for name in info.get('encoded', []):
+        table_encoders[name] = encoders[ENCODED_COLUMNS[name]]
+    return Table(columns, info['names'], table_encoders)
+
+def save_encoders(cache_dir, encoders):
+    directory = os.path.join(cache_dir, 'encoders')
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for name, encoder in encoders.items():
+        np.save(os.path.join(directory, name + '.npy'), encoder.key_array())
+
+# Returns the encoders saved by save_encoders, or None if any are missing.
+def read_encoders(cache_dir):
+    encoders = {}
+    for name in make_encoders():
+        filename = os.path.join(cache_dir, 'encoders', name + '.npy')
+        if not os.path.exists(filename):
+            return None
+        encoders[name] = KeyEncoder(np.load(filename).tolist())
+    return encoders
+
+
+## Building the cleaned tables
+
+LOADERS = {
+    'enrollments': load_enrollments,
+    'daily_engagement': load_daily_engagement,
+    'project_submissions': load_project_submissions,
+}
+
+# Returns the Udacity test accounts, as a cohorts.Cohort.
+def find_udacity_test_accounts(enrollments):
+    return Cohort.from_column(enrollments, rows=enrollments['is_udacity'])
+
+# Loads one table from its CSV, and returns it along with its Udacity-free
+# version. Only the Udacity-free version has daily_engagement's 'acct' column
+# renamed to 'account_key': the notebook still looks at the original column
+# names before it does the renaming itself. enrollments is the enrollments
+# Table (None when cleaning the enrollments table itself). table is the
+# table already loaded from the CSV, if it has been (see ingest.py). sample
+# is a sampling.AccountSample to load only some of the accounts.
+def clean_table(name, data_dir, encoders, enrollments=None, table=None, sample=None):
+    if table is None:
+        with stage('load') as timing:
+            table = LOADERS[name](os.path.join(data_dir, name + '.csv'), encoders, sample)
+            timing.rows_out = len(table)
+    with stage('clean', rows_in=len(table)) as timing:
+        renamed = Table(table.columns, table.names, table.encoders)
+        renamed.rename_column('acct', 'account_key')
+        if enrollments is None:
+            enrollments = table
+        non_udacity_table = remove_accounts(renamed, find_udacity_test_accounts(enrollments))
+        timing.rows_out = len(non_udacity_table)
+    return table, non_udacity_table
+
+
+def read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+    return manifest
+
+def write_manifest(cache_dir, manifest):
+    filename = os.path.join(cache_dir, 'manifest.json')
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if os.path.exists(filename):
+        os.remove(filename)
+    os.rename(filename + '.tmp', filename)
+
+def is_fresh(entry, data_dir):
+    if entry is None:
+        return False
+    for source in entry['sources']:
+        if not source_unchanged(os.path.join(data_dir, source), entry['sources'][source]):
+            return False
+    return True
+
+
+# Returns a dict of the cleaned tables:
+#   enrollments, daily_engagement, project_submissions (typed, and otherwise
+#   as they are in the CSVs), and
+#   non_udacity_enrollments, non_udacity_engagement, non_udacity_submissions
+#   (without the Udacity test accounts, and with 'acct' renamed to
+#   'account_key').
+# Tables are read from cache_dir when their sources haven't changed, and are
+# rebuilt from the CSVs in data_dir (and saved to the cache) otherwise.
+# Tables whose CSV file is missing are left out.
+# names optionally limits the tables loaded (and rebuilt, if needed) to some
+# of 'enrollments', 'daily_engagement' and 'project_submissions';
+# enrollments is always loaded, since the others are cleaned with it.
+# With processes > 1, the CSVs that need rebuilding are read at the same time
+# by that many worker processes (see ingest.py); the tables are the same.
+# With a sampling.AccountSample, the tables only hold the rows of the
+# accounts in the sample.
+def load_cleaned_tables(data_dir='.', cache_dir=None, mmap=True, names=None, processes=1,
+                        sample=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(data_dir, DEFAULT_CACHE_DIR)
+    if sample is not None:
+        cache_dir = os.path.join(cache_dir, sample.name)
+    manifest = read_manifest(cache_dir)
+    encoders = read_encoders(cache_dir) if manifest is not None else None
+    if manifest is None or encoders is None:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        manifest = {'version': CACHE_VERSION, 'tables': {}}
+        encoders = make_encoders()
+
+    if not os.path.exists(os.path.join(data_dir, 'enrollments.csv')):
+        raise IOError('enrollments.csv not found in ' + data_dir)
+
+    selected = [(name, sources) for name, sources in DATASETS
+                if (names is None or name == 'enrollments' or name in names) and
+                os.path.exists(os.path.join(data_dir, sources[0]))]
+    loaded = {}
+    if processes != 1:
+        stale = [name for name, sources in selected
+                 if not is_fresh(manifest['tables'].get(name), data_dir)]
+        if stale:
+            with stage('load') as timing:
+                loaded = load_all_parallel(data_dir, processes, encoders, stale, sample=sample)
+                timing.rows_out = sum(len(table) for table in loaded.values())
+
+    tables = {}
+    rebuilt = False
+    for name, sources in selected:
+        non_udacity_name = NON_UDACITY_NAMES[name]
+        directory = os.path.join(cache_dir, name)
+        entry = manifest['tables'].get(name)
+        if not is_fresh(entry, data_dir):
+            table, non_udacity_table = clean_table(name, data_dir, encoders, tables.get('enrollments'),
+                                                   loaded.pop(name, None), sample)
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+            entry = {
+                'sources': dict((source, file_signature(os.path.join(data_dir, source)))
+                                for source in sources),
+                'tables': {
+                    name: save_table(table, os.path.join(directory, name)),
+                    non_udacity_name: save_table(non_udacity_table,
+                                                 os.path.join(directory, non_udacity_name)),
+                },
+            }
+            manifest['tables'][name] = entry
+            rebuilt = True
+        for table_name in [name, non_udacity_name]:
+            tables[table_name] = open_table(os.path.join(directory, table_name),
+                                            entry['tables'][table_name], mmap, encoders)
+    if rebuilt:
+        save_encoders(cache_dir, encoders)
+    write_manifest(cache_dir, manifest)
+    return tables
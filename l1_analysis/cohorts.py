@@ -0,0 +1,305 @@
+# Cohorts of students as compressed bitmaps over account key codes.
+#
+# The notebook builds each group of students (udacity_test_accounts,
+# engaged_students, paid_students_who_engaged_in_first_week, passing_students)
+# as a Python set of key strings, filled and then tested row by row. A Cohort
+# holds the same group as a bitmap over the dense int32 codes a KeyEncoder
+# gives the account keys (see encoding.py), compressed the way "roaring"
+# bitmaps are: the codes are split into blocks of 65536, and each block is
+# stored as either
+#   - a sorted uint16 array of the codes in it, while it holds at most
+#     ARRAY_LIMIT of them (2 bytes per student), or
+#   - a 65536-bit bitset (8 KB), once it holds more than that
+# so a cohort takes about as much memory as the smaller of the two, and
+# empty blocks take none.
+#
+# Union (|), intersection (&) and difference (-) work block by block with
+# NumPy, len() is the cardinality, and row_mask / keep / drop filter the rows
+# of a Table by its account_key column in one vectorized step:
+#
+#   udacity = Cohort.from_column(enrollments, rows=enrollments['is_udacity'])
+#   non_udacity_engagement = udacity.drop(daily_engagement)
+#   is_passing = passing_students.row_mask(first_week_totals)
+#
+# Cohorts can't be changed once made; the operations return new ones.
+
+import numpy as np
+
+from l1_analysis.encoding import KeyEncoder
+
+BLOCK_BITS = 16
+BLOCK_SIZE = 1 << BLOCK_BITS
+# Blocks with more codes than this are stored as bitsets (at 4096 codes, the
+# array and the bitset take the same 8 KB).
+ARRAY_LIMIT = 4096
+
+# Number of set bits in each byte value
+POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.int64)
+
+
+## Blocks
+# A block is a sorted np.uint16 array of codes, or an np.uint8 array of
+# BLOCK_SIZE // 8 bytes (a bitset, as made by np.packbits).
+
+def _is_bitset(block):
+    return block.dtype == np.uint8
+
+def _block_length(block):
+    if _is_bitset(block):
+        return int(POPCOUNT[block].sum())
+    return len(block)
+
+def _as_bitset(block):
+    if _is_bitset(block):
+        return block
+    bits = np.zeros(BLOCK_SIZE, dtype=bool)
+    bits[block] = True
+    return np.packbits(bits)
+
+def _as_bools(block):
+    if _is_bitset(block):
+        return np.unpackbits(block).view(bool)
+    bits = np.zeros(BLOCK_SIZE, dtype=bool)
+    bits[block] = True
+    return bits
+
+# Takes a sorted uint16 array or a bitset, and returns it in whichever form
+# is smaller, or None if it's empty.
+def _compact(block):
+    if _is_bitset(block):
+        if _block_length(block) > ARRAY_LIMIT:
+            return block
+        block = np.flatnonzero(np.unpackbits(block)).astype(np.uint16)
+    if len(block) == 0:
+        return None
+    if len(block) > ARRAY_LIMIT:
+        return _as_bitset(block)
+    return block
+
+# Takes a block and a uint16 array, and returns a boolean array saying which
+# of the values are in the block.
+def _block_contains(block, values):
+    if _is_bitset(block):
+        return np.unpackbits(block)[values].view(bool)
+    return np.in1d(values, block, assume_unique=True)
+
+def _block_and(a, b):
+    if not _is_bitset(a):
+        return _compact(a[_block_contains(b, a)])
+    if not _is_bitset(b):
+        return _compact(b[_block_contains(a, b)])
+    return _compact(a & b)
+
+def _block_or(a, b):
+    if not _is_bitset(a) and not _is_bitset(b):
+        return _compact(np.union1d(a, b))
+    return _compact(_as_bitset(a) | _as_bitset(b))
+
+def _block_difference(a, b):
+    if not _is_bitset(a):
+        return _compact(a[~_block_contains(b, a)])
+    return _compact(a & ~_as_bitset(b))
+
+
+class Cohort(object):
+
+    # blocks maps the high bits of the codes (code >> BLOCK_BITS) to the
+    # block holding their low bits; use the from_* constructors instead.
+    # encoder is the KeyEncoder the codes come from (used to turn them back
+    # into account keys, and to look up string keys).
+    def __init__(self, blocks=None, encoder=None):
+        self.blocks = dict(blocks or {})
+        self.encoder = encoder
+        self._length = None
+        self._mask = None
+
+    # Takes an array of codes (in any order, repeats and -1s allowed).
+    @classmethod
+    def from_codes(cls, codes, encoder=None):
+        codes = np.unique(np.asarray(codes, dtype=np.int64))
+        codes = codes[codes >= 0]
+        blocks = {}
+        if len(codes):
+            high = codes >> BLOCK_BITS
+            starts = np.flatnonzero(np.concatenate([[True], high[1:] != high[:-1]]))
+            ends = np.append(starts[1:], len(codes))
+            low = (codes & (BLOCK_SIZE - 1)).astype(np.uint16)
+            for start, end in zip(starts, ends):
+                blocks[int(high[start])] = _compact(low[start:end])
+        return cls(blocks, encoder)
+
+    # Takes a boolean array indexed by code (like KeyEncoder.bitmap's).
+    @classmethod
+    def from_mask(cls, mask, encoder=None):
+        return cls.from_codes(np.flatnonzero(mask), encoder)
+
+    # Takes account keys (strings). Keys the encoder doesn't know are left
+    # out; without an encoder, the cohort gets one of its own.
+    @classmethod
+    def from_keys(cls, keys, encoder=None):
+        keys = np.array(list(keys), dtype=np.unicode_)
+        if encoder is None:
+            encoder = KeyEncoder()
+            return cls.from_codes(encoder.encode(keys), encoder)
+        return cls.from_codes(encoder.encode(keys, add=False), encoder)
+
+    # Takes key values as stored in a Table column: codes from encoder, or
+    # strings if the column isn't encoded (encoder is None).
+    @classmethod
+    def from_values(cls, values, encoder=None):
+        if encoder is None:
+            return cls.from_keys(np.unique(values))
+        return cls.from_codes(values, encoder)
+
+    # The distinct values of a Table's key column, optionally only in the
+    # selected rows (a boolean mask or row indexes), e.g.
+    #   Cohort.from_column(daily_engagement)   # the engaged students
+    @classmethod
+    def from_column(cls, table, column='account_key', rows=None):
+        values = table[column] if rows is None else table[column][rows]
+        return cls.from_values(values, table.encoders.get(column))
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(_block_length(block) for block in self.blocks.values())
+        return self._length
+
+    def __repr__(self):
+        return '<Cohort %d accounts, %d bytes>' % (len(self), self.nbytes)
+
+    # The memory taken by the blocks, in bytes.
+    @property
+    def nbytes(self):
+        return sum(block.nbytes for block in self.blocks.values())
+
+    # Takes a code, or an account key if the cohort has an encoder.
+    def __contains__(self, key):
+        if isinstance(key, basestring):
+            if self.encoder is None:
+                return False
+            key = self.encoder.codes.get(key)
+            if key is None:
+                return False
+        mask = self.to_mask()
+        return 0 <= key < len(mask) and bool(mask[key])
+
+    # Yields the account keys (or the codes, without an encoder), in code
+    # order, like iterating over a set of keys.
+    def __iter__(self):
+        if self.encoder is None:
+            return iter(self.codes().tolist())
+        return iter(self.keys().tolist())
+
+    def __eq__(self, other):
+        return (isinstance(other, Cohort) and len(self) == len(other) and
+                np.array_equal(self.codes(), other.codes()))
+
+    def __ne__(self, other):
+        return not self == other
+
+    # All the codes in the cohort, as a sorted int64 array.
+    def codes(self):
+        parts = []
+        for high in sorted(self.blocks):
+            block = self.blocks[high]
+            if _is_bitset(block):
+                low = np.flatnonzero(np.unpackbits(block))
+            else:
+                low = block.astype(np.int64)
+            parts.append((high << BLOCK_BITS) + low)
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    # The account keys in the cohort, as an array of strings.
+    def keys(self):
+        if self.encoder is None:
+            raise ValueError('cohort has no encoder to decode its codes')
+        return self.encoder.decode(self.codes())
+
+    ## Set operations
+
+    def _check_encoder(self, other):
+        if self.encoder is not None and other.encoder is not None and \
+                self.encoder is not other.encoder:
+            raise ValueError('cohorts use different key encoders')
+        return self.encoder if self.encoder is not None else other.encoder
+
+    def union(self, other):
+        encoder = self._check_encoder(other)
+        blocks = dict(self.blocks)
+        for high, block in other.blocks.items():
+            blocks[high] = _block_or(blocks[high], block) if high in blocks else block
+        return Cohort(blocks, encoder)
+
+    def intersection(self, other):
+        encoder = self._check_encoder(other)
+        blocks = {}
+        for high in set(self.blocks) & set(other.blocks):
+            block = _block_and(self.blocks[high], other.blocks[high])
+            if block is not None:
+                blocks[high] = block
+        return Cohort(blocks, encoder)
+
+    def difference(self, other):
+        encoder = self._check_encoder(other)
+        blocks = {}
+        for high, block in self.blocks.items():
+            if high in other.blocks:
+                block = _block_difference(block, other.blocks[high])
+            if block is not None:
+                blocks[high] = block
+        return Cohort(blocks, encoder)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    ## Filtering
+
+    # A boolean array indexed by code, True for the codes in the cohort, at
+    # least size long.
+    def to_mask(self, size=0):
+        size = max(size, (max(self.blocks) + 1) * BLOCK_SIZE if self.blocks else 0)
+        if self._mask is None or len(self._mask) < size:
+            mask = np.zeros(size, dtype=bool)
+            for high, block in self.blocks.items():
+                start = high << BLOCK_BITS
+                if _is_bitset(block):
+                    mask[start:start + BLOCK_SIZE] = _as_bools(block)
+                else:
+                    mask[start + block.astype(np.int64)] = True
+            self._mask = mask
+        return self._mask
+
+    # Takes an array of codes, and returns a boolean array saying which are
+    # in the cohort (-1, for unknown keys, never is).
+    def contains(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) == 0:
+            return np.zeros(0, dtype=bool)
+        mask = self.to_mask(int(codes.max()) + 1)
+        return mask[np.maximum(codes, 0)] & (codes >= 0)
+
+    # Takes a Table, and returns a boolean array with one entry per row, True
+    # where the row's column value (an account key by default) is in the
+    # cohort.
+    def row_mask(self, table, column='account_key'):
+        values = table[column]
+        encoder = table.encoders.get(column)
+        if encoder is not None and (encoder is self.encoder or self.encoder is None):
+            return self.contains(values)
+        if encoder is not None:
+            # the table's codes come from another encoder: match on the keys
+            return Cohort.from_keys(self.keys(), encoder).contains(values)
+        if self.encoder is None:
+            raise ValueError('cohort has no encoder to match the %s strings' % column)
+        return self.contains(self.encoder.encode(values, add=False))
+
+    # Returns a new Table with only the rows in the cohort.
+    def keep(self, table, column='account_key'):
+        return table.take(self.row_mask(table, column))
+
+    # Returns a new Table without the rows in the cohort.
+    def drop(self, table, column='account_key'):
+        return table.take(~self.row_mask(table, column))
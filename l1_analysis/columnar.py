@@ -0,0 +1,310 @@
+# Columnar loaders for the enrollments, daily_engagement and project_submissions
+# tables.
+#
+# The notebook originally read every CSV into a list of dicts of strings, and
+# then walked each list a second time to fix up the data types. Here each table
+# is parsed in one pass, a chunk of rows at a time, straight into typed NumPy
+# columns:
+#   - dates become datetime64[D] (blank dates become NaT)
+#   - days_to_cancel becomes a masked int64 array (blank cells are masked)
+#   - 'True'/'False' strings become bools
+#   - the engagement counts become int64 and the minutes float64
+#   - optionally, account_key/acct and lesson_key become int32 codes
+#     (see encoding.py)
+# A Table still hands out dict-like rows, so the analysis code in
+# L1_Starter_Code.py keeps working unchanged.
+
+import numpy as np
+import unicodecsv
+
+from l1_analysis.cohorts import Cohort
+from l1_analysis.dates import datetime_from_day, parse_date_column
+from l1_analysis.encoding import column_encoders
+
+# Number of CSV rows converted to columns at a time.
+CHUNK_SIZE = 65536
+
+
+# Column parsers: each takes a list of strings (one column of one chunk)
+# and returns a typed NumPy array.
+def parse_str_column(values):
+    return np.array(values, dtype=np.unicode_)
+
+def parse_maybe_int_column(values):
+    strings = np.array(values, dtype=np.unicode_)
+    missing = strings == u''
+    strings[missing] = u'0'
+    return np.ma.MaskedArray(strings.astype(np.int64), mask=missing)
+
+def parse_bool_column(values):
+    return np.array(values, dtype=np.unicode_) == u'True'
+
+def parse_int_from_float_column(values):
+    # Same as int(float(value)): the counts are stored as '1.0', '2.0', ...
+    return np.array(values, dtype=np.unicode_).astype(np.float64).astype(np.int64)
+
+def parse_float_column(values):
+    return np.array(values, dtype=np.unicode_).astype(np.float64)
+
+COLUMN_PARSERS = {
+    'str': parse_str_column,
+    'date': parse_date_column,
+    'maybe_int': parse_maybe_int_column,
+    'bool': parse_bool_column,
+    'int_from_float': parse_int_from_float_column,
+    'float': parse_float_column,
+}
+
+# Column types for each table. Columns not listed are kept as strings.
+ENROLLMENT_TYPES = {
+    'cancel_date': 'date',
+    'days_to_cancel': 'maybe_int',
+    'is_canceled': 'bool',
+    'is_udacity': 'bool',
+    'join_date': 'date',
+}
+
+ENGAGEMENT_TYPES = {
+    'lessons_completed': 'int_from_float',
+    'num_courses_visited': 'int_from_float',
+    'projects_completed': 'int_from_float',
+    'total_minutes_visited': 'float',
+    'utc_date': 'date',
+}
+
+SUBMISSION_TYPES = {
+    'completion_date': 'date',
+    'creation_date': 'date',
+}
+
+
+# Takes a single value from a column and returns the plain Python value the
+# old cleaning loops produced: datetime for dates, None for blank cells,
+# and int/float/bool/unicode for everything else.
+def to_python(value):
+    if value is np.ma.masked:
+        return None
+    if isinstance(value, np.datetime64):
+        return datetime_from_day(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# A read-only, dict-like view of one row of a Table.
+class Row(object):
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        value = self.table.columns[key][self.index]
+        encoder = self.table.encoders.get(key)
+        if encoder is not None:
+            return encoder.decode_one(value)
+        return to_python(value)
+
+    def get(self, key, default=None):
+        if key in self.table.columns:
+            return self[key]
+        return default
+
+    def __contains__(self, key):
+        return key in self.table.columns
+
+    def __iter__(self):
+        return iter(self.table.names)
+
+    def __len__(self):
+        return len(self.table.names)
+
+    def keys(self):
+        return list(self.table.names)
+
+    def values(self):
+        return [self[name] for name in self.table.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.table.names]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+# A table stored as one NumPy array per column.
+# Integer indexing returns a Row, so a Table can be used wherever the
+# notebook expects a list of dicts. Indexing by column name returns the
+# whole column.
+# encoders maps the names of dictionary-encoded columns to their KeyEncoder:
+# those columns hold int32 codes, which Rows and decode() turn back into
+# strings.
+class Table(object):
+
+    def __init__(self, columns, names=None, encoders=None):
+        self.columns = dict(columns)
+        if names is None:
+            names = sorted(self.columns)
+        self.names = list(names)
+        self.encoders = dict(encoders or {})
+
+    def __len__(self):
+        if not self.names:
+            return 0
+        return len(self.columns[self.names[0]])
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield Row(self, index)
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            return self.columns[key]
+        if isinstance(key, (int, long, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError('Table index out of range')
+            return Row(self, key)
+        return self.take(key)
+
+    def __repr__(self):
+        return '<Table %d rows: %s>' % (len(self), ', '.join(self.names))
+
+    def column(self, name):
+        return self.columns[name]
+
+    # Takes a column name and an array of values as stored in that column
+    # (the whole column if not given), and returns them as strings if the
+    # column is encoded, or unchanged if it isn't.
+    def decode(self, name, values=None):
+        if values is None:
+            values = self.columns[name]
+        encoder = self.encoders.get(name)
+        if encoder is None:
+            return values
+        return encoder.decode(values)
+
+    # The opposite of decode: takes a column name and a list of strings, and
+    # returns them as stored in that column (codes, with -1 for unknown keys,
+    # if the column is encoded).
+    def encode(self, name, keys):
+        encoder = self.encoders.get(name)
+        if encoder is None:
+            return np.asarray(keys)
+        return encoder.encode(np.array(list(keys), dtype=np.unicode_), add=False)
+
+    # Returns a new Table holding only the selected rows. The selector can be
+    # a slice, a boolean mask or an array of row indexes.
+    def take(self, selector):
+        columns = {}
+        for name in self.names:
+            columns[name] = self.columns[name][selector]
+        return Table(columns, self.names, self.encoders)
+
+    # Renames a column in place (used for daily_engagement's 'acct' column).
+    def rename_column(self, old, new):
+        if old not in self.columns:
+            return
+        self.columns[new] = self.columns.pop(old)
+        self.names[self.names.index(old)] = new
+        if old in self.encoders:
+            self.encoders[new] = self.encoders.pop(old)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = list(tables)
+        if not tables:
+            return cls({})
+        names = tables[0].names
+        columns = {}
+        for name in names:
+            parts = [table.columns[name] for table in tables]
+            if any(isinstance(part, np.ma.MaskedArray) for part in parts):
+                columns[name] = np.ma.concatenate(parts)
+            else:
+                columns[name] = np.concatenate(parts)
+        return cls(columns, names, tables[0].encoders)
+
+
+# Takes a header and a list of CSV rows (lists of strings) and returns a Table
+# with each column converted using the given column types. Columns with an
+# entry in encoders (column name -> KeyEncoder) are stored as codes.
+def rows_to_table(header, rows, types, encoders=None):
+    encoders = encoders or {}
+    if rows:
+        cells = zip(*rows)
+    else:
+        cells = [()] * len(header)
+    columns = {}
+    for name, values in zip(header, cells):
+        parser = COLUMN_PARSERS[types.get(name, 'str')]
+        columns[name] = parser(list(values))
+        if name in encoders:
+            columns[name] = encoders[name].encode(columns[name])
+    return Table(columns, header, encoders)
+
+
+# Reads a CSV file and yields it as a sequence of Tables of at most
+# chunk_size rows each. encoders is an optional dict of KeyEncoders from
+# encoding.make_encoders(); if given, the key columns are dictionary-encoded.
+# If offset is given, rows are read from that byte position on (e.g. the end
+# of the file as it was last time, to read only the rows appended since);
+# the header is still read from the start of the file.
+# sample is an optional sampling.AccountSample: the rows of the accounts
+# not in it are skipped as they're read, and never converted.
+def iter_table_chunks(filename, types, chunk_size=CHUNK_SIZE, encoders=None, offset=None,
+                      sample=None):
+    with open(filename, 'rb') as f:
+        reader = unicodecsv.reader(f)
+        header = next(reader)
+        if offset is not None:
+            f.seek(offset)
+        encoders = column_encoders(header, encoders)
+        key_position = sample.key_position(header) if sample is not None else None
+        rows = []
+        num_chunks = 0
+        for row in reader:
+            if key_position is not None and not sample.keeps_key(row[key_position]):
+                continue
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield rows_to_table(header, rows, types, encoders)
+                num_chunks += 1
+                rows = []
+        # always yield at least one (possibly empty) chunk, so the columns exist
+        if rows or num_chunks == 0:
+            yield rows_to_table(header, rows, types, encoders)
+
+
+# Reads a whole CSV file (or the rows of a sample of the accounts) into a
+# single typed Table.
+def load_table(filename, types, chunk_size=CHUNK_SIZE, encoders=None, sample=None):
+    chunks = list(iter_table_chunks(filename, types, chunk_size, encoders, sample=sample))
+    if len(chunks) == 1:
+        return chunks[0]
+    return Table.concat(chunks)
+
+
+def load_enrollments(filename='enrollments.csv', encoders=None, sample=None):
+    return load_table(filename, ENROLLMENT_TYPES, encoders=encoders, sample=sample)
+
+def load_daily_engagement(filename='daily_engagement.csv', encoders=None, sample=None):
+    return load_table(filename, ENGAGEMENT_TYPES, encoders=encoders, sample=sample)
+
+def load_project_submissions(filename='project_submissions.csv', encoders=None, sample=None):
+    return load_table(filename, SUBMISSION_TYPES, encoders=encoders, sample=sample)
+
+
+# Given a Table with an account_key column, returns a new Table without the
+# rows for any of the given accounts (e.g. the Udacity test accounts).
+# account_keys is a cohorts.Cohort, or strings; either way the rows are
+# dropped with one vectorized mask.
+def remove_accounts(table, account_keys):
+    if not isinstance(account_keys, Cohort):
+        account_keys = Cohort.from_keys(account_keys, table.encoders.get('account_key'))
+    return account_keys.drop(table)
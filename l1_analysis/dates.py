@@ -0,0 +1,71 @@
+# Fast date parsing for the 'YYYY-MM-DD' dates used in all three tables.
+#
+# The notebook's parse_date calls datetime.strptime for every date cell, but
+# the data only holds a few hundred distinct days. The functions here:
+#   - parse_iso_date: parses the fixed format directly, without strptime
+#   - parse_date: same results as the notebook's parse_date, but remembers
+#     every date string it has seen, so each distinct day is parsed once
+#   - parse_date_column: converts a whole column at once to datetime64[D]
+
+from datetime import datetime as dt
+
+import numpy as np
+
+# parse_date stops adding to its cache once it holds this many dates
+# (a few hundred distinct days are expected, so this is only a safety net).
+MAX_CACHED_DATES = 100000
+
+_date_cache = {}
+_day_cache = {}
+
+# datetime64[D] NaT, viewed as a day number
+_NAT_DAY = np.datetime64('NaT', 'D').astype(np.int64)
+
+
+# Takes a date string in exactly the form 'YYYY-MM-DD' and returns a Python
+# datetime object. Anything else falls back to strptime, so bad dates raise
+# the same ValueError as before.
+def parse_iso_date(date):
+    year, month, day = date[0:4], date[5:7], date[8:10]
+    if len(date) == 10 and date[4] == '-' and date[7] == '-' and (year + month + day).isdigit():
+        try:
+            return dt(int(year), int(month), int(day))
+        except ValueError:
+            pass
+    return dt.strptime(date, '%Y-%m-%d')
+
+# Takes a date as a string, and returns a Python datetime object.
+# If there is no date given, returns None
+def parse_date(date):
+    if date == '':
+        return None
+    parsed = _date_cache.get(date)
+    if parsed is None:
+        parsed = parse_iso_date(date)
+        if len(_date_cache) < MAX_CACHED_DATES:
+            _date_cache[date] = parsed
+    return parsed
+
+# Takes a list (or array) of date strings and returns a datetime64[D] array.
+# Empty strings become NaT.
+def parse_date_column(values):
+    return np.array(values, dtype='datetime64[D]')
+
+# Takes a datetime64[D] value and returns a Python datetime object, or None
+# for NaT. Used when handing out rows from a columnar Table.
+def datetime_from_day(day):
+    day_number = day.astype(np.int64)
+    if day_number == _NAT_DAY:
+        return None
+    parsed = _day_cache.get(day_number)
+    if parsed is None:
+        date = day.item()
+        parsed = dt(date.year, date.month, date.day)
+        if len(_day_cache) < MAX_CACHED_DATES:
+            _day_cache[day_number] = parsed
+    return parsed
+
+# Empties the caches used by parse_date and datetime_from_day.
+def clear_date_caches():
+    _date_cache.clear()
+    _day_cache.clear()
@@ -0,0 +1,110 @@
+# Dictionary encoding of the key columns (account_key and lesson_key).
+#
+# The keys are short strings like u'448', and the notebook hashes them again
+# for every set or dict lookup. A KeyEncoder gives each distinct key a dense
+# int32 code (0, 1, 2, ...) when the table is loaded, so key columns become
+# small int32 arrays, and sets or dicts of keys become boolean arrays or
+# lookup arrays indexed by code. One encoder is shared by every table, so
+# equal keys get equal codes and the tables can be joined on the codes
+# directly. Rows still hand out the original strings (see Table.decode).
+
+import numpy as np
+
+# The encoder used for each key column in the CSV files. daily_engagement's
+# 'acct' column holds account keys too, so it shares the account_key encoder.
+ENCODED_COLUMNS = {
+    'account_key': 'account_key',
+    'acct': 'account_key',
+    'lesson_key': 'lesson_key',
+}
+
+
+# Maps strings to dense int32 codes, in the order they are first added.
+# Codes never change once given out, so an encoder can keep growing as more
+# data is loaded.
+class KeyEncoder(object):
+
+    def __init__(self, keys=()):
+        self.keys = []
+        self.codes = {}
+        self._key_array = None
+        for key in keys:
+            self.codes[key] = len(self.keys)
+            self.keys.append(key)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return '<KeyEncoder %d keys>' % len(self.keys)
+
+    # Takes an array of strings and returns their codes as an int32 array.
+    # New strings get new codes, unless add=False, in which case they get -1.
+    def encode(self, values, add=True):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return np.zeros(0, dtype=np.int32)
+        # look up each distinct string once, not once per row
+        distinct, inverse = np.unique(values, return_inverse=True)
+        distinct_codes = np.empty(len(distinct), dtype=np.int32)
+        for i, key in enumerate(distinct.tolist()):
+            code = self.codes.get(key)
+            if code is None:
+                if add:
+                    code = len(self.keys)
+                    self.codes[key] = code
+                    self.keys.append(key)
+                    self._key_array = None
+                else:
+                    code = -1
+            distinct_codes[i] = code
+        return distinct_codes[inverse]
+
+    # Takes an array of codes and returns the strings they stand for. Codes
+    # of -1 (unknown keys, see encode) raise a ValueError, rather than
+    # wrapping around to the last key.
+    def decode(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        if codes.size and codes.min() < 0:
+            raise ValueError('cannot decode unknown key code %d' % codes.min())
+        return self.key_array()[codes]
+
+    def decode_one(self, code):
+        if code < 0:
+            raise ValueError('cannot decode unknown key code %d' % code)
+        return self.keys[code]
+
+    # All the keys, as an array indexed by code.
+    def key_array(self):
+        if self._key_array is None or len(self._key_array) != len(self.keys):
+            self._key_array = np.array(self.keys, dtype=np.unicode_)
+        return self._key_array
+
+    # Takes an array of codes and returns a boolean array indexed by code,
+    # True for the given codes: the array version of a set of keys.
+    # Codes of -1 (unknown keys) are ignored.
+    def bitmap(self, codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        bitmap = np.zeros(len(self.keys), dtype=bool)
+        bitmap[codes[codes >= 0]] = True
+        return bitmap
+
+
+# Returns a new set of encoders, one for each kind of key.
+def make_encoders():
+    return {
+        'account_key': KeyEncoder(),
+        'lesson_key': KeyEncoder(),
+    }
+
+# Takes a CSV header and the encoders from make_encoders, and returns a dict
+# of column name -> encoder for the columns of that header that get encoded.
+def column_encoders(header, encoders):
+    if not encoders:
+        return {}
+    result = {}
+    for name in header:
+        encoder_name = ENCODED_COLUMNS.get(name)
+        if encoder_name in encoders:
+            result[name] = encoders[encoder_name]
+    return result
@@ -0,0 +1,324 @@
+# An on-disk, account-partitioned store of the engagement table.
+#
+# The notebook holds the engagement data several times over: the whole
+# daily_engagement table, paid_engagement_in_first_week, and
+# engagement_by_account (a defaultdict(list) of the same rows, grouped by
+# student). An EngagementStore keeps the engagement rows on disk instead,
+# grouped by student, and maps them in on demand:
+#
+#   <directory>/store.json
+#   <directory>/account_keys.npy               (the strings behind the codes)
+#   <directory>/part-<n>/<column>.npy          (one file per column)
+#   <directory>/part-<n>/offsets.npy
+#
+# Partition n holds the students whose account code is in
+#   [n * accounts_per_partition, (n + 1) * accounts_per_partition)
+# with their rows sorted by (account, utc_date), ties in file order, and
+# offsets.npy gives, for every account code in the partition, where its rows
+# start and end. The columns are memory-mapped, so store[account_key] is a
+# Table of zero-copy slices of the mapped files, and only the pages that are
+# actually read are in memory.
+#
+# Since each student's rows are in date order, any window of days after a
+# student's join date is also one slice; windows() gives a read-only dict of
+# them that can stand in for engagement_by_account:
+#
+#   store = open_engagement_store('.')
+#   engagement_by_account = store.windows(paid_account_keys, paid_join_dates, 0, 7)
+#   for engagement in engagement_by_account[account_key]: ...
+#
+# The store is built from the CSV a chunk at a time (see
+# build_engagement_store), so building it doesn't need the whole table in
+# memory either: only one chunk, and then one partition at a time. It can
+# leave accounts out as it's built (e.g. the Udacity test accounts), and
+# hold only the accounts of a sampling.AccountSample; the store of a sample
+# is kept in a directory of its own, as the cleaned tables are.
+#
+#   store = open_engagement_store('.', exclude=udacity_test_accounts, sample=sample)
+#
+# tests/test_engagement_store.py checks it against the in-memory tables. To
+# time building it and taking the first week windows:
+#   python benchmarks/bench_engagement_store.py [data_dir]
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from l1_analysis.cache import DEFAULT_CACHE_DIR, file_signature, source_unchanged
+from l1_analysis.columnar import (
+    CHUNK_SIZE,
+    ENGAGEMENT_TYPES,
+    Table,
+    iter_table_chunks,
+    remove_accounts,
+)
+from l1_analysis.encoding import KeyEncoder
+
+STORE_VERSION = 2
+ACCOUNTS_PER_PARTITION = 4096
+# Day numbers are below this, so (account, day) fits in one int64.
+_DAY_RANGE = 1 << 20
+
+
+def _partition_directory(directory, number):
+    return os.path.join(directory, 'part-%05d' % number)
+
+# Takes the account keys left out of a store (strings, or a cohorts.Cohort),
+# and returns (sorted keys, the SHA-1 of them saved in store.json).
+def _excluded_keys(exclude):
+    keys = sorted(set(exclude or ()))
+    return keys, hashlib.sha1(u'\n'.join(keys).encode('utf-8')).hexdigest()
+
+# Reads the engagement CSV a chunk at a time, and writes the rows of each
+# partition into raw column files (<column>.bin) in directory, in file
+# order, leaving out the rows of the accounts in exclude (a list of keys)
+# and of those not in sample. Returns (column names, dtypes by name,
+# partition numbers, the account key encoder).
+def _write_raw_partitions(filename, directory, accounts_per_partition, chunk_size, exclude,
+                          sample):
+    encoders = {'account_key': KeyEncoder()}
+    names = dtypes = None
+    partitions = set()
+    for chunk in iter_table_chunks(filename, ENGAGEMENT_TYPES, chunk_size, encoders,
+                                   sample=sample):
+        chunk.rename_column('acct', 'account_key')
+        if exclude:
+            chunk = remove_accounts(chunk, exclude)
+        if names is None:
+            names = chunk.names
+            dtypes = dict((name, chunk[name].dtype) for name in names)
+            strings = [name for name in names if dtypes[name].kind in 'SU']
+            if strings:
+                raise ValueError('string columns can\'t be stored: %s' % ', '.join(strings))
+        numbers = chunk['account_key'] // accounts_per_partition
+        order = np.argsort(numbers, kind='mergesort')
+        numbers = numbers[order]
+        bounds = np.flatnonzero(np.concatenate([[True], numbers[1:] != numbers[:-1], [True]]))
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            number = int(numbers[start])
+            part_directory = _partition_directory(directory, number)
+            if number not in partitions:
+                os.makedirs(part_directory)
+                partitions.add(number)
+            rows = order[start:end]
+            for name in names:
+                with open(os.path.join(part_directory, name + '.bin'), 'ab') as f:
+                    np.ascontiguousarray(chunk[name][rows]).tofile(f)
+    return names or [], dtypes or {}, sorted(partitions), encoders['account_key']
+
+# Builds the store for the engagement CSV filename in directory, replacing
+# whatever is there. exclude is optional account keys (strings, or a
+# cohorts.Cohort) whose rows are left out, and sample an optional
+# sampling.AccountSample whose accounts are the only ones kept.
+def build_engagement_store(filename, directory, accounts_per_partition=ACCOUNTS_PER_PARTITION,
+                           chunk_size=CHUNK_SIZE, exclude=None, sample=None):
+    building = directory + '.building'
+    if os.path.exists(building):
+        shutil.rmtree(building)
+    os.makedirs(building)
+    excluded, excluded_hash = _excluded_keys(exclude)
+    names, dtypes, partitions, encoder = _write_raw_partitions(
+        filename, building, accounts_per_partition, chunk_size, excluded, sample)
+
+    num_rows = 0
+    for number in partitions:
+        part_directory = _partition_directory(building, number)
+        columns = {}
+        for name in names:
+            raw = os.path.join(part_directory, name + '.bin')
+            columns[name] = np.fromfile(raw, dtype=dtypes[name])
+            os.remove(raw)
+        days = columns['utc_date'].astype(np.int64)
+        order = np.lexsort((np.arange(len(days)), days, columns['account_key']))
+        for name in names:
+            np.save(os.path.join(part_directory, name + '.npy'), columns[name][order])
+        first_code = number * accounts_per_partition
+        account_codes = np.arange(first_code, first_code + accounts_per_partition + 1)
+        offsets = np.searchsorted(columns['account_key'][order], account_codes)
+        np.save(os.path.join(part_directory, 'offsets.npy'), offsets.astype(np.int64))
+        num_rows += len(order)
+
+    np.save(os.path.join(building, 'account_keys.npy'), encoder.key_array())
+    info = {
+        'version': STORE_VERSION,
+        'names': names,
+        'dtypes': dict((name, dtypes[name].str) for name in names),
+        'accounts_per_partition': accounts_per_partition,
+        'partitions': partitions,
+        'num_rows': num_rows,
+        'source': file_signature(filename),
+        'excluded': excluded_hash,
+        'sample': sample.name if sample is not None else None,
+    }
+    with open(os.path.join(building, 'store.json'), 'w') as f:
+        json.dump(info, f, indent=2, sort_keys=True)
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.rename(building, directory)
+    return EngagementStore(directory)
+
+# Opens the store of data_dir/daily_engagement.csv, kept in
+# cache_dir/engagement_store (cache_dir defaults to data_dir/.l1_cache, and
+# the store of a sample is in cache_dir/<sample name>/engagement_store), and
+# builds it first if it's missing, the CSV has changed since, or it was
+# built without the same accounts excluded. exclude and sample are as for
+# build_engagement_store.
+def open_engagement_store(data_dir='.', cache_dir=None, exclude=None, sample=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(data_dir, DEFAULT_CACHE_DIR)
+    if sample is not None:
+        cache_dir = os.path.join(cache_dir, sample.name)
+    filename = os.path.join(data_dir, 'daily_engagement.csv')
+    directory = os.path.join(cache_dir, 'engagement_store')
+    try:
+        store = EngagementStore(directory)
+        if store.info.get('version') == STORE_VERSION and \
+                store.info['excluded'] == _excluded_keys(exclude)[1] and \
+                source_unchanged(filename, store.info['source']):
+            return store
+    except (IOError, ValueError, KeyError):
+        pass
+    return build_engagement_store(filename, directory, exclude=exclude, sample=sample)
+
+
+class EngagementStore(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'store.json')) as f:
+            self.info = json.load(f)
+        self.names = self.info['names']
+        self.accounts_per_partition = self.info['accounts_per_partition']
+        self.partitions = self.info['partitions']
+        self.encoder = KeyEncoder(np.load(os.path.join(directory, 'account_keys.npy')).tolist())
+        self._open_partitions = {}
+
+    def __len__(self):
+        return self.info['num_rows']
+
+    def __repr__(self):
+        return '<EngagementStore %d rows, %d accounts, %d partitions>' % (
+            len(self), len(self.encoder), len(self.partitions))
+
+    # Returns (table, offsets) for a partition: a Table of memory-mapped
+    # columns, and the offsets of each account's rows in it.
+    def partition(self, number):
+        if number not in self._open_partitions:
+            part_directory = _partition_directory(self.directory, number)
+            columns = dict((name, np.load(os.path.join(part_directory, name + '.npy'), mmap_mode='r'))
+                           for name in self.names)
+            table = Table(columns, self.names, {'account_key': self.encoder})
+            offsets = np.load(os.path.join(part_directory, 'offsets.npy'), mmap_mode='r')
+            self._open_partitions[number] = (table, offsets)
+        return self._open_partitions[number]
+
+    # Takes an account key (string) and returns its code, or -1.
+    def code(self, account_key):
+        return self.encoder.codes.get(account_key, -1)
+
+    # Returns the rows of one account (given as a string) as a Table of
+    # zero-copy slices; the Table is empty if the account has no rows.
+    def rows_for(self, account_key):
+        code = self.code(account_key)
+        number = code // self.accounts_per_partition
+        if code < 0 or number not in self.partitions:
+            return self._empty()
+        table, offsets = self.partition(number)
+        position = code - number * self.accounts_per_partition
+        return table.take(slice(int(offsets[position]), int(offsets[position + 1])))
+
+    def _empty(self):
+        columns = dict((name, np.zeros(0, dtype=np.dtype(self.info['dtypes'][name])))
+                       for name in self.names)
+        return Table(columns, self.names, {'account_key': self.encoder})
+
+    def __getitem__(self, account_key):
+        rows = self.rows_for(account_key)
+        if not len(rows):
+            raise KeyError(account_key)
+        return rows
+
+    def __contains__(self, account_key):
+        return len(self.rows_for(account_key)) > 0
+
+    # Yields (account key, Table of its rows) for every account with rows,
+    # one partition at a time.
+    def iteritems(self):
+        for number in self.partitions:
+            table, offsets = self.partition(number)
+            first_code = number * self.accounts_per_partition
+            for position in np.flatnonzero(np.diff(offsets)):
+                yield (self.encoder.decode_one(first_code + position),
+                       table.take(slice(int(offsets[position]), int(offsets[position + 1]))))
+
+    # Takes account keys (strings), their join dates (datetime64[D]) and a
+    # window of days [start, end) after joining, and returns an
+    # AccountWindows of each account's rows in its window.
+    def windows(self, account_keys, join_dates, start=0, end=7):
+        return AccountWindows(self, account_keys, join_dates, start, end)
+
+
+# A read-only dict of account key -> Table of that account's engagement rows
+# in a window of days after its join date, holding only the accounts with
+# at least one row in their window (like the notebook's engagement_by_account).
+# The Tables are zero-copy slices of the store's memory-mapped columns.
+class AccountWindows(object):
+
+    def __init__(self, store, account_keys, join_dates, start, end):
+        self.store = store
+        account_keys = np.asarray(account_keys, dtype=np.unicode_)
+        codes = store.encoder.encode(account_keys, add=False).astype(np.int64)
+        join_days = np.asarray(join_dates).astype('datetime64[D]').astype(np.int64)
+        numbers = np.where(codes >= 0, codes // store.accounts_per_partition, -1)
+        # account key -> (partition, first row, end row)
+        self._slices = {}
+        for number in set(numbers.tolist()) & set(store.partitions):
+            table, offsets = store.partition(number)
+            selected = np.flatnonzero(numbers == number)
+            first_code = number * store.accounts_per_partition
+            local = codes[selected] - first_code
+            # (account, day) as one sorted int64, to find both ends at once
+            row_accounts = table['account_key'].astype(np.int64) - first_code
+            row_keys = row_accounts * _DAY_RANGE + table['utc_date'].astype(np.int64)
+            window_start = local * _DAY_RANGE + join_days[selected] + start
+            starts = np.searchsorted(row_keys, window_start, side='left')
+            ends = np.searchsorted(row_keys, window_start + (end - start), side='left')
+            for key, first, last in zip(account_keys[selected].tolist(), starts, ends):
+                if last > first:
+                    self._slices[key] = (number, int(first), int(last))
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, account_key):
+        return account_key in self._slices
+
+    def __iter__(self):
+        return iter(self._slices)
+
+    def keys(self):
+        return list(self._slices)
+
+    def __getitem__(self, account_key):
+        number, first, last = self._slices[account_key]
+        table, offsets = self.store.partition(number)
+        return table.take(slice(first, last))
+
+    def get(self, account_key, default=None):
+        if account_key not in self._slices:
+            return default
+        return self[account_key]
+
+    def iteritems(self):
+        for account_key in self._slices:
+            yield account_key, self[account_key]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return [rows for account_key, rows in self.iteritems()]
+
@@ -0,0 +1,80 @@
+# Vectorized versions of the notebook's paid-student, first week and
+# passing-student queries, written as joins on whole columns (see join.py).
+#
+# Account keys are passed around as stored in the tables: int32 codes if the
+# account_key column is dictionary-encoded (see encoding.py), strings if not.
+# Use Table.decode to turn codes back into strings.
+
+import numpy as np
+
+from l1_analysis.columnar import Table
+from l1_analysis.join import DenseIndex, SortedIndex, anti_join, inner_join, max_per_key, semi_join
+
+
+# Returns the best index over a table's unique account keys: a DenseIndex
+# (a lookup array indexed by code) when the column is encoded.
+def account_index(table, account_keys):
+    encoder = table.encoders.get('account_key')
+    if encoder is not None:
+        return DenseIndex(account_keys, len(encoder))
+    return SortedIndex(account_keys)
+
+
+# Returns a boolean mask of the enrollments that were paid for: not canceled
+# (yet), or canceled more than trial_days days after joining.
+def paid_enrollments(enrollments, trial_days=7):
+    days_enrolled = (enrollments['cancel_date'] - enrollments['join_date']).astype(np.int64)
+    # NaT cancel dates give a very negative days_enrolled, so they never count here
+    return ~enrollments['is_canceled'] | (days_enrolled > trial_days)
+
+# Finds the students who either haven't canceled yet or who stayed enrolled
+# for more than trial_days days. Returns (account_keys, join_dates), sorted by
+# account_key, where join_dates holds each student's most recent qualifying
+# join date (as datetime64[D]).
+# With intervals=True, also returns a Table of every paid enrollment (the
+# account_key, join_date and cancel_date columns, NaT while still enrolled),
+# sorted by account_key and join_date, e.g. for students who paid more than
+# once.
+def find_paid_students(enrollments, trial_days=7, intervals=False):
+    paid = paid_enrollments(enrollments, trial_days)
+    account_keys, join_dates = max_per_key(enrollments['account_key'][paid],
+                                           enrollments['join_date'][paid])
+    if not intervals:
+        return account_keys, join_dates
+    rows = np.flatnonzero(paid)
+    rows = rows[np.lexsort((enrollments['join_date'][rows].astype(np.int64),
+                            enrollments['account_key'][rows]))]
+    names = ['account_key', 'join_date', 'cancel_date']
+    paid_intervals = Table(dict((name, enrollments[name][rows]) for name in names), names,
+                           dict((name, encoder) for name, encoder in enrollments.encoders.items()
+                                if name in names))
+    return account_keys, join_dates, paid_intervals
+
+# Takes an engagement Table and the paid students from find_paid_students,
+# and returns the indexes of the engagement rows that belong to a paid student
+# and happened within [0, days) days of that student's join date.
+# Row order is kept.
+def first_week_engagement_rows(engagement, paid_accounts, paid_join_dates, days=7):
+    rows, paid_rows = inner_join(engagement['account_key'], account_index(engagement, paid_accounts))
+    days_since_join = (engagement['utc_date'][rows] - paid_join_dates[paid_rows]).astype(np.int64)
+    return rows[(days_since_join >= 0) & (days_since_join < days)]
+
+# Returns the distinct account keys of students with a submission for one of
+# lesson_keys (strings) rated one of passing_values. If students is given (an
+# array of unique account keys), only those students are included.
+def find_passing_students(submissions, lesson_keys, passing_values, students=None):
+    passed = (np.in1d(submissions['lesson_key'], submissions.encode('lesson_key', lesson_keys)) &
+              np.in1d(submissions['assigned_rating'], passing_values))
+    if students is not None:
+        passed &= semi_join(submissions['account_key'], account_index(submissions, students))
+    return np.unique(submissions['account_key'][passed])
+
+# Returns the rows of enrollments whose student has no engagement records.
+# engaged_accounts are the distinct account keys (strings) of the engagement
+# table; those no enrollment has are ignored.
+def unengaged_enrollments(enrollments, engaged_accounts):
+    engaged = enrollments.encode('account_key', engaged_accounts)
+    if 'account_key' in enrollments.encoders:
+        engaged = np.unique(engaged[engaged >= 0])
+    return enrollments.take(anti_join(enrollments['account_key'],
+                                      account_index(enrollments, engaged)))
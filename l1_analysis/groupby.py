@@ -0,0 +1,108 @@
+# Group-by aggregation over columnar Tables.
+#
+# The notebook's add_values_in_field and count_days_visited walk the
+# engagement_by_account dict of lists once per metric, in Python. A GroupBy
+# works out which group (e.g. account) every row belongs to once, and then
+# each aggregation is a single np.bincount over a whole column.
+#
+# Typical use:
+#   totals = aggregate(paid_engagement_in_first_week, 'account_key', [
+#       ('total_minutes_visited', 'sum', 'total_minutes_visited'),
+#       ('days_visited', 'count_where', paid_engagement_in_first_week['num_courses_visited'] > 0),
+#   ])
+#   print_stats('Total minutes', totals['total_minutes_visited'])
+
+import numpy as np
+
+from l1_analysis.columnar import Table
+
+
+# Groups the rows of a table by the values of a key array.
+# If the keys are dictionary codes (see encoding.py), pass num_keys (the size
+# of the encoder): the codes are then used as group numbers directly,
+# without sorting.
+class GroupBy(object):
+
+    def __init__(self, keys, num_keys=None):
+        keys = np.asarray(keys)
+        if num_keys is None:
+            self.keys, self.group_of_row = np.unique(keys, return_inverse=True)
+        else:
+            present = np.bincount(keys, minlength=num_keys) > 0
+            self.keys = np.flatnonzero(present).astype(keys.dtype)
+            group_of_code = np.cumsum(present) - 1
+            self.group_of_row = group_of_code[keys]
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Number of rows in each group.
+    def count(self):
+        return np.bincount(self.group_of_row, minlength=len(self.keys))
+
+    # Sum of values in each group. np.bincount adds the values in row order,
+    # so float sums match adding the rows up one at a time in a loop.
+    # Integer and boolean values give integer sums.
+    def sum(self, values):
+        values = np.asarray(values)
+        if len(values) != len(self.group_of_row):
+            raise ValueError('values must have one entry per row')
+        sums = np.bincount(self.group_of_row, weights=values, minlength=len(self.keys))
+        if values.dtype.kind in 'biu':
+            return sums.astype(np.int64)
+        return sums
+
+    # Number of rows in each group where the boolean array is True.
+    def count_where(self, condition):
+        return self.sum(np.asarray(condition, dtype=bool))
+
+    # Mean of values in each group.
+    def mean(self, values):
+        return self.sum(values) / self.count().astype(np.float64)
+
+    # Takes a Table and a list of (output_name, operation, column) tuples, and
+    # returns a Table with one row per group: the group key (in a column
+    # named key_name) followed by one column per aggregation.
+    # operation is 'sum', 'mean', 'count' or 'count_where'; column is a column
+    # name of the table, or an array with one value per row (for count_where,
+    # a boolean array). 'count' ignores its column.
+    def aggregate(self, table, aggregations, key_name='key', key_encoder=None):
+        columns = {key_name: self.keys}
+        names = [key_name]
+        for output_name, operation, column in aggregations:
+            if isinstance(column, basestring):
+                column = table[column]
+            if operation == 'sum':
+                result = self.sum(column)
+            elif operation == 'mean':
+                result = self.mean(column)
+            elif operation == 'count':
+                result = self.count()
+            elif operation == 'count_where':
+                result = self.count_where(column)
+            else:
+                raise ValueError('unknown aggregation: %s' % operation)
+            columns[output_name] = result
+            names.append(output_name)
+        encoders = {key_name: key_encoder} if key_encoder is not None else {}
+        return Table(columns, names, encoders)
+
+
+# Groups a Table by one of its columns and computes the given aggregations
+# (see GroupBy.aggregate). The result's first column has the same name as
+# key_column, and is still encoded if key_column is.
+def aggregate(table, key_column, aggregations):
+    encoder = table.encoders.get(key_column)
+    num_keys = len(encoder) if encoder is not None else None
+    group_by = GroupBy(table[key_column], num_keys)
+    return group_by.aggregate(table, aggregations, key_name=key_column, key_encoder=encoder)
+
+# The per-account first week metrics the notebook looks at, for a table of
+# engagement records.
+def engagement_totals(engagement):
+    return aggregate(engagement, 'account_key', [
+        ('num_engagements', 'count', None),
+        ('total_minutes_visited', 'sum', 'total_minutes_visited'),
+        ('lessons_completed', 'sum', 'lessons_completed'),
+        ('days_visited', 'count_where', engagement['num_courses_visited'] > 0),
+    ])
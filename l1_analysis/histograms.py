@@ -0,0 +1,109 @@
+# Pre-binned histograms for the passing/failing plots.
+#
+# The plotting cells call plt.hist on the raw values again for every bin
+# count, range and zoom (60 bins of minutes, hours with range=[0, 21],
+# lessons with range=[0, 41] and then [0, 15], ...), and each call goes
+# through every value. A Histogram goes through the values once, keeping
+# each distinct value (in order) and how many times it occurs: whole-number
+# data is counted with np.bincount, so that is one number per value in its
+# range; other data is sorted once with np.unique. Any histogram, over any
+# sub-range, is then worked out by looking its bin edges up in the sorted
+# values, and drawn with plt.bar.
+#
+# The bin edges are the ones np.histogram makes, and a value goes in the bin
+# np.histogram puts it in (the last bin includes its upper edge), so every
+# count is exactly what np.histogram / plt.hist gives.
+#
+# That's only while there are at most MAX_EXACT_VALUES distinct values
+# (always the case for whole numbers within MAX_BINCOUNT_SPAN of each
+# other), so that a Histogram never holds more than that many numbers. Data
+# with more distinct values (e.g. a float column over millions of students)
+# is counted in FINE_BINS equal bins between its smallest and largest value
+# instead, and each fine bin's values go in the bin its middle falls in.
+# Then only the values within half a fine bin (1 / 131072 of the data's
+# range) of a bin edge can end up in the bin next to it; exact is False.
+#
+#   minutes = Histogram(passing_totals['total_minutes_visited'])
+#   minutes.plot(60)
+#   minutes.plot(21, range=[0, 21], scale=1 / 60.0)   # in hours
+
+import numpy as np
+
+from l1_analysis.instrument import instrumented
+
+# Whole-number data spanning more values than this is sorted instead of
+# counted with np.bincount.
+MAX_BINCOUNT_SPAN = 1 << 20
+# Data with more distinct values than this is counted in FINE_BINS bins.
+MAX_EXACT_VALUES = 1 << 16
+FINE_BINS = 1 << 16
+
+
+class Histogram(object):
+
+    # values: an array or list of numbers.
+    def __init__(self, values):
+        values = np.asarray(values)
+        self.count = len(values)
+        self.exact = True
+        if self.count == 0:
+            self.min = self.max = 0
+            self.values = values
+            self.value_counts = np.zeros(0, dtype=np.int64)
+            return
+        self.min = values.min()
+        self.max = values.max()
+        if values.dtype.kind in 'iu' and int(self.max) - int(self.min) < MAX_BINCOUNT_SPAN:
+            counts = np.bincount(values - self.min)
+            present = np.flatnonzero(counts)
+            self.values = (self.min + present).astype(values.dtype)
+            self.value_counts = counts[present]
+        else:
+            self.values, self.value_counts = np.unique(values, return_counts=True)
+            if len(self.values) > MAX_EXACT_VALUES:
+                self._count_in_fine_bins(values)
+
+    # Replaces the distinct values by the middles of FINE_BINS equal bins
+    # between min and max, and their counts by the number of values in each.
+    def _count_in_fine_bins(self, values):
+        counts, edges = np.histogram(values, FINE_BINS, range=(self.min, self.max))
+        present = np.flatnonzero(counts)
+        self.values = (edges[:-1] + np.diff(edges) / 2)[present]
+        self.value_counts = counts[present]
+        self.exact = False
+
+    def __len__(self):
+        return self.count
+
+    # Returns (counts, edges) like np.histogram(values * scale, bins, range).
+    # range defaults to the (scaled) smallest and largest value, like
+    # plt.hist's; bins can be a number or a sequence of edges.
+    def counts(self, bins=10, range=None, scale=1.0):
+        positions = self.values * scale
+        value_counts = self.value_counts
+        if scale < 0:
+            positions = positions[::-1]
+            value_counts = value_counts[::-1]
+        if range is None:
+            range = tuple(sorted([self.min * scale, self.max * scale])) if self.count else (0, 1)
+        _, edges = np.histogram(np.zeros(0), bins, range=range)
+        # number of values below each edge, with the last bin closed
+        bounds = np.append(np.searchsorted(positions, edges[:-1], side='left'),
+                           np.searchsorted(positions, edges[-1], side='right'))
+        cumulative = np.append(0, np.cumsum(value_counts))
+        return np.diff(cumulative[bounds]).astype(np.int64), edges
+
+    # Draws the histogram with plt.bar (see counts() for the arguments).
+    # Other keyword arguments go to plt.bar. Returns plt.bar's result.
+    @instrumented('plot')
+    def plot(self, bins=10, range=None, scale=1.0, **bar_options):
+        import matplotlib.pyplot as plt
+        counts, edges = self.counts(bins, range, scale)
+        bar_options.setdefault('linewidth', 0)
+        return plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge', **bar_options)
+
+
+# Takes the columns of a Table (or any mapping of name -> values), and
+# returns a dict of name -> Histogram.
+def histograms_of(table, columns):
+    return dict((column, Histogram(table[column])) for column in columns)
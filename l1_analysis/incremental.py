@@ -0,0 +1,296 @@
+# Incremental daily updates of the first week engagement totals.
+#
+# A new day of daily_engagement rows is appended to the CSV every morning,
+# and the notebook works everything out again from scratch: paid_students,
+# paid_engagement_in_first_week, engagement_by_account and the totals.
+# FirstWeekState keeps what that work produced, saved between runs:
+#   - the paid students (account -> most recent paid join date) and the
+#     Udacity test accounts, as found in enrollments.csv
+#   - the per-account first week totals and the set of students who engaged
+#     in their first week (a streaming.FirstWeekAggregates)
+#   - how far into daily_engagement.csv it has read
+#   - an AccountLineIndex: where each account's rows start in the file
+# An update then only parses
+#   - the engagement rows appended since the last run (for every paid
+#     student, including the ones who enrolled since: their rows can only be
+#     among the new ones), and
+#   - for the (few) accounts whose paid join date or Udacity status changed
+#     because of a cancellation or a rejoin, their earlier rows, since their
+#     first week has moved. Those are read straight from their lines, found
+#     through the index, not by scanning the file.
+# The floating point totals are added up in file order, exactly as a full
+# rebuild adds them, so the results are identical (not just close).
+#
+# daily_engagement.csv is only ever expected to grow at the end; if it was
+# rewritten (or the number of days changed), update() rebuilds from scratch.
+# tests/test_incremental.py replays days of new rows, enrollments,
+# cancellations and rejoins, and checks every update against a rebuild.
+#
+# Given a sampling.AccountSample, the state only follows the sampled
+# accounts: the other accounts' rows are skipped as they're read, and never
+# converted or indexed. The state of a sample is saved apart, in
+# <cache_dir>/<sample name>, as the cleaned tables are.
+#
+# To time an update (or a build) of the state (of the L1_SAMPLE sample, if
+# set):
+#   python benchmarks/bench_incremental.py [data_dir]
+
+import os
+import pickle
+
+import numpy as np
+import unicodecsv
+
+from l1_analysis.cache import DEFAULT_CACHE_DIR
+from l1_analysis.columnar import (
+    CHUNK_SIZE,
+    ENGAGEMENT_TYPES,
+    load_enrollments,
+    remove_accounts,
+    rows_to_table,
+)
+from l1_analysis.dates import datetime_from_day
+from l1_analysis.encoding import KeyEncoder
+from l1_analysis.first_week import find_paid_students
+from l1_analysis.streaming import (
+    FirstWeekAggregates,
+    remove_udacity_accounts,
+    rename_acct,
+    within_first_days,
+)
+
+STATE_VERSION = 3
+STATE_FILENAME = 'first_week_state.pickle'
+
+# Number of bytes before the last read position that are saved, to check
+# that the file has only been appended to since.
+TAIL_SIZE = 1024
+
+
+# Returns (udacity_test_accounts, paid_students) from enrollments.csv in
+# data_dir: a set of account keys, and a dict of account key -> most recent
+# paid join date (a datetime), without the Udacity test accounts. With a
+# sampling.AccountSample, only the sampled accounts are read.
+def read_students(data_dir, trial_days=7, sample=None):
+    enrollments = load_enrollments(os.path.join(data_dir, 'enrollments.csv'), sample=sample)
+    udacity_test_accounts = set(enrollments['account_key'][enrollments['is_udacity']].tolist())
+    non_udacity_enrollments = remove_accounts(enrollments, udacity_test_accounts)
+    paid_accounts, paid_join_dates = find_paid_students(non_udacity_enrollments, trial_days)
+    paid_students = dict(zip(paid_accounts.tolist(),
+                             [datetime_from_day(day) for day in paid_join_dates]))
+    return udacity_test_accounts, paid_students
+
+def read_tail(filename, end):
+    with open(filename, 'rb') as f:
+        f.seek(max(end - TAIL_SIZE, 0))
+        return f.read(end - max(end - TAIL_SIZE, 0))
+
+# Returns the accounts whose entry differs between two dicts (or sets).
+def changed_keys(old, new):
+    if isinstance(old, set):
+        return old ^ new
+    return set(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+## Reading engagement rows along with where their lines start
+
+def _read_header(f):
+    line = f.readline()
+    return unicodecsv.reader([line]).next(), len(line)
+
+def _lines_to_table(header, lines):
+    return rows_to_table(header, list(unicodecsv.reader(lines)), ENGAGEMENT_TYPES)
+
+# Takes lines of the CSV and where they start, and returns them as (Table,
+# line offsets), without the rows of the accounts not in sample (if given).
+def _sampled_lines_to_table(header, lines, offsets, sample):
+    rows = list(unicodecsv.reader(lines))
+    if sample is not None:
+        key_position = sample.key_position(header)
+        kept = [i for i, row in enumerate(rows) if sample.keeps_key(row[key_position])]
+        rows = [rows[i] for i in kept]
+        offsets = [offsets[i] for i in kept]
+    return rows_to_table(header, rows, ENGAGEMENT_TYPES), np.array(offsets, dtype=np.int64)
+
+# Reads the engagement CSV from offset on (from the first row if offset is
+# None), and yields (Table, line offsets) for chunks of at most chunk_size
+# lines, the offsets being where each row's line starts in the file. sample
+# is an optional sampling.AccountSample: the other accounts' rows are left
+# out before they're converted.
+def read_engagement_lines(filename, offset=None, chunk_size=CHUNK_SIZE, sample=None):
+    with open(filename, 'rb') as f:
+        header, position = _read_header(f)
+        if offset is not None:
+            f.seek(offset)
+            position = offset
+        lines = []
+        offsets = []
+        for line in f:
+            lines.append(line)
+            offsets.append(position)
+            position += len(line)
+            if len(lines) == chunk_size:
+                yield _sampled_lines_to_table(header, lines, offsets, sample)
+                lines = []
+                offsets = []
+        if lines:
+            yield _sampled_lines_to_table(header, lines, offsets, sample)
+
+# Reads the engagement rows whose lines start at the given offsets (in
+# increasing order), and yields them as Tables of at most chunk_size rows.
+def read_engagement_lines_at(filename, offsets, chunk_size=CHUNK_SIZE):
+    with open(filename, 'rb') as f:
+        header, position = _read_header(f)
+        for start in xrange(0, len(offsets), chunk_size):
+            lines = []
+            for offset in offsets[start:start + chunk_size]:
+                f.seek(offset)
+                lines.append(f.readline())
+            yield _lines_to_table(header, lines)
+
+
+# Where the rows of each account start in daily_engagement.csv: the line
+# offsets, in file order, and the account code of each line.
+class AccountLineIndex(object):
+
+    def __init__(self):
+        self.encoder = KeyEncoder()
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.accounts = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Adds the rows of a chunk just read (with its 'acct' column still
+    # holding strings), whose lines start at the given offsets.
+    def add(self, chunk, offsets):
+        self.offsets = np.concatenate([self.offsets, offsets])
+        self.accounts = np.concatenate([self.accounts, self.encoder.encode(chunk['acct'])])
+
+    # Returns the line offsets of every row of the given accounts, in file
+    # order.
+    def lines_of(self, account_keys):
+        codes = self.encoder.encode(np.array(sorted(account_keys), dtype=np.unicode_), add=False)
+        return self.offsets[np.in1d(self.accounts, codes[codes >= 0])]
+
+
+class FirstWeekState(object):
+
+    # sample is an optional sampling.AccountSample of the accounts followed.
+    def __init__(self, days=7, sample=None):
+        self.version = STATE_VERSION
+        self.days = days
+        self.sample = sample
+        self.udacity_test_accounts = set()
+        self.paid_students = {}
+        self.aggregates = FirstWeekAggregates()
+        self.line_index = AccountLineIndex()
+        self.engagement_offset = None
+        self.engagement_tail = ''
+
+    # Takes chunks of engagement rows, and adds the first week rows of the
+    # paid students in paid_students to the aggregates.
+    def _add_engagement(self, chunks, paid_students):
+        chunks = rename_acct(chunks)
+        chunks = remove_udacity_accounts(chunks, self.udacity_test_accounts)
+        for chunk in within_first_days(chunks, paid_students, self.days):
+            self.aggregates.add_chunk(chunk)
+
+    # Yields the chunks of rows from offset on, adding them to the index as
+    # they go by.
+    def _read_and_index(self, filename, offset=None, chunk_size=CHUNK_SIZE):
+        for chunk, offsets in read_engagement_lines(filename, offset, chunk_size, self.sample):
+            self.line_index.add(chunk, offsets)
+            yield chunk
+
+    # Works everything out from the CSVs in data_dir, from scratch.
+    def rebuild(self, data_dir, chunk_size=CHUNK_SIZE):
+        filename = os.path.join(data_dir, 'daily_engagement.csv')
+        end = os.path.getsize(filename)
+        self.udacity_test_accounts, self.paid_students = read_students(data_dir,
+                                                                       sample=self.sample)
+        self.aggregates = FirstWeekAggregates()
+        self.line_index = AccountLineIndex()
+        self._add_engagement(self._read_and_index(filename, chunk_size=chunk_size),
+                             self.paid_students)
+        self.engagement_offset = end
+        self.engagement_tail = read_tail(filename, end)
+
+    # Brings the state up to date with the CSVs in data_dir. Returns a dict
+    # describing what was done.
+    def update(self, data_dir, chunk_size=CHUNK_SIZE):
+        filename = os.path.join(data_dir, 'daily_engagement.csv')
+        end = os.path.getsize(filename)
+        offset = self.engagement_offset
+        if (offset is None or end < offset or
+                read_tail(filename, offset) != self.engagement_tail):
+            self.rebuild(data_dir, chunk_size)
+            return {'rebuilt': True}
+
+        udacity_test_accounts, paid_students = read_students(data_dir, sample=self.sample)
+        changed = (changed_keys(self.udacity_test_accounts, udacity_test_accounts) |
+                   changed_keys(self.paid_students, paid_students))
+        self.udacity_test_accounts = udacity_test_accounts
+        self.paid_students = paid_students
+
+        # accounts whose first week moved: forget them, and go through their
+        # rows from before offset again. Accounts that weren't in the file
+        # yet (new students) have none.
+        self.aggregates.remove_accounts(changed)
+        rescanned = dict((account_key, paid_students[account_key]) for account_key in changed
+                         if account_key in paid_students and
+                         account_key not in udacity_test_accounts)
+        lines = self.line_index.lines_of(rescanned) if rescanned else []
+        if len(lines):
+            self._add_engagement(read_engagement_lines_at(filename, lines, chunk_size), rescanned)
+
+        # everyone: the new rows
+        if end > offset:
+            self._add_engagement(self._read_and_index(filename, offset, chunk_size), paid_students)
+        self.engagement_offset = end
+        self.engagement_tail = read_tail(filename, end)
+        return {'rebuilt': False, 'new_bytes': end - offset, 'changed_accounts': len(changed),
+                'rescanned_rows': len(lines)}
+
+    def save(self, filename):
+        with open(filename + '.tmp', 'wb') as f:
+            pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        if os.path.exists(filename):
+            os.remove(filename)
+        os.rename(filename + '.tmp', filename)
+
+    # Returns the saved state, or None if there is none (or it's from an
+    # older version of this module).
+    @classmethod
+    def load(cls, filename):
+        try:
+            with open(filename, 'rb') as f:
+                state = pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+        if getattr(state, 'version', None) != STATE_VERSION:
+            return None
+        return state
+
+
+# Loads the saved state for data_dir (from data_dir/.l1_cache, or
+# data_dir/.l1_cache/<sample name> for a sampling.AccountSample, unless
+# state_file is given), brings it up to date and saves it. Returns
+# (state, what update() did).
+def update_first_week_state(data_dir='.', state_file=None, days=7, sample=None):
+    if state_file is None:
+        cache_dir = os.path.join(data_dir, DEFAULT_CACHE_DIR)
+        if sample is not None:
+            cache_dir = os.path.join(cache_dir, sample.name)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        state_file = os.path.join(cache_dir, STATE_FILENAME)
+    sample_name = sample.name if sample is not None else None
+    state = FirstWeekState.load(state_file)
+    if state is None or state.days != days or \
+            (state.sample.name if state.sample is not None else None) != sample_name:
+        state = FirstWeekState(days, sample)
+    result = state.update(data_dir)
+    state.save(state_file)
+    return state, result
+
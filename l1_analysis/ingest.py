@@ -0,0 +1,144 @@
+# Parallel loading of the three CSV files.
+#
+# columnar.load_table reads one file at a time, on one core, and
+# daily_engagement.csv is by far the biggest of the three. Here each file is
+# split into byte ranges of about chunk_bytes, each starting just after a
+# newline, and the ranges of all the files go to one multiprocessing Pool,
+# so the three files are read at the same time and the big one by several
+# workers. Each worker parses its range into typed columns with the same
+# column parsers as the serial loader; the parent concatenates the pieces of
+# each file in order.
+#
+# The key columns are dictionary-encoded in the parent, afterwards, in the
+# same CHUNK_SIZE-row steps and file order as the serial loader: a
+# KeyEncoder gives out codes chunk by chunk, so this is what makes the codes
+# (and not just the strings behind them) the same as a serial load.
+#
+# Ranges are split on newlines, so a quoted cell holding a newline would be
+# cut in two; none of the three files has one.
+#
+# Given a sampling.AccountSample, each worker skips the rows of the accounts
+# not in it before converting anything, as the serial loader does.
+#
+# tests/test_ingest.py checks that the result is the same as the serial
+# loader's. To time the two:
+#   python benchmarks/bench_ingest.py [data_dir] [processes]
+
+import io
+import multiprocessing
+import os
+
+import numpy as np
+import unicodecsv
+
+from l1_analysis.columnar import (
+    CHUNK_SIZE,
+    ENGAGEMENT_TYPES,
+    ENROLLMENT_TYPES,
+    SUBMISSION_TYPES,
+    Table,
+    rows_to_table,
+)
+from l1_analysis.encoding import column_encoders, make_encoders
+
+# Bytes of CSV parsed by a worker at a time.
+CHUNK_BYTES = 4 << 20
+
+# The CSV files, in the order the serial loaders read them, and their types.
+FILES = [
+    ('enrollments', 'enrollments.csv', ENROLLMENT_TYPES),
+    ('daily_engagement', 'daily_engagement.csv', ENGAGEMENT_TYPES),
+    ('project_submissions', 'project_submissions.csv', SUBMISSION_TYPES),
+]
+
+
+# Takes a CSV file, and returns (header, ranges): ranges is a list of
+# (start, end) byte offsets covering the rows after the header, each about
+# chunk_bytes long, and each starting at the beginning of a line.
+def split_file(filename, chunk_bytes=CHUNK_BYTES):
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        header = next(unicodecsv.reader([f.readline()]))
+        starts = [f.tell()]
+        while starts[-1] + chunk_bytes < size:
+            # move to the start of the line the guess falls in (or the next)
+            f.seek(starts[-1] + chunk_bytes - 1)
+            f.readline()
+            if f.tell() >= size:
+                break
+            starts.append(f.tell())
+    ends = starts[1:] + [size]
+    return header, [(start, end) for start, end in zip(starts, ends) if end > start]
+
+# Parses the rows in one byte range of a CSV file into a Table (run in a
+# worker process). Key columns are left as strings.
+def _parse_range(args):
+    filename, header, start, end, types, sample = args
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    rows = unicodecsv.reader(io.BytesIO(data))
+    key_position = sample.key_position(header) if sample is not None else None
+    if key_position is not None:
+        rows = [row for row in rows if sample.keeps_key(row[key_position])]
+    return rows_to_table(header, list(rows), types)
+
+# Encodes the key columns of a Table of strings in place, CHUNK_SIZE rows at
+# a time, as iter_table_chunks does.
+def encode_keys(table, encoders):
+    table.encoders = column_encoders(table.names, encoders)
+    for name, encoder in table.encoders.items():
+        values = table.columns[name]
+        parts = [encoder.encode(values[start:start + CHUNK_SIZE])
+                 for start in xrange(0, len(values), CHUNK_SIZE)]
+        table.columns[name] = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+    return table
+
+
+# Takes a list of (filename, column types), and loads all the files at the
+# same time with a pool of processes (default: one per core). Returns a list
+# of Tables, in the same order, equal to what columnar.load_table returns
+# for each file (with the same encoders, loading the files in that order).
+# sample is an optional sampling.AccountSample, as for load_table.
+def load_tables_parallel(files, processes=None, encoders=None, chunk_bytes=CHUNK_BYTES,
+                         sample=None):
+    tasks = []
+    num_ranges = []
+    for filename, types in files:
+        header, ranges = split_file(filename, chunk_bytes)
+        if not ranges:
+            # no rows: parse an empty range, so the columns still exist
+            ranges = [(0, 0)]
+        tasks.extend((filename, header, start, end, types, sample) for start, end in ranges)
+        num_ranges.append(len(ranges))
+
+    if processes == 1 or len(tasks) == 1:
+        pieces = map(_parse_range, tasks)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            pieces = pool.map(_parse_range, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    tables = []
+    for count in num_ranges:
+        parts, pieces = pieces[:count], pieces[count:]
+        table = parts[0] if count == 1 else Table.concat(parts)
+        if encoders:
+            encode_keys(table, encoders)
+        tables.append(table)
+    return tables
+
+# Loads enrollments, daily_engagement and project_submissions from data_dir
+# in parallel, and returns a dict of name -> Table. names optionally limits
+# which are loaded.
+def load_all_parallel(data_dir='.', processes=None, encoders=None, names=None,
+                      chunk_bytes=CHUNK_BYTES, sample=None):
+    selected = [(name, os.path.join(data_dir, filename), types)
+                for name, filename, types in FILES if names is None or name in names]
+    tables = load_tables_parallel([(filename, types) for name, filename, types in selected],
+                                  processes, encoders, chunk_bytes, sample)
+    return dict((name, table) for (name, filename, types), table in zip(selected, tables))
+
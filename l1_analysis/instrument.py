@@ -0,0 +1,278 @@
+# Timing of the pipeline's stages, for finding out which one makes a run
+# slow.
+#
+# Code marks its stages either by wrapping a function:
+#
+#   @instrumented('count_unique_id')
+#   def count_unique_id(data, key): ...
+#
+# or a block:
+#
+#   with stage('aggregate', rows_in=len(first_week)) as timing:
+#       totals = engagement_totals(first_week)
+#       timing.rows_out = len(totals)
+#
+# While instrumentation is on, each stage records its number of calls, wall
+# clock and CPU time, rows in and out (the len() of a wrapped function's
+# first argument and of its result) and the change in the process's memory
+# use, and a report of every stage is printed when the run ends. Stages can
+# be nested; the report indents them, and an outer stage's times include its
+# inner stages'. A stage is known by its path, the names of the stages it's
+# nested in followed by its own, so a stage that runs inside different
+# stages (e.g. 'load' inside each table's stage) gets one line under each.
+#
+# While it's off (the default), stage() hands back one shared do-nothing
+# object and wrapped functions make one extra call, so the hooks can stay
+# in place.
+#
+# Switching it on:
+#   - set L1_PROFILE=1 (or L1_PROFILE=report.json to also save the report
+#     as JSON), and optionally L1_CPROFILE=run.prof to save cProfile
+#     statistics of the whole run (view with python -m pstats run.prof)
+#   - python -m l1_analysis --profile [--profile-output FILE] [--cprofile FILE]
+#   - or call enable() and, at the end, finish()
+
+from collections import OrderedDict
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+ENV_VARIABLE = 'L1_PROFILE'
+CPROFILE_ENV_VARIABLE = 'L1_CPROFILE'
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+# Returns the memory used by the process, in bytes: the current resident
+# size where /proc has it (Linux), the peak resident size where only that is
+# known, and None on Windows.
+def memory_used():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (IOError, IndexError, ValueError):
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def cpu_seconds():
+    times = os.times()
+    return times[0] + times[1]
+
+# Takes any value, and returns its number of rows (its len()), or None if it
+# hasn't got one. Strings are values, not rows.
+def count_rows(value):
+    if isinstance(value, basestring):
+        return None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+# The totals for one stage path, over all its calls.
+class StageStats(object):
+
+    # path is a tuple of stage names, the outermost first.
+    def __init__(self, path):
+        self.path = path
+        self.name = path[-1]
+        self.depth = len(path) - 1
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in = None
+        self.rows_out = None
+        self.memory_delta = None
+
+    def add(self, wall_seconds, cpu_seconds, rows_in, rows_out, memory_delta):
+        self.calls += 1
+        self.wall_seconds += wall_seconds
+        self.cpu_seconds += cpu_seconds
+        if rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + rows_in
+        if rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + rows_out
+        if memory_delta is not None:
+            self.memory_delta = (self.memory_delta or 0) + memory_delta
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'path': list(self.path),
+            'depth': self.depth,
+            'calls': self.calls,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'memory_delta_mb': (None if self.memory_delta is None
+                                else self.memory_delta / (1024.0 * 1024.0)),
+        }
+
+
+# Collects the stages of one run.
+class Recorder(object):
+
+    def __init__(self, report_file=None, cprofile_file=None):
+        self.report_file = report_file
+        self.cprofile_file = cprofile_file
+        # stage path -> StageStats, in the order they first ran
+        self.stages = OrderedDict()
+        # the names of the stages running now, the outermost first
+        self.path = []
+        self.start_time = time.time()
+        self.profile = None
+        if cprofile_file:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    # The StageStats of the stage called name, inside the stages running now.
+    def stats_for(self, name):
+        path = tuple(self.path) + (name,)
+        stats = self.stages.get(path)
+        if stats is None:
+            stats = self.stages[path] = StageStats(path)
+        return stats
+
+    def to_dict(self):
+        return {
+            'wall_seconds': time.time() - self.start_time,
+            'stages': [stats.to_dict() for stats in self.stages.values()],
+        }
+
+    # Prints a table of the stages, in the order they first ran.
+    def report(self, out=None):
+        out = out or sys.stderr
+        print >>out, '%-40s %7s %9s %9s %10s %10s %10s' % (
+            'stage', 'calls', 'wall s', 'cpu s', 'rows in', 'rows out', 'memory MB')
+        for stats in self.stages.values():
+            values = stats.to_dict()
+            print >>out, '%-40s %7d %9.3f %9.3f %10s %10s %10s' % (
+                '  ' * stats.depth + stats.name, stats.calls, stats.wall_seconds,
+                stats.cpu_seconds, _blank_if_none(values['rows_in'], '%d'),
+                _blank_if_none(values['rows_out'], '%d'),
+                _blank_if_none(values['memory_delta_mb'], '%+.1f'))
+        print >>out, 'total: %.3f s' % (time.time() - self.start_time)
+
+    # Stops the profiler, and prints and saves what was asked for.
+    def finish(self):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.cprofile_file)
+            print >>sys.stderr, 'cProfile statistics saved to', self.cprofile_file
+        self.report()
+        if self.report_file:
+            with open(self.report_file, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2)
+            print >>sys.stderr, 'stage report saved to', self.report_file
+
+def _blank_if_none(value, format):
+    return '' if value is None else format % value
+
+
+# A running stage; see stage().
+class _Stage(object):
+
+    def __init__(self, recorder, name, rows_in=None):
+        self.recorder = recorder
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self):
+        self.stats = self.recorder.stats_for(self.name)
+        self.recorder.path.append(self.name)
+        self.memory = memory_used()
+        self.cpu = cpu_seconds()
+        self.wall = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.time() - self.wall
+        cpu = cpu_seconds() - self.cpu
+        memory = memory_used()
+        self.recorder.path.pop()
+        memory_delta = None if self.memory is None else memory - self.memory
+        self.stats.add(wall, cpu, self.rows_in, self.rows_out, memory_delta)
+        return False
+
+# Stands in for a _Stage while instrumentation is off.
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+# The Recorder of the current run, or None while instrumentation is off.
+_recorder = None
+
+
+def enabled():
+    return _recorder is not None
+
+# Switches instrumentation on. report_file is where to also save the report
+# as JSON, and cprofile_file where to save cProfile statistics. The report is
+# printed by finish(), or when the process exits.
+def enable(report_file=None, cprofile_file=None):
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder(report_file, cprofile_file)
+        atexit.register(finish)
+    return _recorder
+
+# Switches instrumentation off, and prints (and saves) the report. Returns
+# the Recorder, or None if it wasn't on.
+def finish():
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.finish()
+    return recorder
+
+# Returns a context manager that times the block it wraps as the stage
+# called name (see the top of the file). Set rows_out on it inside the block.
+def stage(name, rows_in=None):
+    if _recorder is None:
+        return _NULL_STAGE
+    return _Stage(_recorder, name, rows_in)
+
+# Decorator: times every call of the function as the stage called name
+# (default: the function's name).
+def instrumented(name=None):
+    def decorate(function):
+        stage_name = name or function.__name__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _Stage(_recorder, stage_name, count_rows(args[0]) if args else None) as timing:
+                result = function(*args, **kwargs)
+                timing.rows_out = count_rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+# L1_PROFILE=1 (or =report.json) switches it on for the whole run.
+if os.environ.get(ENV_VARIABLE):
+    _setting = os.environ[ENV_VARIABLE]
+    enable(report_file=None if _setting == '1' else _setting,
+           cprofile_file=os.environ.get(CPROFILE_ENV_VARIABLE) or None)
+elif os.environ.get(CPROFILE_ENV_VARIABLE):
+    enable(cprofile_file=os.environ[CPROFILE_ENV_VARIABLE])
@@ -0,0 +1,198 @@
+# A small join engine for integer-encoded keys (e.g. account_key codes).
+#
+# The notebook joins tables with Python loops over dicts: building the
+# paid_students dict, checking 'student in paid_students' for every engagement
+# record, and scanning every submission for passing students. The functions
+# here do the same joins on whole key arrays at once, using either
+#   - a SortedIndex (argsort of the keys plus binary search), which handles
+#     duplicate keys, or
+#   - a DenseIndex (a lookup array indexed by key), for unique keys that are
+#     small dense integers, where each lookup is a single array access.
+# Joins return row indexes into the left and right tables, so the caller can
+# take() whichever columns it needs.
+
+import numpy as np
+
+# datetime64 NaT, viewed as a day number
+_NAT_DAY = np.datetime64('NaT', 'D').astype(np.int64)
+
+
+# Takes any number of key arrays (strings or numbers), and returns
+# (vocabulary, codes_1, codes_2, ...) where each codes_i array gives, for every
+# key in array i, its position in the sorted array of distinct keys. Equal keys
+# get equal codes across all the arrays.
+def encode_keys(*key_arrays):
+    sizes = [len(keys) for keys in key_arrays]
+    vocabulary, codes = np.unique(np.concatenate(key_arrays), return_inverse=True)
+    codes = codes.astype(np.int64)
+    result = [vocabulary]
+    start = 0
+    for size in sizes:
+        result.append(codes[start:start + size])
+        start += size
+    return tuple(result)
+
+
+# An index over a key array that may hold duplicate keys.
+class SortedIndex(object):
+
+    def __init__(self, keys):
+        self.keys = np.asarray(keys)
+        self.order = np.argsort(self.keys, kind='mergesort')
+        self.sorted_keys = self.keys[self.order]
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Takes an array of probe keys, and returns (starts, ends): the matching
+    # rows for probe i are order[starts[i]:ends[i]].
+    def ranges(self, probe_keys):
+        starts = np.searchsorted(self.sorted_keys, probe_keys, side='left')
+        ends = np.searchsorted(self.sorted_keys, probe_keys, side='right')
+        return starts, ends
+
+    # Takes an array of probe keys, and returns a boolean array that is True
+    # where the probe key appears in the index.
+    def contains(self, probe_keys):
+        starts, ends = self.ranges(probe_keys)
+        return ends > starts
+
+    # Takes an array of probe keys, and returns (probe_rows, index_rows), one
+    # pair for every (probe, indexed row) with equal keys. Pairs come out in
+    # probe order, and in index order for each probe.
+    def matches(self, probe_keys):
+        starts, ends = self.ranges(probe_keys)
+        counts = ends - starts
+        probe_rows = np.repeat(np.arange(len(counts)), counts)
+        # position of each match within its probe's range
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        index_rows = self.order[np.repeat(starts, counts) + offsets]
+        return probe_rows, index_rows
+
+
+# An index over unique, non-negative integer keys, stored as a lookup array
+# of row numbers (-1 for keys that aren't present).
+class DenseIndex(object):
+
+    def __init__(self, keys, num_keys=None):
+        keys = np.asarray(keys, dtype=np.int64)
+        if num_keys is None:
+            num_keys = keys.max() + 1 if len(keys) else 0
+        self.rows = np.full(num_keys, -1, dtype=np.int64)
+        self.rows[keys] = np.arange(len(keys))
+        if (self.rows >= 0).sum() != len(keys):
+            raise ValueError('DenseIndex keys must be unique')
+
+    def __len__(self):
+        return int((self.rows >= 0).sum())
+
+    # Takes an array of probe keys, and returns the matching row for each
+    # (-1 where there's no match).
+    def lookup(self, probe_keys):
+        probe_keys = np.asarray(probe_keys, dtype=np.int64)
+        rows = np.full(len(probe_keys), -1, dtype=np.int64)
+        in_range = (probe_keys >= 0) & (probe_keys < len(self.rows))
+        rows[in_range] = self.rows[probe_keys[in_range]]
+        return rows
+
+    def contains(self, probe_keys):
+        return self.lookup(probe_keys) >= 0
+
+
+def _sorted_index(keys):
+    if isinstance(keys, SortedIndex):
+        return keys
+    return SortedIndex(keys)
+
+
+## Joins. The right side can be a key array or an already built index.
+
+# Returns (left_rows, right_rows) for every pair of rows with equal keys.
+def inner_join(left_keys, right):
+    if isinstance(right, DenseIndex):
+        right_rows = right.lookup(left_keys)
+        left_rows = np.flatnonzero(right_rows >= 0)
+        return left_rows, right_rows[left_rows]
+    return _sorted_index(right).matches(left_keys)
+
+# Like inner_join, but every left row appears at least once; left rows with
+# no match are paired with right row -1.
+def left_join(left_keys, right):
+    if isinstance(right, DenseIndex):
+        return np.arange(len(left_keys)), right.lookup(left_keys)
+    left_rows, right_rows = inner_join(left_keys, right)
+    unmatched = np.setdiff1d(np.arange(len(left_keys)), left_rows, assume_unique=True)
+    left_rows = np.concatenate([left_rows, unmatched])
+    right_rows = np.concatenate([right_rows, np.full(len(unmatched), -1, dtype=np.int64)])
+    order = np.argsort(left_rows, kind='mergesort')
+    return left_rows[order], right_rows[order]
+
+# Returns a boolean mask of the left rows whose key has a match on the right.
+def semi_join(left_keys, right):
+    if isinstance(right, (SortedIndex, DenseIndex)):
+        return right.contains(left_keys)
+    return np.in1d(left_keys, right)
+
+# Returns a boolean mask of the left rows whose key has no match on the
+# right (e.g. students who enrolled but never engaged).
+def anti_join(left_keys, right):
+    return ~semi_join(left_keys, right)
+
+# For every left row, finds the right row with the same key and the latest
+# date on or before the left row's date (direction='backward'), or the
+# earliest date on or after it (direction='forward'). Returns the right row
+# for each left row, or -1 where there is none.
+# Dates can be datetime64[D] arrays or integer day numbers. NaT dates never
+# match: left rows with one get -1, and right rows with one are skipped.
+def asof_join(left_keys, left_dates, right_keys, right_dates, direction='backward'):
+    if direction not in ('backward', 'forward'):
+        raise ValueError("direction must be 'backward' or 'forward'")
+    left_keys = np.asarray(left_keys, dtype=np.int64)
+    right_keys = np.asarray(right_keys, dtype=np.int64)
+    left_days = np.asarray(left_dates).astype(np.int64)
+    right_days = np.asarray(right_dates).astype(np.int64)
+    result = np.full(len(left_keys), -1, dtype=np.int64)
+    left_rows = np.flatnonzero(left_days != _NAT_DAY)
+    right_rows = np.flatnonzero(right_days != _NAT_DAY)
+    if len(left_rows) == 0 or len(right_rows) == 0:
+        return result
+    left_days = left_days[left_rows]
+    right_days = right_days[right_rows]
+
+    # Combine (key, day) into one sortable int64, so one binary search
+    # finds both the key and the date. The NaT rows are left out first: as
+    # day numbers they're the smallest int64, and would blow up the span.
+    first_day = min(left_days.min(), right_days.min())
+    span = max(left_days.max(), right_days.max()) - first_day + 1
+    right_combined = right_keys[right_rows] * span + (right_days - first_day)
+    left_combined = left_keys[left_rows] * span + (left_days - first_day)
+
+    order = np.argsort(right_combined, kind='mergesort')
+    sorted_combined = right_combined[order]
+    if direction == 'backward':
+        positions = np.searchsorted(sorted_combined, left_combined, side='right') - 1
+    else:
+        positions = np.searchsorted(sorted_combined, left_combined, side='left')
+    valid = (positions >= 0) & (positions < len(order))
+    positions[~valid] = 0
+    matches = right_rows[order[positions]]
+    valid &= right_keys[matches] == left_keys[left_rows]
+    result[left_rows[valid]] = matches[valid]
+    return result
+
+# Takes an array of keys and an array of numbers (or datetime64 values), and
+# returns (distinct keys, largest value for each key): one sort of the keys,
+# then a segmented maximum (np.maximum.reduceat) over each key's run.
+def max_per_key(keys, values):
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    if len(keys) == 0:
+        return keys[:0], values[:0]
+    order = np.argsort(keys, kind='mergesort')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+    if values.dtype.kind == 'M':
+        maxima = np.maximum.reduceat(values[order].view(np.int64), starts).view(values.dtype)
+    else:
+        maxima = np.maximum.reduceat(values[order], starts)
+    return sorted_keys[starts], maxima
@@ -0,0 +1,250 @@
+# Memoized derived datasets, with a memory bound and LRU eviction.
+#
+# The notebook works out the same derived results over and over: the
+# per-account totals, days visited and the passing/non-passing splits are
+# recomputed in the statistics cells and again in the histogram cells. A
+# DerivedCache remembers results keyed on
+#   (name, other arguments, a token of the contents of each input dataset)
+# so asking again for the same thing on the same data is a dictionary lookup,
+# and asking for it on changed data is a miss, however the data was changed
+# (a dict or list edited in place, a Table column written to, ...).
+#
+# Working out a token reads the whole input, except for arrays that can't be
+# written to (the memory-mapped cache columns, or datasets passed through
+# freeze()): those are known by their identity, and the cache keeps weak
+# references to them to check that a hit's arrays are the very same ones.
+# The cache holds no other references to its inputs.
+#
+# Results are kept in least-recently-used order, and the oldest are dropped
+# once their estimated total size goes over max_bytes.
+#
+# analysis.Analysis keeps its datasets in a DerivedCache, and freezes each
+# one as it's computed.
+
+from collections import OrderedDict
+import hashlib
+import sys
+import weakref
+
+import numpy as np
+
+from l1_analysis.columnar import Table
+from l1_analysis.encoding import KeyEncoder
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+# Takes a value and returns an estimate of the memory it holds, in bytes.
+# Memory-mapped arrays are backed by their file, and count as nothing.
+def estimate_size(value, _seen=None):
+    seen = _seen if _seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.memmap):
+        return 0
+    if isinstance(value, np.ndarray):
+        if value.base is not None and isinstance(value.base, np.ndarray):
+            return sys.getsizeof(value)
+        return value.nbytes
+    if isinstance(value, Table):
+        return sum(estimate_size(column, seen) for column in value.columns.values())
+    if isinstance(value, (tuple, list, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item, seen) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item, seen) for item in value.values())
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sum(estimate_size(item, seen)
+                                          for item in vars(value).values())
+    return sys.getsizeof(value)
+
+## Tokens of the input datasets
+
+# Whether an array, and every array it's a view of, is read-only.
+def _is_fixed(array):
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+    return True
+
+# seen maps the ids of the containers gone through so far to their order.
+def _update_token(digest, value, fixed, seen):
+    if isinstance(value, (Table, KeyEncoder, np.ndarray, list, dict)) or hasattr(value, '__dict__'):
+        if id(value) in seen:
+            digest.update('seen %d ' % seen[id(value)])
+            return
+        seen[id(value)] = len(seen)
+    if isinstance(value, np.ma.MaskedArray) and not (
+            _is_fixed(value) and (value.mask is np.ma.nomask or _is_fixed(value.mask))):
+        digest.update('masked ')
+        _update_token(digest, np.ma.getdata(value), fixed, seen)
+        _update_token(digest, np.ma.getmaskarray(value), fixed, seen)
+    elif isinstance(value, np.ndarray):
+        digest.update('array %s %s ' % (value.dtype.str, value.shape))
+        if _is_fixed(value):
+            fixed.append(value)
+            digest.update('fixed %d ' % id(value))
+        elif value.dtype.hasobject:
+            _update_token(digest, value.tolist(), fixed, seen)
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, Table):
+        digest.update('table %r ' % (value.names,))
+        for name in value.names:
+            _update_token(digest, value.columns[name], fixed, seen)
+        for name in sorted(value.encoders):
+            _update_token(digest, name, fixed, seen)
+            _update_token(digest, value.encoders[name], fixed, seen)
+    elif isinstance(value, KeyEncoder):
+        # codes never change once given out (an encoder only grows), so the
+        # codes already in a table decode the same way for as long as the
+        # same encoder is used
+        fixed.append(value)
+        digest.update('encoder %d ' % id(value))
+    elif isinstance(value, (list, tuple)):
+        digest.update('%s %d ' % (type(value).__name__, len(value)))
+        for item in value:
+            _update_token(digest, item, fixed, seen)
+    elif isinstance(value, (set, frozenset)):
+        digest.update('set %d ' % len(value))
+        for item in sorted(repr(item) for item in value):
+            digest.update(item + ' ')
+    elif isinstance(value, dict) or (hasattr(value, 'items') and hasattr(value, 'keys')):
+        # dicts, and dict-like rows (Table rows, records)
+        items = value.items()
+        digest.update('mapping %s %d ' % (type(value).__name__, len(items)))
+        for key, item in sorted(items, key=lambda pair: repr(pair[0])):
+            _update_token(digest, key, fixed, seen)
+            _update_token(digest, item, fixed, seen)
+    elif callable(value) and hasattr(value, '__name__'):
+        digest.update('function %s.%s ' % (value.__module__, value.__name__))
+    elif hasattr(value, '__dict__'):
+        digest.update('object %s.%s ' % (type(value).__module__, type(value).__name__))
+        _update_token(digest, vars(value), fixed, seen)
+    else:
+        digest.update('%s %r ' % (type(value).__name__, value))
+
+# Takes a dataset (any object), and returns a token that's the same
+# whenever its contents are. The read-only arrays (and the KeyEncoders) it's
+# made of are known by identity instead, and appended to fixed.
+def dataset_token(value, fixed=None):
+    digest = hashlib.sha1()
+    _update_token(digest, value, fixed if fixed is not None else [], {})
+    return digest.hexdigest()
+
+# Yields each array (and mask of a masked array) in value: an array, a
+# Table, a tuple or list of them, or an object holding them.
+def _arrays(value, seen):
+    if id(value) in seen:
+        return
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        yield value
+        if isinstance(value, np.ma.MaskedArray) and value.mask is not np.ma.nomask:
+            yield value.mask
+        return
+    if isinstance(value, Table):
+        items = value.columns.values()
+    elif isinstance(value, (list, tuple)):
+        items = value
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        items = vars(value).values()
+    else:
+        return
+    for item in items:
+        for array in _arrays(item, seen):
+            yield array
+
+# Makes the arrays of a computed dataset read-only, so that it can't be
+# changed in place by mistake, and its token is cheap to work out. The
+# arrays it shares with inputs (the datasets it was computed from, e.g. a
+# DayOffsetIndex holding its engagement table) are left alone: they belong
+# to whoever made them, and a table passed to Analysis.set can still be
+# changed in place.
+def freeze(value, inputs=()):
+    owned = set(id(array) for array in _arrays(list(inputs), set()))
+    for array in _arrays(value, set()):
+        if id(array) not in owned:
+            array.setflags(write=False)
+    return value
+
+
+class DerivedCache(object):
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (value, size, weak references to the fixed inputs)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        return list(self._entries)
+
+    # Takes the key parts that aren't datasets (e.g. function and field
+    # names) and the input datasets, and returns (the cache key, the fixed
+    # inputs the key identifies by identity).
+    @staticmethod
+    def make_key(name, datasets=()):
+        fixed = []
+        return (name,) + tuple(dataset_token(dataset, fixed) for dataset in datasets), fixed
+
+    # Returns (True, value) on a hit and (False, None) on a miss.
+    def lookup(self, key, fixed=()):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            value, size, references = entry
+            if len(references) == len(fixed) and all(
+                    reference() is item for reference, item in zip(references, fixed)):
+                # move to the most recently used end
+                self._entries[key] = entry
+                self.hits += 1
+                return True, value
+            self.total_bytes -= size
+        self.misses += 1
+        return False, None
+
+    def store(self, key, value, fixed=()):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        size = estimate_size(value)
+        self._entries[key] = (value, size, [weakref.ref(item) for item in fixed])
+        self.total_bytes += size
+        self._evict(keep=key)
+
+    # Returns the cached value for (name, datasets), computing it with
+    # compute() (and remembering it) on a miss.
+    def get(self, name, datasets, compute):
+        key, fixed = self.make_key(name, datasets)
+        found, value = self.lookup(key, fixed)
+        if not found:
+            value = compute()
+            self.store(key, value, fixed)
+        return value
+
+    # Drops every entry whose key starts with name (or everything if name is
+    # None).
+    def clear(self, name=None):
+        for key in list(self._entries):
+            if name is None or key[0] == name:
+                self.total_bytes -= self._entries.pop(key)[1]
+
+    def _evict(self, keep):
+        while self._entries and (self.total_bytes > self.max_bytes or
+                                 (self.max_entries is not None and
+                                  len(self._entries) > self.max_entries)):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                break
+            self.total_bytes -= self._entries.pop(oldest)[1]
+
@@ -0,0 +1,250 @@
+# Multi-core execution of the per-student first week analysis.
+#
+# The engagement rows are sharded by account (a CRC-32 hash of account_key
+# modulo the number of shards), and a multiprocessing Pool computes the
+# first week filter and the per-account totals for each shard, and, with
+# parallel_passing_totals, splits them into the students who passed the
+# subway project and those who didn't. The rows are partitioned once, here
+# in the parent (a stable sort of the rows by shard), and each worker is
+# handed the bounds of its shard's rows in that order, so it only ever
+# touches its own rows. Every account lives in exactly one shard, and each
+# shard keeps the rows in their original order, so the merged
+# totals are bit-for-bit the same as the serial groupby.engagement_totals
+# (and so are the print_stats numbers computed from them).
+# parallel_first_week_stats goes one step further and merges per-shard
+# RunningStats (l1_analysis/stats.py), without gathering the totals.
+#
+# The workers don't get copies of the columns through pickling:
+#   - columns memory-mapped from the .npy cache are mapped again, from the
+#     same files, by each worker (the OS shares the pages)
+#   - any other column is copied once into a multiprocessing.RawArray
+#     (shared memory) that the workers view with np.frombuffer
+#
+# tests/test_parallel.py checks the results against the serial ones, and
+#   python benchmarks/bench_parallel.py [data_dir] [scale]
+# times the shards and the pool for different numbers of processes.
+
+import multiprocessing
+import os
+import zlib
+
+import numpy as np
+
+from l1_analysis.columnar import Table
+from l1_analysis.encoding import KeyEncoder
+from l1_analysis.stats import RunningStats, merge_all
+
+_NAT_DAY = np.datetime64('NaT', 'D').astype(np.int64)
+
+
+## Sharing columns with the worker processes
+
+# Takes an array and returns a picklable description of a shared copy of it,
+# for use with attach_shared in another process.
+def share_array(array):
+    if isinstance(array, np.memmap) and array.filename and array.flags.c_contiguous:
+        # only trust the memmap's offset if it covers the rest of the file
+        # (a slice of a memmap keeps its parent's offset)
+        if array.offset + array.nbytes == os.path.getsize(array.filename):
+            return ('file', array.filename, array.dtype.str, array.offset, array.shape)
+    array = np.ascontiguousarray(array)
+    buffer = multiprocessing.RawArray('b', max(array.nbytes, 1))
+    np.frombuffer(buffer, dtype=array.dtype, count=array.size)[:] = array.ravel()
+    return ('raw', buffer, array.dtype.str, array.shape)
+
+# Takes a description from share_array and returns the shared array.
+def attach_shared(shared):
+    if shared[0] == 'file':
+        kind, filename, dtype, offset, shape = shared
+        return np.memmap(filename, dtype=np.dtype(dtype), mode='r', offset=offset, shape=shape)
+    kind, buffer, dtype, shape = shared
+    count = int(np.prod(shape))
+    return np.frombuffer(buffer, dtype=np.dtype(dtype), count=count).reshape(shape)
+
+
+## Partitioning the rows
+
+# Takes a KeyEncoder, and returns the shard of each of its codes: the CRC-32
+# of the account key, modulo num_shards. Each key is hashed once, however
+# many rows it has, and its shard doesn't depend on the order the keys were
+# encoded in.
+def account_shards(encoder, num_shards):
+    hashes = np.array([zlib.crc32(key.encode('utf-8')) & 0xffffffff for key in encoder.keys],
+                      dtype=np.int64)
+    return hashes % num_shards
+
+# Takes the shard of every row, and returns (rows, bounds): the row numbers
+# sorted by shard, in their original order within each shard, and the rows
+# of shard i are rows[bounds[i]:bounds[i + 1]].
+def partition_rows(shard_of_row, num_shards):
+    shard_of_row = np.asarray(shard_of_row, dtype=np.int64)
+    rows = np.argsort(shard_of_row, kind='mergesort')
+    bounds = np.zeros(num_shards + 1, dtype=np.int64)
+    np.cumsum(np.bincount(shard_of_row, minlength=num_shards), out=bounds[1:])
+    return rows, bounds
+
+
+## The work done in each worker process
+
+_worker_columns = {}
+
+def _init_worker(shared_columns):
+    _worker_columns.clear()
+    for name, shared in shared_columns.items():
+        _worker_columns[name] = attach_shared(shared)
+
+# Computes the first week totals for the accounts in one shard, whose rows
+# are shard_rows[start:end]. Returns (account codes, num_engagements,
+# total_minutes_visited, lessons_completed, days_visited), one entry per
+# account, sorted by code.
+def _shard_first_week_totals(args):
+    start, end, days = args
+    columns = _worker_columns
+    rows = columns['shard_rows'][start:end]
+    shard_codes = columns['account_code'][rows]
+    join_days = columns['paid_join_day'][shard_codes]
+    days_since_join = columns['utc_day'][rows] - join_days
+    in_first_week = (join_days != _NAT_DAY) & (days_since_join >= 0) & (days_since_join < days)
+    rows = rows[in_first_week]
+    shard_codes = shard_codes[in_first_week]
+
+    accounts, group_of_row = np.unique(shard_codes, return_inverse=True)
+    num_groups = len(accounts)
+    num_engagements = np.bincount(group_of_row, minlength=num_groups)
+    total_minutes = np.bincount(group_of_row, weights=columns['total_minutes_visited'][rows],
+                                minlength=num_groups)
+    lessons = np.bincount(group_of_row, weights=columns['lessons_completed'][rows],
+                          minlength=num_groups).astype(np.int64)
+    days_visited = np.bincount(group_of_row, weights=columns['num_courses_visited'][rows] > 0,
+                               minlength=num_groups).astype(np.int64)
+    return accounts, num_engagements, total_minutes, lessons, days_visited
+
+# Computes the first week totals of one shard, and splits them into the
+# accounts that passed and those that didn't. Returns (passing totals,
+# non-passing totals), each like _shard_first_week_totals'.
+def _shard_passing_totals(args):
+    totals = _shard_first_week_totals(args)
+    is_passing = _worker_columns['is_passing'][totals[0]]
+    return (tuple(column[is_passing] for column in totals),
+            tuple(column[~is_passing] for column in totals))
+
+
+# Takes the engagement table and the paid students (and optionally the
+# passing students), and returns (shared columns for _init_worker, shard
+# bounds, account key encoder).
+def _share_first_week_columns(engagement, paid_accounts, paid_join_dates, num_shards,
+                              passing_accounts=None):
+    encoder = engagement.encoders.get('account_key')
+    if encoder is not None:
+        account_codes = engagement['account_key']
+        paid_codes = np.asarray(paid_accounts, dtype=np.int64)
+        passing_codes = passing_accounts
+    else:
+        # encode the string keys for the duration of the call
+        encoder = KeyEncoder()
+        account_codes = encoder.encode(engagement['account_key'])
+        paid_codes = encoder.encode(paid_accounts)
+        passing_codes = encoder.encode(passing_accounts) if passing_accounts is not None else None
+    num_codes = len(encoder)
+
+    # paid join day for every account code (NaT for accounts that aren't paid)
+    paid_join_day = np.full(num_codes, _NAT_DAY, dtype=np.int64)
+    paid_join_day[paid_codes] = np.asarray(paid_join_dates, dtype='datetime64[D]').astype(np.int64)
+    shard_rows, bounds = partition_rows(account_shards(encoder, num_shards)[account_codes],
+                                        num_shards)
+
+    shared_columns = {
+        'shard_rows': share_array(shard_rows),
+        'account_code': share_array(account_codes),
+        'utc_day': share_array(engagement['utc_date'].view(np.int64)),
+        'total_minutes_visited': share_array(engagement['total_minutes_visited']),
+        'lessons_completed': share_array(engagement['lessons_completed']),
+        'num_courses_visited': share_array(engagement['num_courses_visited']),
+        'paid_join_day': share_array(paid_join_day),
+    }
+    if passing_codes is not None:
+        shared_columns['is_passing'] = share_array(encoder.bitmap(passing_codes))
+    return shared_columns, bounds, encoder
+
+# processes defaults to the number of CPUs, and num_shards to processes.
+def _pool_size(processes, num_shards):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if num_shards is None:
+        num_shards = processes
+    return processes, num_shards
+
+# Runs work((start, end, days)) for every shard's bounds in a pool of worker
+# processes, and returns the list of results, in shard order.
+def _map_shards(work, shared_columns, bounds, days, processes):
+    pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(shared_columns,))
+    try:
+        return pool.map(work, [(bounds[shard], bounds[shard + 1], days)
+                               for shard in xrange(len(bounds) - 1)])
+    finally:
+        pool.close()
+        pool.join()
+
+
+# Computes the same per-account first week totals as
+#   engagement_totals(engagement.take(first_week_engagement_rows(...)))
+# using a pool of worker processes. paid_accounts and paid_join_dates come
+# from first_week.find_paid_students. processes defaults to the number of
+# CPUs; num_shards defaults to the number of processes.
+def parallel_first_week_totals(engagement, paid_accounts, paid_join_dates, days=7,
+                               processes=None, num_shards=None):
+    processes, num_shards = _pool_size(processes, num_shards)
+    shared_columns, bounds, encoder = _share_first_week_columns(
+        engagement, paid_accounts, paid_join_dates, num_shards)
+    partials = _map_shards(_shard_first_week_totals, shared_columns, bounds, days, processes)
+    return _merge_totals(partials, encoder)
+
+# Like parallel_first_week_totals, followed by the split of the students
+# into those in passing_accounts (account keys, as stored in engagement) and
+# the rest, which the workers do for their own shard. Returns
+# (passing_totals, non_passing_totals), the same as the serial
+#   totals.take(is_passing), totals.take(~is_passing)
+def parallel_passing_totals(engagement, paid_accounts, paid_join_dates, passing_accounts, days=7,
+                            processes=None, num_shards=None):
+    processes, num_shards = _pool_size(processes, num_shards)
+    shared_columns, bounds, encoder = _share_first_week_columns(
+        engagement, paid_accounts, paid_join_dates, num_shards, passing_accounts)
+    partials = _map_shards(_shard_passing_totals, shared_columns, bounds, days, processes)
+    return tuple(_merge_totals(halves, encoder) for halves in zip(*partials))
+
+# Merges the per-shard totals into one Table. Shards hold disjoint accounts,
+# so merging is just a concatenation, sorted by code to match the serial
+# order.
+def _merge_totals(partials, encoder):
+    merged = [np.concatenate(parts) for parts in zip(*partials)]
+    order = np.argsort(merged[0], kind='mergesort')
+    names = ['account_key', 'num_engagements', 'total_minutes_visited', 'lessons_completed',
+             'days_visited']
+    columns = dict((name, merged_column[order]) for name, merged_column in zip(names, merged))
+    columns['account_key'] = columns['account_key'].astype(np.int32)
+    return Table(columns, names, {'account_key': encoder})
+
+
+FIRST_WEEK_METRICS = ['num_engagements', 'total_minutes_visited', 'lessons_completed',
+                      'days_visited']
+
+def _shard_first_week_stats(args):
+    totals = _shard_first_week_totals(args)
+    return [RunningStats.from_values(values) for values in totals[1:]]
+
+# Like parallel_first_week_totals, but each worker only sends back a
+# RunningStats per metric for its shard, and those are merged here: the
+# per-account totals are never gathered in the parent process. Returns a dict
+# of metric name -> RunningStats, which print_stats accepts directly.
+# (The merged mean and standard deviation can differ from np.mean/np.std of
+# the gathered totals in the last digit or so, since they're summed in a
+# different order.)
+def parallel_first_week_stats(engagement, paid_accounts, paid_join_dates, days=7,
+                              processes=None, num_shards=None):
+    processes, num_shards = _pool_size(processes, num_shards)
+    shared_columns, bounds, encoder = _share_first_week_columns(
+        engagement, paid_accounts, paid_join_dates, num_shards)
+    partials = _map_shards(_shard_first_week_stats, shared_columns, bounds, days, processes)
+    return dict((name, merge_all(shard_stats))
+                for name, shard_stats in zip(FIRST_WEEK_METRICS, zip(*partials)))
+
@@ -0,0 +1,193 @@
+# Compact row objects for the enrollments, daily_engagement and
+# project_submissions tables.
+#
+# unicodecsv.DictReader gives one dict per row, and the notebook then
+# retypes every field of every dict (and, for daily_engagement, deletes and
+# adds a key to rename 'acct'). A dict carries a hash table per row, which is
+# most of the memory the rows take up. The record classes here have a fixed
+# set of fields in __slots__, so each row is a small fixed-size object with no
+# per-row dict. The reader creates them already typed (with the same values
+# the notebook's cleaning loops produced), and they keep the dict-style
+# row['field'] access, so code written for the dict rows still runs.
+#
+# daily_engagement's 'acct' field is stored as account_key; row['acct'] still
+# works, but 'acct' in row is False (as it is for a dict row once renamed),
+# and del row['acct'] does nothing, so the notebook's rename loop runs as a
+# no-op on records.
+#
+# For whole-column work, prefer the columnar Tables in columnar.py; records
+# are for code that wants one Python object per row, and records_from_table
+# turns a (cached) Table into records without reading the CSV again.
+
+import unicodecsv
+
+from l1_analysis.columnar import (
+    ENGAGEMENT_TYPES,
+    ENROLLMENT_TYPES,
+    SUBMISSION_TYPES,
+    to_python,
+)
+from l1_analysis.dates import parse_date
+
+
+# Value parsers: each takes one CSV cell and returns the same value as the
+# notebook's cleaning loops.
+def parse_maybe_int(i):
+    if i == '':
+        return None
+    return int(i)
+
+def parse_bool(value):
+    return value == 'True'
+
+def parse_int_from_float(value):
+    return int(float(value))
+
+VALUE_PARSERS = {
+    'str': None,
+    'date': parse_date,
+    'maybe_int': parse_maybe_int,
+    'bool': parse_bool,
+    'int_from_float': parse_int_from_float,
+    'float': float,
+}
+
+
+# Base class for the record types. Subclasses list their fields in __slots__
+# and can map other field names onto them in aliases.
+class Record(object):
+    __slots__ = ()
+    aliases = {}
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.aliases.get(key, key))
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, self.aliases.get(key, key), value)
+        except (AttributeError, TypeError):
+            raise KeyError('%s has no field %r (the fields are fixed)' % (type(self).__name__, key))
+
+    # Deleting an alias does nothing (its value lives on under the field's
+    # own name); the fields themselves can't be deleted.
+    def __delitem__(self, key):
+        if key in self.aliases:
+            return
+        if key in self.__slots__:
+            raise KeyError('%s can\'t delete field %r (the fields are fixed)' % (type(self).__name__, key))
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    # Only the fields' own names, not the aliases, like keys().
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def keys(self):
+        return list(self.__slots__)
+
+    def values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.__slots__]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    # Printed like the unicodecsv.DictReader rows were, with unicode keys.
+    def __repr__(self):
+        return repr(dict((unicode(name), value) for name, value in self.items()))
+
+
+class EnrollmentRecord(Record):
+    __slots__ = ('account_key', 'status', 'join_date', 'cancel_date', 'days_to_cancel',
+                 'is_udacity', 'is_canceled')
+
+class EngagementRecord(Record):
+    __slots__ = ('account_key', 'utc_date', 'num_courses_visited', 'total_minutes_visited',
+                 'lessons_completed', 'projects_completed')
+    aliases = {'acct': 'account_key'}
+
+class SubmissionRecord(Record):
+    __slots__ = ('creation_date', 'completion_date', 'assigned_rating', 'account_key',
+                 'lesson_key', 'processing_state')
+
+
+# Returns a list of Python values for one column of a Table: strings for
+# encoded keys, and whatever its rows hand out (see columnar.to_python) for
+# the other columns.
+def _column_values(table, name):
+    encoder = table.encoders.get(name)
+    if encoder is not None:
+        return encoder.decode(table[name]).tolist()
+    return [to_python(value) for value in table[name]]
+
+# Takes a Table (e.g. one of load_cleaned_tables' tables) and returns its
+# rows as a list of records of the given class, holding the same values as
+# the Table's rows.
+def records_from_table(table, record_class):
+    names = dict((record_class.aliases.get(name, name), name) for name in table.names)
+    if sorted(names) != sorted(record_class.__slots__):
+        raise ValueError('columns %s do not match the fields of %s' % (
+            ', '.join(table.names), record_class.__name__))
+    columns = [_column_values(table, names[field]) for field in record_class.__slots__]
+    return [record_class(*values) for values in zip(*columns)]
+
+
+# Reads a CSV file into a list of records of the given class, converting
+# each column with the parser for its type in types (columns not listed are
+# kept as strings). The CSV columns can come in any order, but must all be
+# fields (or aliases) of the record class.
+def read_records(filename, record_class, types):
+    with open(filename, 'rb') as f:
+        reader = unicodecsv.reader(f)
+        header = next(reader)
+        fields = [record_class.aliases.get(name, name) for name in header]
+        unknown = [name for name in fields if name not in record_class.__slots__]
+        missing = [name for name in record_class.__slots__ if name not in fields]
+        if unknown or missing:
+            raise ValueError('%s: columns %s do not match the fields of %s' % (
+                filename, ', '.join(header), record_class.__name__))
+        # parser and CSV column for each field, in __slots__ order
+        positions = [fields.index(name) for name in record_class.__slots__]
+        parsers = [VALUE_PARSERS[types.get(header[position], 'str')] for position in positions]
+        columns = zip(positions, parsers)
+        records = []
+        for row in reader:
+            records.append(record_class(*[row[position] if parse is None else parse(row[position])
+                                          for position, parse in columns]))
+        return records
+
+
+def load_enrollment_records(filename='enrollments.csv'):
+    return read_records(filename, EnrollmentRecord, ENROLLMENT_TYPES)
+
+def load_engagement_records(filename='daily_engagement.csv'):
+    return read_records(filename, EngagementRecord, ENGAGEMENT_TYPES)
+
+def load_submission_records(filename='project_submissions.csv'):
+    return read_records(filename, SubmissionRecord, SUBMISSION_TYPES)
@@ -0,0 +1,186 @@
+# Rendering of the report figures in background processes.
+#
+# The plotting cells draw their figures one after another on the main
+# thread, and nothing else is printed until they're done. Here a plot report
+# only describes its figures, as FigureJobs: the name of the file, a
+# module-level function that draws the figure, and the arguments it needs
+# (histograms, bins, titles). A FigureRenderer hands the jobs to a pool of
+# worker processes using the non-interactive Agg backend, which save them as
+# PNG or SVG files; submit() returns as soon as the jobs are queued, so the
+# text reports keep coming out while the figures are drawn, and wait()
+# collects them at the end.
+#
+# A digest of each figure's arguments is kept in plot_dir/figures.json. With
+# skip_unchanged, a figure whose digest is the same as last time (and whose
+# file is still there) isn't drawn again.
+#
+#   renderer = FigureRenderer('plots', processes=2, format='svg', skip_unchanged=True)
+#   analysis = Analysis(data_dir, plot_dir='plots', renderer=renderer)
+#   analysis.run_report('histograms')    # returns once the figures are queued
+#   analysis.run_report('passing')
+#   renderer.close()
+#
+# From the command line:
+#   python -m l1_analysis --plot-processes 2 [--plot-format svg] [--skip-unchanged] histograms passing
+
+from collections import namedtuple
+import hashlib
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+FORMATS = ['png', 'svg']
+MANIFEST = 'figures.json'
+
+# A figure to draw: draw(plt, *args) draws it on the current figure, and it's
+# saved as name + '.' + format. draw must be a module-level function, and
+# args picklable, for the job to go to another process.
+FigureJob = namedtuple('FigureJob', ['name', 'draw', 'args'])
+
+
+## Digests of the figures' inputs
+
+def _update_digest(digest, value):
+    if isinstance(value, np.ndarray):
+        digest.update('array %s %s ' % (value.dtype, value.shape))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update('sequence %d ' % len(value))
+        for item in value:
+            _update_digest(digest, item)
+    elif isinstance(value, dict):
+        digest.update('dict %d ' % len(value))
+        for key in sorted(value):
+            _update_digest(digest, key)
+            _update_digest(digest, value[key])
+    elif callable(value) and hasattr(value, '__name__'):
+        digest.update('function %s.%s ' % (value.__module__, value.__name__))
+    elif hasattr(value, '__dict__'):
+        digest.update('object %s ' % type(value).__name__)
+        _update_digest(digest, vars(value))
+    else:
+        digest.update('%s %r ' % (type(value).__name__, value))
+
+# Returns a hex digest of a value made of arrays, sequences, dicts, objects
+# and plain values, which is the same whenever the contents are.
+def digest_of(value):
+    digest = hashlib.sha1()
+    _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+## Drawing (in the worker processes)
+
+_pyplot = None
+
+# matplotlib.pyplot, with the Agg backend if pyplot hasn't been imported yet.
+def agg_pyplot():
+    global _pyplot
+    if _pyplot is None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        try:
+            import seaborn
+        except ImportError:
+            pass
+        _pyplot = plt
+    return _pyplot
+
+def _init_worker():
+    agg_pyplot()
+
+# Draws a FigureJob and saves it to path. Returns path.
+def draw_figure(job, path):
+    plt = agg_pyplot()
+    figure = plt.figure()
+    try:
+        job.draw(plt, *job.args)
+        figure.savefig(path)
+    finally:
+        plt.close(figure)
+    return path
+
+
+class FigureRenderer(object):
+
+    # Figures are saved in plot_dir, in format ('png' or 'svg'), by a pool
+    # of processes (default: one per core); with processes=0 they're drawn
+    # in this process instead, as they're submitted.
+    def __init__(self, plot_dir='.', processes=None, format='png', skip_unchanged=False):
+        if format not in FORMATS:
+            raise ValueError('unknown figure format: %s (use one of %s)'
+                             % (format, ', '.join(FORMATS)))
+        self.plot_dir = plot_dir
+        self.processes = processes
+        self.format = format
+        self.skip_unchanged = skip_unchanged
+        self.manifest = self._read_manifest()
+        self.pool = None
+        # (path, digest, AsyncResult) of the figures still being drawn
+        self.pending = []
+        self.saved = []
+        self.skipped = []
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.plot_dir, MANIFEST)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        with open(os.path.join(self.plot_dir, MANIFEST), 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+
+    def path(self, job):
+        return os.path.join(self.plot_dir, '%s.%s' % (job.name, self.format))
+
+    # Queues the figures to be drawn, and returns straight away (unless
+    # processes is 0).
+    def submit(self, jobs):
+        if not os.path.exists(self.plot_dir):
+            os.makedirs(self.plot_dir)
+        for job in jobs:
+            path = self.path(job)
+            job_digest = digest_of((job.draw, job.args))
+            if (self.skip_unchanged and self.manifest.get(os.path.basename(path)) == job_digest
+                    and os.path.exists(path)):
+                self.skipped.append(path)
+                print 'unchanged', path
+                continue
+            if self.processes == 0:
+                draw_figure(job, path)
+                self._saved(path, job_digest)
+                continue
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.processes, initializer=_init_worker)
+            self.pending.append((path, job_digest, self.pool.apply_async(draw_figure, (job, path))))
+
+    def _saved(self, path, job_digest):
+        self.manifest[os.path.basename(path)] = job_digest
+        self._write_manifest()
+        self.saved.append(path)
+        print 'saved', path
+
+    # Waits for every figure submitted so far to be saved, and returns the
+    # paths of all the figures saved. A figure that failed to draw raises its
+    # exception here.
+    def wait(self):
+        pending, self.pending = self.pending, []
+        for path, job_digest, result in pending:
+            result.get()
+            self._saved(path, job_digest)
+        return self.saved
+
+    # Waits for the figures, and stops the worker processes.
+    def close(self):
+        try:
+            return self.wait()
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
@@ -0,0 +1,109 @@
+# Deterministic sampling of accounts, for trying things out on a fraction of
+# the data.
+#
+# An AccountSample keeps the accounts whose key hashes (MD5 of the seed and
+# the key) below fraction of the hash range. The hash depends on nothing but
+# the key, so the same accounts are kept in enrollments, daily_engagement and
+# project_submissions (and in every run, on every machine): every kept
+# engagement or submission row still has its enrollments, and the joins give
+# the same answers for the kept students as on the whole data.
+#
+# The loaders take it as sample=..., and skip the rows of the other accounts
+# as the CSV is read, before any of their cells are converted (see
+# columnar.iter_table_chunks), so a 10% sample is parsed in about a tenth of
+# the time and memory. Per-student statistics (means, medians, ...) are
+# estimates of the same numbers over every student; counts of rows or
+# students are about fraction times the full counts, and scale_up() turns
+# them back into estimates of those.
+#
+#   sample = AccountSample(0.1)
+#   tables = load_cleaned_tables(data_dir, sample=sample)   # cached separately
+#   python -m l1_analysis --sample 0.1 [--sample-seed N] [report ...]
+#
+# In the notebook, set L1_SAMPLE=0.1 (and optionally L1_SAMPLE_SEED).
+
+import hashlib
+import os
+
+import numpy as np
+
+SAMPLE_ENV_VARIABLE = 'L1_SAMPLE'
+SEED_ENV_VARIABLE = 'L1_SAMPLE_SEED'
+# The columns holding account keys.
+KEY_COLUMNS = ['account_key', 'acct']
+HASH_RANGE = 1 << 64
+# Most keys whose answer is remembered at once.
+MAX_CACHED_KEYS = 1 << 16
+
+
+class AccountSample(object):
+
+    def __init__(self, fraction, seed=0):
+        if not 0 < fraction <= 1:
+            raise ValueError('the sampling fraction must be in (0, 1], not %r' % fraction)
+        self.fraction = fraction
+        self.seed = seed
+        self.threshold = int(fraction * HASH_RANGE)
+        # key -> whether it's kept, for the keys seen lately
+        self._kept = {}
+
+    def __repr__(self):
+        return '<AccountSample %g of accounts, seed %d>' % (self.fraction, self.seed)
+
+    # A name for the sample, e.g. for the directory its tables are cached in.
+    @property
+    def name(self):
+        return 'sample-%r-%d' % (self.fraction, self.seed)
+
+    # Whether the account with the given key (a string) is in the sample.
+    # The answers are remembered, since an account's rows are read one after
+    # another, but only for the last MAX_CACHED_KEYS keys or so: once that
+    # many are remembered, they're forgotten and it starts again.
+    def keeps_key(self, key):
+        kept = self._kept.get(key)
+        if kept is None:
+            if len(self._kept) >= MAX_CACHED_KEYS:
+                self._kept.clear()
+            digest = hashlib.md5(('%d:%s' % (self.seed, key)).encode('utf-8')).hexdigest()
+            kept = self._kept[key] = int(digest[:16], 16) < self.threshold
+        return kept
+
+    # Takes an array of keys (strings), and returns a boolean array saying
+    # which are in the sample.
+    def keeps(self, keys):
+        distinct, inverse = np.unique(np.asarray(keys), return_inverse=True)
+        kept = np.array([self.keeps_key(key) for key in distinct.tolist()], dtype=bool)
+        return kept[inverse]
+
+    # The position of the account key column in a CSV header, or None if it
+    # hasn't got one (its rows are all kept).
+    def key_position(self, header):
+        for name in KEY_COLUMNS:
+            if name in header:
+                return header.index(name)
+        return None
+
+    # Takes a count over the sample, and returns an estimate of the count
+    # over every account.
+    def scale_up(self, count):
+        return int(round(count / self.fraction))
+
+    def describe(self):
+        return 'a %g%% sample of the accounts (seed %d)' % (100.0 * self.fraction, self.seed)
+
+    # Samples are picklable (for ingest.py's worker processes), without the
+    # keys seen so far.
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_kept'] = {}
+        return state
+
+
+# Returns the AccountSample asked for by L1_SAMPLE (and L1_SAMPLE_SEED), or
+# None if it isn't set.
+def sample_from_environment():
+    fraction = os.environ.get(SAMPLE_ENV_VARIABLE)
+    if not fraction:
+        return None
+    return AccountSample(float(fraction), int(os.environ.get(SEED_ENV_VARIABLE, '0')))
+
@@ -0,0 +1,377 @@
+# Fixed-size sketches for approximate answers over very large tables.
+#
+# count_unique_id builds a set of every key to count the distinct students,
+# print_stats needs the whole list of per-student totals, and each histogram
+# goes through every value. The sketches here take the values a chunk at a
+# time and keep a summary whose size doesn't depend on how many values went
+# in, at the price of answers that are off by a known amount:
+#   - HyperLogLog counts distinct keys in 2**precision one-byte registers
+#     (16 KB by default), with a relative standard error of
+#     1.04 / sqrt(2**precision) (0.8%)
+#   - QuantileSketch (a KLL sketch) keeps about 3 * k values, in a few levels
+#     of sorted, thinned-out samples, for quantiles and medians whose rank is
+#     off by at most about 1.3% of the count (k = 200, 99% of the time)
+#   - SampledHistogram keeps a reservoir sample of sample_size values (see
+#     stats.RunningStats) and scales its histogram up to the full count; each
+#     bin's count has a binomial standard error
+# The mean, standard deviation, minimum and maximum are exact anyway in a
+# RunningStats, which keeps five numbers; ApproximateStats puts it together
+# with a QuantileSketch for print_stats.
+#
+# Every sketch can be filled chunk by chunk (add_values) and merged with
+# another of the same kind (merge), e.g. one per CSV chunk or per worker
+# process:
+#
+#   students = HyperLogLog()
+#   for chunk in iter_table_chunks('daily_engagement.csv', ENGAGEMENT_TYPES):
+#       students.add_column(chunk, 'acct')
+#   low, high = students.bounds()
+#
+# (count_keys does just that). from_values feeds an array in CHUNK_SIZE
+# slices too, so a sketch never makes a working copy of more than that.
+#
+# With Analysis(approximate=True) (python -m l1_analysis --approximate), the
+# reports use these instead of the exact computations.
+
+import hashlib
+import math
+
+import numpy as np
+
+from l1_analysis.columnar import CHUNK_SIZE, iter_table_chunks
+from l1_analysis.join import max_per_key
+from l1_analysis.stats import RunningStats
+
+DEFAULT_PRECISION = 14
+DEFAULT_K = 200
+DEFAULT_SAMPLE_SIZE = 10000
+# Smallest level of a QuantileSketch (the bottom levels would otherwise get
+# too small to thin out usefully).
+MIN_LEVEL_SIZE = 8
+
+
+## Hashing
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+def _shift(values, bits):
+    return values >> np.uint64(bits)
+
+# Takes an array of keys (integers or strings), and returns a 64-bit hash of
+# each, as np.uint64. Integers are mixed with SplitMix64's finalizer; strings
+# are hashed with MD5 (one Python call per string), so the same string
+# always gets the same hash, in any process.
+def hash_keys(keys):
+    keys = np.asarray(keys)
+    if keys.dtype.kind in 'biu':
+        with np.errstate(over='ignore'):
+            z = keys.astype(np.int64).view(np.uint64) + _GOLDEN
+            z = (z ^ _shift(z, 30)) * _MIX1
+            z = (z ^ _shift(z, 27)) * _MIX2
+            return z ^ _shift(z, 31)
+    digests = ''.join(hashlib.md5(unicode(key).encode('utf-8')).digest()[:8]
+                      for key in keys.tolist())
+    return np.frombuffer(digests, dtype='<u8').astype(np.uint64)
+
+# Returns the number of bits needed for each value of a np.uint64 array
+# (0 for 0), like int.bit_length.
+def _bit_lengths(values):
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for bits in [32, 16, 8, 4, 2, 1]:
+        shifted = _shift(values, bits)
+        big = shifted != 0
+        values = np.where(big, shifted, values)
+        lengths += big * bits
+    return lengths + (values != 0)
+
+# Adds an array of values to a sketch chunk_size values at a time.
+def add_in_chunks(sketch, values, chunk_size=CHUNK_SIZE):
+    for start in xrange(0, len(values), chunk_size):
+        sketch.add_values(values[start:start + chunk_size])
+    return sketch
+
+
+class HyperLogLog(object):
+
+    # precision: log2 of the number of registers (4 to 18).
+    def __init__(self, precision=DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be between 4 and 18, not %r' % precision)
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @classmethod
+    def from_values(cls, values, precision=DEFAULT_PRECISION):
+        return add_in_chunks(cls(precision), values)
+
+    def __repr__(self):
+        return '<HyperLogLog ~%d distinct (+/- %.1f%%)>' % (self.count,
+                                                             200 * self.relative_error)
+
+    # Adds an array of keys (integers or strings). Repeated keys set the same
+    # register to the same rank, so they needn't be removed first.
+    def add_values(self, values):
+        if len(values) == 0:
+            return
+        hashes = hash_keys(values)
+        value_bits = 64 - self.precision
+        registers = _shift(hashes, value_bits).astype(np.int64)
+        rest = hashes & np.uint64((1 << value_bits) - 1)
+        # the position of the first 1 bit of the rest of the hash
+        ranks = value_bits - _bit_lengths(rest) + 1
+        registers, ranks = max_per_key(registers, ranks)
+        self.registers[registers] = np.maximum(self.registers[registers], ranks)
+
+    # Adds the keys in a Table column, as strings (so the counts of tables
+    # with different encoders can be merged).
+    def add_column(self, table, column):
+        self.add_values(table.decode(column, np.unique(table[column])))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('can only merge HyperLogLogs of the same precision')
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    # The estimated number of distinct keys (with the small range correction
+    # of Flajolet et al.: linear counting while registers are still empty).
+    @property
+    def count(self):
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.sum(self.registers == 0))
+        if estimate <= 2.5 * m and empty:
+            estimate = m * math.log(m / empty)
+        return int(round(estimate))
+
+    # The relative standard error of count.
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    # (low, high) bounds on the number of distinct keys, sigmas standard
+    # errors either side of count (2: about 95% of the time).
+    def bounds(self, sigmas=2):
+        margin = sigmas * self.relative_error * self.count
+        return max(int(math.floor(self.count - margin)), 0), int(math.ceil(self.count + margin))
+
+
+class QuantileSketch(object):
+
+    # k sets the size and the accuracy (see rank_error); seed makes the
+    # thinning out repeatable.
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = k
+        self.count = 0
+        self.min = None
+        self.max = None
+        # levels[h] holds values standing for 2**h values each
+        self.levels = [np.zeros(0)]
+        self._random = np.random.RandomState(seed)
+
+    @classmethod
+    def from_values(cls, values, k=DEFAULT_K, seed=0):
+        return add_in_chunks(cls(k, seed), values)
+
+    def __repr__(self):
+        return '<QuantileSketch count=%d, %d values kept>' % (self.count, self.num_kept)
+
+    @property
+    def num_kept(self):
+        return sum(len(level) for level in self.levels)
+
+    # The largest difference between the rank (as a fraction of the count) of
+    # a returned quantile and the one asked for, 99% of the time: the bound
+    # measured for KLL sketches of this kind (Apache DataSketches' fit).
+    @property
+    def rank_error(self):
+        return 2.296 / self.k ** 0.9723
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3.0) ** depth)), MIN_LEVEL_SIZE)
+
+    # While more values are kept than the levels have room for, thins out
+    # the lowest level that's full: it's sorted, and every other value
+    # (starting at random with the first or the second) moves up a level,
+    # standing for twice as many values. Levels are only thinned out once
+    # the whole sketch is full, so they're kept as full as they can be.
+    def _compress(self):
+        while self.num_kept > sum(self._capacity(level) for level in xrange(len(self.levels))):
+            level = 0
+            while len(self.levels[level]) < self._capacity(level):
+                level += 1
+            if level + 1 == len(self.levels):
+                self.levels.append(np.zeros(0))
+            values = np.sort(self.levels[level])
+            # with an odd number, the smallest value stays where it is
+            odd = len(values) % 2
+            self.levels[level] = values[:odd]
+            promoted = values[odd + self._random.randint(2)::2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def add_values(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        low, high = values.min(), values.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    # The kept values, sorted, and the cumulative number of values each
+    # stands for.
+    def _cumulative(self):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.repeat(1 << level, len(kept))
+                                  for level, kept in enumerate(self.levels)])
+        order = np.argsort(values, kind='mergesort')
+        return values[order], np.cumsum(weights[order])
+
+    # Approximate quantile (0 <= q <= 1): the smallest kept value with at
+    # least q of the count at or below it (the minimum and the maximum are
+    # exact).
+    def quantile(self, q):
+        if self.count == 0:
+            raise ValueError('no values in the sketch')
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        values, cumulative = self._cumulative()
+        position = np.searchsorted(cumulative, q * self.count, side='left')
+        return values[min(position, len(values) - 1)]
+
+    def median(self):
+        return self.quantile(0.5)
+
+    # (low, high): values between which the true q quantile lies, 99% of the
+    # time.
+    def quantile_bounds(self, q):
+        return (self.quantile(max(q - self.rank_error, 0.0)),
+                self.quantile(min(q + self.rank_error, 1.0)))
+
+    # Approximate fraction of the values at or below value.
+    def rank(self, value):
+        if self.count == 0:
+            return np.nan
+        values, cumulative = self._cumulative()
+        position = np.searchsorted(values, value, side='right')
+        return cumulative[position - 1] / float(self.count) if position else 0.0
+
+
+class SampledHistogram(object):
+
+    # sample_size: number of values kept. seed makes the sampling repeatable.
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE, seed=0):
+        self.stats = RunningStats(sample_size, seed)
+
+    @classmethod
+    def from_values(cls, values, sample_size=DEFAULT_SAMPLE_SIZE, seed=0):
+        return add_in_chunks(cls(sample_size, seed), values)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    def add_values(self, values):
+        self.stats.add_values(values)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        return self
+
+    # Returns (counts, edges, errors) like histograms.Histogram.counts, with
+    # the sample's counts scaled up to the full count: counts are floats, and
+    # errors is each count's standard error. range defaults to the (scaled)
+    # smallest and largest value of all of them, not just of the sample.
+    def counts(self, bins=10, range=None, scale=1.0):
+        sample = np.asarray(self.stats.sample, dtype=np.float64)
+        if range is None:
+            range = (self.stats.min * scale, self.stats.max * scale) if self.count else (0, 1)
+        counts, edges = np.histogram(sample * scale, bins, range=range)
+        if len(sample) == 0:
+            return counts.astype(np.float64), edges, np.zeros(len(counts))
+        fractions = counts / float(len(sample))
+        errors = self.count * np.sqrt(fractions * (1 - fractions) / len(sample))
+        if len(sample) == self.count:
+            # every value was kept
+            errors[:] = 0
+        return fractions * self.count, edges, errors
+
+    # Draws the histogram with plt.bar, like Histogram.plot.
+    def plot(self, bins=10, range=None, scale=1.0, **bar_options):
+        import matplotlib.pyplot as plt
+        counts, edges, errors = self.counts(bins, range, scale)
+        bar_options.setdefault('linewidth', 0)
+        return plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge', **bar_options)
+
+
+# RunningStats (exact mean, standard deviation, minimum and maximum) and a
+# QuantileSketch (approximate median and quantiles), for print_stats.
+class ApproximateStats(RunningStats):
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        RunningStats.__init__(self)
+        self.quantiles = QuantileSketch(k, seed)
+
+    @classmethod
+    def from_values(cls, values, k=DEFAULT_K, seed=0):
+        return add_in_chunks(cls(k, seed), values)
+
+    def add(self, value):
+        RunningStats.add(self, value)
+        self.quantiles.add_values([value])
+
+    def add_values(self, values):
+        RunningStats.add_values(self, values)
+        self.quantiles.add_values(values)
+
+    def merge(self, other):
+        RunningStats.merge(self, other)
+        if isinstance(other, ApproximateStats):
+            self.quantiles.merge(other.quantiles)
+        return self
+
+    def quantile(self, q):
+        return self.quantiles.quantile(q)
+
+    def median(self):
+        return self.quantiles.median()
+
+    def quantile_bounds(self, q):
+        return self.quantiles.quantile_bounds(q)
+
+
+# Reads a CSV file a chunk at a time, and returns (number of rows, a
+# HyperLogLog of the distinct values of column). sample is an optional
+# sampling.AccountSample, as for columnar.iter_table_chunks.
+def count_keys(filename, types, column, chunk_size=CHUNK_SIZE, sample=None,
+               precision=DEFAULT_PRECISION):
+    num_rows = 0
+    keys = HyperLogLog(precision)
+    for chunk in iter_table_chunks(filename, types, chunk_size, sample=sample):
+        num_rows += len(chunk)
+        keys.add_values(chunk[column])
+    return num_rows, keys
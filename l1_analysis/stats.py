@@ -0,0 +1,179 @@
+# Single-pass, mergeable summary statistics.
+#
+# The notebook's print_stats calls np.mean, np.std, np.min and np.max one
+# after the other on a Python list, which turns the list into an array four
+# times and needs every value in memory. A RunningStats keeps only the count,
+# mean, sum of squared differences from the mean (Welford's M2), min and max:
+#   - values can be added one at a time (add) or a chunk at a time
+#     (add_values)
+#   - partial results from different chunks or worker processes can be
+#     combined with merge (Chan et al.'s parallel variance formula)
+#   - optionally, a fixed-size random sample of the values is kept for
+#     approximate quantiles (quantile, median)
+#
+# Built from a whole array at once (RunningStats.from_values), the mean and
+# standard deviation are computed the same way np.mean and np.std do, so
+# print_stats prints exactly the same numbers as before.
+
+import random
+
+import numpy as np
+
+
+class RunningStats(object):
+
+    # sample_size: number of values kept for approximate quantiles
+    # (None to not keep any). seed makes the sampling repeatable.
+    def __init__(self, sample_size=None, seed=0):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sample_size = sample_size
+        self.sample = []
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_values(cls, values, sample_size=None, seed=0):
+        stats = cls(sample_size, seed)
+        stats.add_values(values)
+        return stats
+
+    def __repr__(self):
+        if self.count == 0:
+            return '<RunningStats empty>'
+        return '<RunningStats count=%d mean=%r std=%r min=%r max=%r>' % (
+            self.count, self.mean, self.std, self.min, self.max)
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return np.float64(np.nan)
+        return np.float64(self._mean)
+
+    # Population variance and standard deviation (ddof=0, like np.var/np.std).
+    @property
+    def variance(self):
+        if self.count == 0:
+            return np.float64(np.nan)
+        return np.float64(self._m2) / self.count
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    # Adds a single value (Welford's update).
+    def add(self, value):
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / float(self.count)
+        self._m2 += delta * (value - self._mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.sample_size:
+            # reservoir sampling: keep each value with probability sample_size / count
+            if len(self.sample) < self.sample_size:
+                self.sample.append(value)
+            else:
+                slot = self._random.randint(0, self.count - 1)
+                if slot < self.sample_size:
+                    self.sample[slot] = value
+
+    # Adds a whole array (or list) of values: computes the chunk's statistics
+    # with NumPy and merges them in.
+    def add_values(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            return
+        chunk = RunningStats(self.sample_size)
+        chunk.count = len(values)
+        chunk._mean = np.mean(values)
+        # same arithmetic as np.var, so from_values matches np.std exactly
+        deviations = values - chunk._mean
+        chunk._m2 = np.sum(deviations * deviations)
+        chunk.min = np.min(values)
+        chunk.max = np.max(values)
+        if self.sample_size:
+            chunk.sample = self._random_subset(values.tolist(), self.sample_size)
+        self.merge(chunk)
+
+    # Combines another RunningStats into this one, as if all of its values
+    # had been added here.
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count = other.count
+            self._mean = other._mean
+            self._m2 = other._m2
+            self.min = other.min
+            self.max = other.max
+            if self.sample_size:
+                self.sample = self._random_subset(other.sample, self.sample_size)
+            return self
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        self._mean = self._mean + delta * other.count / float(count)
+        self._m2 = self._m2 + other._m2 + delta * delta * self.count * other.count / float(count)
+        if other.min < self.min:
+            self.min = other.min
+        if other.max > self.max:
+            self.max = other.max
+        if self.sample_size:
+            self._add_to_sample(other.sample, other.count, count)
+        self.count = count
+        return self
+
+    # Approximate quantile (0 <= q <= 1) from the kept sample; exact while
+    # the number of values is at most sample_size.
+    def quantile(self, q):
+        if not self.sample:
+            raise ValueError('no sample kept: create RunningStats with a sample_size')
+        return np.percentile(self.sample, 100.0 * q)
+
+    def median(self):
+        return self.quantile(0.5)
+
+    ## Sampling helpers
+
+    def _random_subset(self, values, size):
+        if len(values) <= size:
+            return list(values)
+        return self._random.sample(values, size)
+
+    # Merges a sample standing for other_count values into our sample, which
+    # (after this) stands for total_count values: each kept value is drawn
+    # from one side or the other in proportion to how many values it stands
+    # for.
+    def _add_to_sample(self, other_sample, other_count, total_count):
+        if len(self.sample) + len(other_sample) <= self.sample_size and \
+                total_count == len(self.sample) + len(other_sample):
+            # nothing has been dropped yet: keep every value
+            self.sample.extend(other_sample)
+            return
+        num_from_other = int(round(self.sample_size * other_count / float(total_count)))
+        num_from_other = min(num_from_other, len(other_sample))
+        num_from_self = min(self.sample_size - num_from_other, len(self.sample))
+        self.sample = (self._random_subset(self.sample, num_from_self) +
+                       self._random_subset(list(other_sample), num_from_other))
+
+
+# Takes either a RunningStats or a list/array of values, and returns a
+# RunningStats for them.
+def summarize(values):
+    if isinstance(values, RunningStats):
+        return values
+    return RunningStats.from_values(values)
+
+# Merges a list of RunningStats (e.g. one per chunk or per worker process)
+# into a new one.
+def merge_all(partials):
+    partials = list(partials)
+    sample_size = partials[0].sample_size if partials else None
+    merged = RunningStats(sample_size)
+    for partial in partials:
+        merged.merge(partial)
+    return merged
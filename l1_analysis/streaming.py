@@ -0,0 +1,178 @@
+# Streaming mode for daily_engagement tables that don't fit in memory.
+#
+# The notebook loads all of daily_engagement, renames 'acct' to 'account_key',
+# removes the Udacity test accounts and then keeps the rows from each paid
+# student's first week. Here the same steps run as generator stages over
+# fixed-size chunks of the CSV file, and the first week engagement is
+# aggregated per account as the chunks go by. Only one chunk of rows (plus
+# one set of totals per account) is ever held in memory.
+#
+# python -m l1_analysis --streaming runs the reports this way (see
+# analysis.py); tests/test_streaming.py checks that they print the same,
+# and that the aggregates match the notebook's in-memory loop.
+
+import numpy as np
+
+from l1_analysis.columnar import (
+    CHUNK_SIZE,
+    ENGAGEMENT_TYPES,
+    Table,
+    iter_table_chunks,
+    remove_accounts,
+)
+from l1_analysis.first_week import first_week_engagement_rows
+
+
+## Generator stages. Each takes an iterable of Tables and yields Tables.
+
+# sample is an optional sampling.AccountSample (the other accounts' rows are
+# skipped as they're read).
+def read_engagement_chunks(filename='daily_engagement.csv', chunk_size=CHUNK_SIZE, offset=None,
+                           sample=None):
+    return iter_table_chunks(filename, ENGAGEMENT_TYPES, chunk_size, offset=offset, sample=sample)
+
+def rename_acct(chunks):
+    for chunk in chunks:
+        chunk.rename_column('acct', 'account_key')
+        yield chunk
+
+def remove_udacity_accounts(chunks, udacity_test_accounts):
+    for chunk in chunks:
+        yield remove_accounts(chunk, udacity_test_accounts)
+
+# Keeps the rows for paid students that happened in [0, days) days of the
+# student's join date, the same test as within_one_week in the notebook.
+def within_first_days(chunks, paid_students, days=7):
+    paid_accounts = np.array(sorted(paid_students), dtype=np.unicode_)
+    join_dates = np.array([paid_students[account_key] for account_key in paid_accounts],
+                          dtype='datetime64[D]')
+    for chunk in chunks:
+        yield chunk.take(first_week_engagement_rows(chunk, paid_accounts, join_dates, days))
+
+
+# Per-account totals of the first week engagement, built up chunk by chunk.
+# These are the numbers the notebook gets from paid_engagement_in_first_week
+# and engagement_by_account.
+class FirstWeekAggregates(object):
+
+    def __init__(self):
+        self.num_engagements = 0
+        self.num_engagements_by_account = {}
+        self.total_minutes_by_account = {}
+        self.lessons_completed_by_account = {}
+        self.days_visited_by_account = {}
+
+    # The accounts of the paid students who engaged in their first week.
+    @property
+    def students(self):
+        return set(self.num_engagements_by_account)
+
+    # Adds one Table of first week engagement rows to the totals.
+    def add_chunk(self, chunk):
+        if len(chunk) == 0:
+            return
+        self.num_engagements += len(chunk)
+        accounts, inverse = np.unique(chunk['account_key'], return_inverse=True)
+        accounts = accounts.tolist()
+        visited = (chunk['num_courses_visited'] > 0).astype(np.int64)
+        self._add_totals(self.num_engagements_by_account, accounts, inverse, np.ones(len(chunk), dtype=np.int64))
+        self._add_totals(self.total_minutes_by_account, accounts, inverse, chunk['total_minutes_visited'])
+        self._add_totals(self.lessons_completed_by_account, accounts, inverse, chunk['lessons_completed'])
+        self._add_totals(self.days_visited_by_account, accounts, inverse, visited)
+
+    # Drops everything known about the given accounts (e.g. students whose
+    # paid join date changed, before their first week is worked out again).
+    def remove_accounts(self, account_keys):
+        for account_key in account_keys:
+            self.num_engagements -= self.num_engagements_by_account.pop(account_key, 0)
+            self.total_minutes_by_account.pop(account_key, None)
+            self.lessons_completed_by_account.pop(account_key, None)
+            self.days_visited_by_account.pop(account_key, None)
+
+    # np.bincount adds the weights up in order, so putting each account's
+    # running total in front of the chunk's values gives exactly the same
+    # floating point sums as adding the rows one at a time.
+    def _add_totals(self, totals, accounts, inverse, values):
+        running = np.array([totals.get(account_key, 0) for account_key in accounts], dtype=values.dtype)
+        groups = np.concatenate([np.arange(len(accounts)), inverse])
+        if values.dtype.kind == 'f':
+            sums = np.bincount(groups, weights=np.concatenate([running, values]), minlength=len(accounts))
+        else:
+            # bincount weights are floats: sum integer columns separately to stay exact
+            sums = running + _integer_group_sums(inverse, values, len(accounts))
+        for account_key, total in zip(accounts, sums.tolist()):
+            totals[account_key] = total
+
+    # Returns the totals as a Table like groupby.engagement_totals': one row
+    # per account, with the num_engagements, total_minutes_visited,
+    # lessons_completed and days_visited columns. With the account_key
+    # encoder of the tables it's used with, the keys are stored as its codes,
+    # in code order (as engagement_totals has them).
+    def to_table(self, encoder=None):
+        keys = np.array(sorted(self.num_engagements_by_account), dtype=np.unicode_)
+        if encoder is not None:
+            codes = encoder.encode(keys, add=False)
+            order = np.argsort(codes, kind='mergesort')
+            keys, account_keys = keys[order], codes[order]
+        else:
+            account_keys = keys
+        names = ['account_key', 'num_engagements', 'total_minutes_visited', 'lessons_completed',
+                 'days_visited']
+        keys = keys.tolist()
+        columns = {
+            'account_key': account_keys,
+            'num_engagements': np.array([self.num_engagements_by_account[key] for key in keys],
+                                        dtype=np.int64),
+            'total_minutes_visited': np.array([self.total_minutes_by_account[key] for key in keys],
+                                              dtype=np.float64),
+            'lessons_completed': np.array([self.lessons_completed_by_account[key] for key in keys],
+                                          dtype=np.int64),
+            'days_visited': np.array([self.days_visited_by_account[key] for key in keys],
+                                     dtype=np.int64),
+        }
+        encoders = {'account_key': encoder} if encoder is not None else {}
+        return Table(columns, names, encoders)
+
+    def __eq__(self, other):
+        return (self.num_engagements == other.num_engagements and
+                self.num_engagements_by_account == other.num_engagements_by_account and
+                self.total_minutes_by_account == other.total_minutes_by_account and
+                self.lessons_completed_by_account == other.lessons_completed_by_account and
+                self.days_visited_by_account == other.days_visited_by_account)
+
+    def __ne__(self, other):
+        return not self == other
+
+
+def _integer_group_sums(inverse, values, num_groups):
+    order = np.argsort(inverse, kind='mergesort')
+    sorted_groups = inverse[order]
+    starts = np.searchsorted(sorted_groups, np.arange(num_groups))
+    return np.add.reduceat(values[order], starts)
+
+
+# Runs the whole streaming pipeline over daily_engagement.csv, and returns
+# the FirstWeekAggregates for the paid students.
+def stream_first_week_engagement(udacity_test_accounts, paid_students,
+                                 filename='daily_engagement.csv', chunk_size=CHUNK_SIZE, days=7,
+                                 sample=None):
+    chunks = read_engagement_chunks(filename, chunk_size, sample=sample)
+    chunks = rename_acct(chunks)
+    chunks = remove_udacity_accounts(chunks, udacity_test_accounts)
+    chunks = within_first_days(chunks, paid_students, days)
+    aggregates = FirstWeekAggregates()
+    for chunk in chunks:
+        aggregates.add_chunk(chunk)
+    return aggregates
+
+# Counts the rows of daily_engagement.csv and finds its distinct account
+# keys, a chunk at a time. Returns (number of rows, sorted account keys).
+def count_engagement_accounts(filename='daily_engagement.csv', chunk_size=CHUNK_SIZE,
+                              sample=None):
+    num_rows = 0
+    accounts = np.zeros(0, dtype=np.unicode_)
+    for chunk in read_engagement_chunks(filename, chunk_size, sample=sample):
+        num_rows += len(chunk)
+        accounts = np.union1d(accounts, chunk['acct'])
+    return num_rows, accounts
+
@@ -0,0 +1,172 @@
+# An index over project_submissions for "who passed what, and when" queries.
+#
+# get_list_of_students_who_passed_project1 goes through every submission,
+# checking 'lesson_key in subway_project_lesson_keys' (a list) and
+# 'assigned_rating in passing_values' for each, and does it again for every
+# project and set of ratings asked about. A SubmissionIndex sorts the rows
+# once by (lesson_key, assigned_rating, account_key, completion_date), so
+# the rows for any set of lessons and ratings are a few contiguous ranges,
+# found by binary search: a query costs the logarithm of the table size plus
+# the size of its answer, not a pass over the table.
+#
+# The first row of each (lesson, rating, account) range is that student's
+# earliest submission with that rating, so the date each student first
+# passed a set of lessons comes straight out of those rows (and is kept for
+# the next query about the same lessons and ratings). With it,
+#
+#   index = SubmissionIndex(non_udacity_submissions)
+#   index.students(subway_project_lesson_keys, passing_values, paid_accounts)
+#   index.passed_within(subway_project_lesson_keys, passing_values,
+#                       paid_accounts, paid_join_dates, days=30)
+#
+# give the students who passed the subway project, and those who passed it
+# within 30 days of (their most recent) enrollment.
+#
+# Account keys are passed around as stored in the table: int32 codes if the
+# column is encoded (see encoding.py), strings if not. Lesson keys and
+# ratings are always given as strings.
+#
+# tests/test_submissions.py checks the queries against scans of the table;
+#   python benchmarks/bench_submissions.py [data_dir]
+# times them.
+
+import numpy as np
+
+from l1_analysis.join import semi_join
+
+_NAT = np.datetime64('NaT', 'D').astype(np.int64)
+_LAST_DAY = np.iinfo(np.int64).max
+
+
+# Takes (starts, ends) arrays of ranges, and returns every position in them,
+# range by range.
+def range_positions(starts, ends):
+    counts = ends - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+# Takes an array of values, and returns (vocabulary, codes) if they need
+# encoding into integers (strings), or (None, values) if they don't.
+def _integer_codes(values):
+    if values.dtype.kind in 'iu':
+        return None, values.astype(np.int64)
+    vocabulary, codes = np.unique(values, return_inverse=True)
+    return vocabulary, codes.astype(np.int64)
+
+# Takes a sorted vocabulary and some strings, and returns the codes of the
+# strings that are in it.
+def _known_codes(vocabulary, keys):
+    if len(vocabulary) == 0:
+        return np.zeros(0, dtype=np.int64)
+    keys = np.array(keys, dtype=np.unicode_)
+    codes = np.minimum(np.searchsorted(vocabulary, keys), len(vocabulary) - 1)
+    return codes[vocabulary[codes] == keys].astype(np.int64)
+
+
+class SubmissionIndex(object):
+
+    def __init__(self, submissions):
+        self.submissions = submissions
+        self.lesson_encoder = submissions.encoders.get('lesson_key')
+        self.lesson_vocabulary, lessons = _integer_codes(submissions['lesson_key'])
+        self.ratings, ratings = _integer_codes(submissions['assigned_rating'])
+        self.account_vocabulary, accounts = _integer_codes(submissions['account_key'])
+        days = submissions['completion_date'].astype(np.int64)
+        # submissions without a completion date sort last
+        days = np.where(days == _NAT, _LAST_DAY, days)
+
+        # the composite index: (lesson, rating) as one key, then account, then date
+        self.num_ratings = max(len(self.ratings), 1)
+        self.order = np.lexsort((days, accounts, ratings, lessons))
+        self.group_keys = (lessons * self.num_ratings + ratings)[self.order]
+        self.accounts = accounts[self.order]
+        self.days = days[self.order]
+
+        # the first (earliest) row of each (lesson, rating, account) run
+        is_first = np.ones(len(self.order), dtype=bool)
+        is_first[1:] = ((self.group_keys[1:] != self.group_keys[:-1]) |
+                        (self.accounts[1:] != self.accounts[:-1]))
+        self.first_group_keys = self.group_keys[is_first]
+        self.first_accounts = self.accounts[is_first]
+        self.first_days = self.days[is_first]
+        self._first_passes = {}
+
+    def __len__(self):
+        return len(self.order)
+
+    # Takes lesson keys and ratings (strings), and returns the sorted
+    # (lesson, rating) keys of every combination that occurs.
+    def _group_keys_for(self, lesson_keys, ratings):
+        if self.lesson_encoder is not None:
+            lessons = self.lesson_encoder.encode(np.array(list(lesson_keys), dtype=np.unicode_),
+                                                 add=False)
+            lessons = lessons[lessons >= 0].astype(np.int64)
+        else:
+            lessons = _known_codes(self.lesson_vocabulary, list(lesson_keys))
+        rating_codes = _known_codes(self.ratings, list(ratings))
+        keys = lessons[:, np.newaxis] * self.num_ratings + rating_codes[np.newaxis, :]
+        return np.unique(keys)
+
+    # Positions (into the first_* arrays, or the sorted rows if first is
+    # False) of the rows for the given lessons and ratings.
+    def _positions(self, lesson_keys, ratings, first=True):
+        group_keys = self._group_keys_for(lesson_keys, ratings)
+        sorted_keys = self.first_group_keys if first else self.group_keys
+        starts = np.searchsorted(sorted_keys, group_keys, side='left')
+        ends = np.searchsorted(sorted_keys, group_keys, side='right')
+        return range_positions(starts, ends)
+
+    def _account_keys(self, codes):
+        if self.account_vocabulary is None:
+            return codes.astype(self.submissions['account_key'].dtype)
+        return self.account_vocabulary[codes]
+
+    # Returns the indexes (into the submissions Table) of the rows for any of
+    # lesson_keys rated any of ratings, in index order.
+    def rows(self, lesson_keys, ratings):
+        return self.order[self._positions(lesson_keys, ratings, first=False)]
+
+    # Returns the distinct account keys of the students with a submission for
+    # one of lesson_keys rated one of ratings, sorted. If students is given
+    # (an array of account keys), only those students are included. Same
+    # result as first_week.find_passing_students.
+    def students(self, lesson_keys, ratings, students=None):
+        codes = np.unique(self.first_accounts[self._positions(lesson_keys, ratings)])
+        accounts = self._account_keys(codes)
+        if students is not None:
+            accounts = accounts[semi_join(accounts, np.asarray(students))]
+        return accounts
+
+    # Returns (account_keys, first_days), sorted by account key: every
+    # student with a completed submission for one of lesson_keys rated one
+    # of ratings, and the earliest completion_date of those (datetime64[D]).
+    # Worked out once for each set of lessons and ratings.
+    def first_pass_dates(self, lesson_keys, ratings):
+        cache_key = (frozenset(lesson_keys), frozenset(ratings))
+        if cache_key not in self._first_passes:
+            positions = self._positions(lesson_keys, ratings)
+            accounts = self.first_accounts[positions]
+            days = self.first_days[positions]
+            order = np.lexsort((days, accounts))
+            accounts, days = accounts[order], days[order]
+            # the earliest day of each account comes first
+            is_first = np.ones(len(accounts), dtype=bool)
+            is_first[1:] = accounts[1:] != accounts[:-1]
+            is_first &= days != _LAST_DAY
+            self._first_passes[cache_key] = (self._account_keys(accounts[is_first]),
+                                             days[is_first].astype('datetime64[D]'))
+        return self._first_passes[cache_key]
+
+    # Takes students (sorted account keys, e.g. paid_accounts) and their join
+    # dates, and returns the students who first passed one of lesson_keys
+    # (with one of ratings) less than days days after joining.
+    def passed_within(self, lesson_keys, ratings, accounts, join_dates, days):
+        passed_accounts, pass_dates = self.first_pass_dates(lesson_keys, ratings)
+        accounts = np.asarray(accounts)
+        if len(passed_accounts) == 0:
+            return accounts[:0]
+        positions = np.minimum(np.searchsorted(passed_accounts, accounts), len(passed_accounts) - 1)
+        found = passed_accounts[positions] == accounts
+        days_to_pass = (pass_dates[positions] - join_dates).astype(np.int64)
+        return accounts[found & (days_to_pass < days)]
+
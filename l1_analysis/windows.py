@@ -0,0 +1,99 @@
+# Engagement windows relative to each paid student's join date.
+#
+# within_one_week (and first_week.first_week_engagement_rows) work out
+# utc_date - join_date for every engagement row, every time the filter is
+# run, and the whole filter has to be run again for a different window. A
+# DayOffsetIndex does the join with the paid students and the subtraction
+# once: it keeps the paid students' engagement rows sorted by
+# (account, days since join), so the rows of any [start, end) window of days
+# are, for each account, one contiguous slice found by binary search.
+#
+# Typical use:
+#   index = DayOffsetIndex(non_udacity_engagement, paid_accounts, paid_join_dates)
+#   first_week_rows = index.window_rows(0, 7)
+#   first_two_weeks_totals = index.window_totals(0, 14)
+#   first_month_totals = index.window_totals(0, 30, accounts=passing_students)
+#
+# tests/test_windows.py checks the windows against first_week_engagement_rows
+# and a plain loop over the rows. To time a few windows:
+#   python benchmarks/bench_windows.py [data_dir]
+
+import numpy as np
+
+from l1_analysis.first_week import account_index
+from l1_analysis.groupby import engagement_totals
+from l1_analysis.join import inner_join
+
+
+class DayOffsetIndex(object):
+
+    # engagement is an engagement Table; paid_accounts and paid_join_dates
+    # come from first_week.find_paid_students.
+    def __init__(self, engagement, paid_accounts, paid_join_dates):
+        self.engagement = engagement
+        rows, paid_rows = inner_join(engagement['account_key'],
+                                     account_index(engagement, paid_accounts))
+        offsets = (engagement['utc_date'][rows] - paid_join_dates[paid_rows]).astype(np.int64)
+
+        # paid_rows is the account's position in paid_accounts, which is
+        # sorted by key; sort by (account, offset), keeping row order for ties
+        order = np.lexsort((rows, offsets, paid_rows))
+        self.accounts = np.asarray(paid_accounts)
+        self.rows = rows[order]
+        self.offsets = offsets[order]
+        account_positions = paid_rows[order].astype(np.int64)
+
+        # (account position, offset) as one sorted int64, so a single
+        # searchsorted finds both
+        if len(offsets):
+            self.first_offset = int(offsets.min())
+            self.span = int(offsets.max()) - self.first_offset + 1
+        else:
+            self.first_offset = 0
+            self.span = 1
+        self._combined = account_positions * self.span + (self.offsets - self.first_offset)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Returns the positions (in self.accounts) of the given account keys,
+    # dropping keys that aren't paid students; all of them if accounts is None.
+    def _account_positions(self, accounts):
+        if accounts is None:
+            return np.arange(len(self.accounts), dtype=np.int64)
+        accounts = np.asarray(accounts)
+        if len(self.accounts) == 0:
+            return np.zeros(0, dtype=np.int64)
+        positions = np.searchsorted(self.accounts, accounts)
+        positions[positions == len(self.accounts)] = 0
+        found = self.accounts[positions] == accounts
+        return np.unique(positions[found]).astype(np.int64)
+
+    # Takes a window of days since joining, [start, end), and optionally an
+    # array of account keys (a cohort), and returns (accounts, starts, ends):
+    # the window's rows for accounts[i] are self.rows[starts[i]:ends[i]].
+    def window_ranges(self, start, end, accounts=None):
+        positions = self._account_positions(accounts)
+        low = min(max(start - self.first_offset, 0), self.span)
+        high = min(max(end - self.first_offset, 0), self.span)
+        starts = np.searchsorted(self._combined, positions * self.span + low, side='left')
+        ends = np.searchsorted(self._combined, positions * self.span + high, side='left')
+        ends = np.maximum(starts, ends)
+        return self.accounts[positions], starts, ends
+
+    # Returns the indexes of the engagement rows of paid students (of the
+    # given accounts, if any) that happened within [start, end) days of their
+    # join date, in engagement table order. window_rows(0, 7) gives the same
+    # rows as first_week.first_week_engagement_rows.
+    def window_rows(self, start, end, accounts=None):
+        accounts, starts, ends = self.window_ranges(start, end, accounts)
+        counts = ends - starts
+        # concatenate the slices without a Python loop
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.sort(self.rows[np.repeat(starts, counts) + offsets])
+
+    # The per-account engagement totals (see groupby.engagement_totals) for
+    # a window of days since joining, optionally for a cohort of accounts.
+    def window_totals(self, start, end, accounts=None):
+        return engagement_totals(self.engagement.take(self.window_rows(start, end, accounts)))
+
@@ -0,0 +1,3 @@
+# Tests for the l1_analysis package. From the top of the repository:
+#   python -m unittest discover -s tests -t .
+# (or python -m pytest tests, where pytest is installed)
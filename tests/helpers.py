@@ -0,0 +1,74 @@
+# Shared test helpers.
+#
+# tests/data holds a small extract of the course data: every row of 46
+# accounts, chosen to include Udacity test accounts, students who enrolled
+# more than once, students who passed the subway project and students who
+# never engaged.
+
+from StringIO import StringIO
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+CSV_FILES = ['enrollments.csv', 'daily_engagement.csv', 'project_submissions.csv']
+
+
+# A TestCase with a temporary directory (self.temp_dir) for caches and
+# copies of the data, removed after each test.
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='l1_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    # Copies the fixture CSVs into a new directory under temp_dir, and
+    # returns its path.
+    def copy_data(self, name='data'):
+        directory = os.path.join(self.temp_dir, name)
+        os.makedirs(directory)
+        for filename in CSV_FILES:
+            shutil.copy(os.path.join(DATA_DIR, filename), directory)
+        return directory
+
+    def cache_dir(self, name='cache'):
+        return os.path.join(self.temp_dir, name)
+
+
+# Calls function(*args, **kwargs), and returns what it printed.
+def printed_by(function, *args, **kwargs):
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        function(*args, **kwargs)
+        return sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+
+# Returns the names of the columns where two Tables differ (values, types,
+# masks or encoded keys).
+def table_differences(a, b):
+    if a.names != b.names:
+        return ['column names']
+    different = []
+    for name in a.names:
+        x, y = a[name], b[name]
+        if (x.dtype != y.dtype or len(x) != len(y) or
+                isinstance(x, np.ma.MaskedArray) != isinstance(y, np.ma.MaskedArray)):
+            different.append(name)
+        elif isinstance(x, np.ma.MaskedArray):
+            if not (np.array_equal(np.ma.getmaskarray(x), np.ma.getmaskarray(y)) and
+                    np.array_equal(x.filled(0), y.filled(0))):
+                different.append(name)
+        elif not np.array_equal(x, y) and not (x.dtype.kind == 'M' and
+                                               np.array_equal(x.view(np.int64),
+                                                              y.view(np.int64))):
+            # (NaT != NaT, so dates are compared as integers)
+            different.append(name)
+    return different
@@ -0,0 +1,60 @@
+import os
+import unittest
+
+from l1_analysis.analysis import Analysis, dependency_order
+from l1_analysis.records import load_engagement_records, load_enrollment_records
+from tests.helpers import DATA_DIR, TempDirTestCase, printed_by
+
+
+class AnalysisTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.analysis = Analysis(DATA_DIR, self.cache_dir(), plot_dir=self.temp_dir)
+
+    def test_computes_only_what_is_needed(self):
+        self.analysis['passing_students']
+        self.assertEqual(self.analysis.computed, ['non_udacity_enrollments',
+                                                  'non_udacity_submissions', 'paid_students',
+                                                  'passing_students', 'submission_index'])
+        self.assertFalse('daily_engagement' in dependency_order('passing_students'))
+
+    # In approximate mode the students are counted from the CSV files, and
+    # no table is loaded.
+    def test_approximate_table_sizes(self):
+        approximate = Analysis(DATA_DIR, self.cache_dir(), approximate=True)
+        exact_lines = printed_by(self.analysis.run_report, 'table_sizes').splitlines()
+        approximate_lines = printed_by(approximate.run_report, 'table_sizes').splitlines()
+        self.assertEqual(approximate.computed, ['table_counts'])
+        self.assertEqual(dependency_order('table_sizes', approximate=True),
+                         ['table_counts', 'table_sizes'])
+        for exact, estimate in zip(exact_lines, approximate_lines):
+            count, name = exact.split()
+            if name.endswith('_num_rows'):
+                self.assertEqual(estimate, exact)
+            else:
+                low, high = map(int, estimate.split('(')[1].split(')')[0].split(' to '))
+                self.assertTrue(low <= int(count) <= high, (exact, estimate))
+                self.assertTrue(estimate.endswith(name))
+
+    # The notebook's loop, over every enrollment (Udacity test accounts
+    # included) and every engagement record.
+    def test_unengaged_students_match_notebook(self):
+        engaged_students = set(row['acct'] for row in
+                               load_engagement_records(os.path.join(DATA_DIR, 'daily_engagement.csv')))
+        num_unengaged_students = 0
+        num_unengaged_students_enrolled_at_least_1_day = 0
+        for enrollment in load_enrollment_records(os.path.join(DATA_DIR, 'enrollments.csv')):
+            if enrollment['account_key'] not in engaged_students:
+                num_unengaged_students += 1
+                if enrollment['join_date'] != enrollment['cancel_date']:
+                    num_unengaged_students_enrolled_at_least_1_day += 1
+        self.assertTrue(num_unengaged_students > 0)
+        self.assertEqual(printed_by(self.analysis.run_report, 'unengaged_students'),
+                         '%d enrollments with no engagement records\n'
+                         '%d of them enrolled at least one day\n' % (
+                             num_unengaged_students, num_unengaged_students_enrolled_at_least_1_day))
+
+
+if __name__ == '__main__':
+    unittest.main()
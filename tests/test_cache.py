@@ -0,0 +1,125 @@
+import json
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import DATASETS, load_cleaned_tables
+from l1_analysis.columnar import load_enrollments
+from tests.helpers import TempDirTestCase
+
+TABLE_NAMES = [name for name, sources in DATASETS]
+
+
+def assert_tables_equal(test, a, b):
+    test.assertEqual(a.names, b.names)
+    for name in a.names:
+        np.testing.assert_array_equal(a.decode(name), b.decode(name), err_msg=name)
+
+
+class LoadCleanedTablesTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.data_dir = self.copy_data()
+        self.cache = self.cache_dir()
+
+    def load(self, **options):
+        return load_cleaned_tables(self.data_dir, self.cache, **options)
+
+    # Leaves a file in the cache directory of each table; it goes away when
+    # the table is rebuilt.
+    def mark_tables(self):
+        for name in TABLE_NAMES:
+            open(os.path.join(self.cache, name, 'marker'), 'w').close()
+
+    def rebuilt_tables(self):
+        return [name for name in TABLE_NAMES
+                if not os.path.exists(os.path.join(self.cache, name, 'marker'))]
+
+    def rewrite_csv(self, filename, drop_lines=1):
+        path = os.path.join(self.data_dir, filename)
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+        with open(path, 'wb') as f:
+            f.writelines(lines[:-drop_lines])
+
+    def test_warm_load_is_memory_mapped(self):
+        cold = self.load()
+        self.mark_tables()
+        warm = self.load()
+        self.assertEqual(self.rebuilt_tables(), [])
+        self.assertEqual(sorted(warm), sorted(cold))
+        for name in warm:
+            assert_tables_equal(self, warm[name], cold[name])
+            for column in warm[name].names:
+                data = np.ma.getdata(warm[name][column])
+                self.assertTrue(isinstance(data, np.memmap), (name, column))
+                self.assertFalse(data.flags.writeable, (name, column))
+        in_memory = self.load(mmap=False)
+        self.assertFalse(isinstance(in_memory['enrollments']['account_key'], np.memmap))
+        assert_tables_equal(self, in_memory['enrollments'], cold['enrollments'])
+
+    def test_touched_source_is_not_rebuilt(self):
+        self.load()
+        self.mark_tables()
+        filename = os.path.join(self.data_dir, 'enrollments.csv')
+        os.utime(filename, (0, 0))
+        self.load()
+        self.assertEqual(self.rebuilt_tables(), [])
+        with open(os.path.join(self.cache, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual(manifest['tables']['enrollments']['sources']['enrollments.csv']['mtime'],
+                         0)
+
+    def test_changed_source_rebuilds_only_its_tables(self):
+        num_rows = len(self.load()['project_submissions'])
+        self.mark_tables()
+        self.rewrite_csv('project_submissions.csv')
+        tables = self.load()
+        self.assertEqual(self.rebuilt_tables(), ['project_submissions'])
+        self.assertEqual(len(tables['project_submissions']), num_rows - 1)
+
+    def test_changed_enrollments_rebuild_every_table(self):
+        self.load()
+        self.mark_tables()
+        self.rewrite_csv('enrollments.csv')
+        tables = self.load()
+        self.assertEqual(sorted(self.rebuilt_tables()), sorted(TABLE_NAMES))
+        expected = load_enrollments(os.path.join(self.data_dir, 'enrollments.csv'))
+        np.testing.assert_array_equal(tables['enrollments'].decode('account_key'),
+                                      expected['account_key'])
+
+    def test_names_limit_the_tables_loaded(self):
+        tables = self.load(names=['project_submissions'])
+        self.assertEqual(sorted(tables), ['enrollments', 'non_udacity_enrollments',
+                                          'non_udacity_submissions', 'project_submissions'])
+        self.assertFalse(os.path.exists(os.path.join(self.cache, 'daily_engagement')))
+
+    def test_codes_survive_rebuilding_one_table(self):
+        before = self.load()
+        self.rewrite_csv('project_submissions.csv')
+        after = self.load()
+        np.testing.assert_array_equal(after['enrollments']['account_key'],
+                                      before['enrollments']['account_key'])
+        engagement = after['non_udacity_engagement']
+        self.assertTrue(engagement.encoders['account_key'] is
+                        after['non_udacity_submissions'].encoders['account_key'])
+        self.assertTrue(np.in1d(after['non_udacity_submissions'].decode('account_key'),
+                                after['enrollments'].decode('account_key')).all())
+
+    def test_stale_cache_version_is_rebuilt(self):
+        self.load()
+        self.mark_tables()
+        filename = os.path.join(self.cache, 'manifest.json')
+        with open(filename) as f:
+            manifest = json.load(f)
+        manifest['version'] = -1
+        with open(filename, 'w') as f:
+            json.dump(manifest, f)
+        self.load()
+        self.assertEqual(sorted(self.rebuilt_tables()), sorted(TABLE_NAMES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.cohorts import BLOCK_SIZE, Cohort
+from l1_analysis.columnar import load_daily_engagement, load_enrollments
+from l1_analysis.encoding import KeyEncoder, make_encoders
+from tests.helpers import DATA_DIR
+
+
+# The cohort operations against Python sets, on random codes spread over
+# several blocks (both sparse and dense ones).
+class CohortSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+        self.size = 3 * BLOCK_SIZE
+        self.samples = []
+        for fraction in [0.001, 0.01, 0.2, 0.6]:
+            codes = np.flatnonzero(self.random.random_sample(self.size) < fraction)
+            self.samples.append((Cohort.from_codes(codes), set(codes.tolist())))
+
+    def test_contents(self):
+        for a, a_set in self.samples:
+            self.assertEqual(len(a), len(a_set))
+            self.assertEqual(set(a), a_set)
+
+    def test_set_operations(self):
+        for a, a_set in self.samples:
+            for b, b_set in self.samples:
+                self.assertEqual(set(a | b), a_set | b_set)
+                self.assertEqual(set(a & b), a_set & b_set)
+                self.assertEqual(set(a - b), a_set - b_set)
+                self.assertEqual(len(a & b), len(a_set & b_set))
+
+    def test_contains(self):
+        for a, a_set in self.samples:
+            probe = self.random.randint(-1, self.size + 10, 1000)
+            expected = np.array([code in a_set for code in probe.tolist()])
+            np.testing.assert_array_equal(a.contains(probe), expected)
+
+    def test_keys(self):
+        encoder = KeyEncoder(['a', 'b', 'c'])
+        cohort = Cohort.from_keys(['c', 'a', 'x'], encoder)
+        self.assertTrue('a' in cohort)
+        self.assertFalse('b' in cohort)
+        self.assertFalse('x' in cohort)
+        self.assertEqual(sorted(cohort), ['a', 'c'])
+
+
+# Filtering the rows of the fixture tables, against the notebook's sets.
+class CohortFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        encoders = make_encoders()
+        self.enrollments = load_enrollments(os.path.join(DATA_DIR, 'enrollments.csv'), encoders)
+        self.engagement = load_daily_engagement(os.path.join(DATA_DIR, 'daily_engagement.csv'),
+                                                encoders)
+        self.udacity_test_accounts = set(enrollment['account_key']
+                                         for enrollment in self.enrollments
+                                         if enrollment['is_udacity'])
+
+    def test_drop_and_keep(self):
+        udacity = Cohort.from_column(self.enrollments, rows=self.enrollments['is_udacity'])
+        self.assertEqual(set(udacity), self.udacity_test_accounts)
+        self.assertTrue(len(udacity) > 0)
+        kept = udacity.keep(self.engagement, 'acct')
+        dropped = udacity.drop(self.engagement, 'acct')
+        self.assertEqual(len(kept) + len(dropped), len(self.engagement))
+        self.assertEqual([row['acct'] for row in dropped],
+                         [row['acct'] for row in self.engagement
+                          if row['acct'] not in self.udacity_test_accounts])
+
+    def test_unencoded_table(self):
+        udacity = Cohort.from_column(self.enrollments, rows=self.enrollments['is_udacity'])
+        engagement = load_daily_engagement(os.path.join(DATA_DIR, 'daily_engagement.csv'))
+        np.testing.assert_array_equal(udacity.row_mask(engagement, 'acct'), [
+            key in self.udacity_test_accounts for key in engagement['acct']])
+
+
+if __name__ == '__main__':
+    unittest.main()
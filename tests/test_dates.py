@@ -0,0 +1,44 @@
+from datetime import datetime as dt
+import unittest
+
+import numpy as np
+
+from l1_analysis import dates
+
+
+# The notebook's parse_date.
+def strptime_parse_date(date):
+    if date == '':
+        return None
+    else:
+        return dt.strptime(date, '%Y-%m-%d')
+
+
+class ParseDateTest(unittest.TestCase):
+
+    def setUp(self):
+        dates.clear_date_caches()
+        self.values = [u'2014-11-10', u'2015-01-01', u'', u'2015-07-16', u'2014-11-10',
+                       u'2016-02-29']
+
+    def test_same_as_strptime(self):
+        expected = [strptime_parse_date(value) for value in self.values]
+        self.assertEqual([dates.parse_date(value) for value in self.values], expected)
+        # again, from the cache
+        self.assertEqual([dates.parse_date(value) for value in self.values], expected)
+        self.assertEqual([dates.parse_iso_date(value) for value in self.values if value],
+                         [date for date in expected if date is not None])
+
+    def test_bad_dates_raise(self):
+        for value in [u'2015-02-30', u'2015/01/01', u'yesterday']:
+            self.assertRaises(ValueError, dates.parse_date, value)
+
+    def test_column(self):
+        column = dates.parse_date_column(self.values)
+        self.assertEqual(column.dtype, np.dtype('datetime64[D]'))
+        self.assertEqual([dates.datetime_from_day(day) for day in column],
+                         [strptime_parse_date(value) for value in self.values])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.columnar import load_enrollments
+from l1_analysis.encoding import KeyEncoder, column_encoders, make_encoders
+from tests.helpers import DATA_DIR
+
+
+class KeyEncoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = KeyEncoder([u'448', u'700'])
+
+    def test_codes_in_order_of_first_appearance(self):
+        codes = self.encoder.encode([u'12', u'448', u'12', u'9'])
+        self.assertEqual(codes.tolist(), [2, 0, 2, 3])
+        self.assertEqual(codes.dtype, np.int32)
+        self.assertEqual(self.encoder.keys, [u'448', u'700', u'12', u'9'])
+        self.assertEqual(self.encoder.encode([]).tolist(), [])
+
+    def test_unknown_keys_without_add(self):
+        self.assertEqual(self.encoder.encode([u'700', u'12'], add=False).tolist(), [1, -1])
+        self.assertEqual(len(self.encoder), 2)
+
+    def test_decode_round_trip(self):
+        keys = [u'9', u'448', u'9', u'31']
+        codes = self.encoder.encode(keys)
+        self.assertEqual(self.encoder.decode(codes).tolist(), keys)
+        self.assertEqual([self.encoder.decode_one(code) for code in codes], keys)
+        self.assertEqual(self.encoder.decode([]).tolist(), [])
+
+    def test_key_array_follows_growth(self):
+        self.assertEqual(self.encoder.key_array().tolist(), [u'448', u'700'])
+        self.encoder.encode([u'5'])
+        self.assertEqual(self.encoder.key_array().tolist(), [u'448', u'700', u'5'])
+
+    def test_unknown_codes_do_not_decode(self):
+        self.assertRaises(ValueError, self.encoder.decode_one, -1)
+        self.assertRaises(ValueError, self.encoder.decode, [0, -1])
+        self.assertRaises(ValueError, self.encoder.decode, np.array([-1], dtype=np.int32))
+
+    def test_bitmap_ignores_unknown_codes(self):
+        self.assertEqual(self.encoder.bitmap([1, -1]).tolist(), [False, True])
+
+
+class ColumnEncodersTest(unittest.TestCase):
+
+    def test_acct_shares_the_account_key_encoder(self):
+        encoders = make_encoders()
+        result = column_encoders(['acct', 'utc_date', 'lesson_key', 'account_key'], encoders)
+        self.assertEqual(sorted(result), ['account_key', 'acct', 'lesson_key'])
+        self.assertTrue(result['acct'] is encoders['account_key'])
+        self.assertEqual(column_encoders(['acct'], None), {})
+
+    def test_encoded_table_decodes_to_the_csv_strings(self):
+        filename = os.path.join(DATA_DIR, 'enrollments.csv')
+        plain = load_enrollments(filename)
+        encoded = load_enrollments(filename, make_encoders())
+        self.assertEqual(encoded['account_key'].dtype, np.int32)
+        np.testing.assert_array_equal(encoded.decode('account_key'), plain['account_key'])
+        self.assertEqual(encoded.encode('account_key', [u'no such key']).tolist(), [-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
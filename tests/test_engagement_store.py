@@ -0,0 +1,129 @@
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import find_udacity_test_accounts, load_cleaned_tables
+from l1_analysis.engagement_store import build_engagement_store, open_engagement_store
+from l1_analysis.first_week import find_paid_students
+from l1_analysis.sampling import AccountSample
+from l1_analysis.windows import DayOffsetIndex
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+class EngagementStoreTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        self.udacity_test_accounts = find_udacity_test_accounts(self.tables['enrollments'])
+
+    # Builds a store of the fixture engagement, with small partitions so
+    # there are several.
+    def build(self, **options):
+        return build_engagement_store(os.path.join(DATA_DIR, 'daily_engagement.csv'),
+                                      os.path.join(self.temp_dir, 'store'),
+                                      accounts_per_partition=8, **options)
+
+    # Checks that the store holds every row of engagement (a Table with an
+    # account_key column), account by account, in (date, file) order.
+    def assert_holds(self, store, engagement):
+        account_keys = engagement.decode('account_key')
+        order = np.lexsort((np.arange(len(engagement)), engagement['utc_date'].astype(np.int64),
+                            account_keys))
+        stored = dict(store.iteritems())
+        self.assertEqual(sorted(stored), sorted(set(account_keys.tolist())))
+        for key, rows in stored.items():
+            expected = order[account_keys[order] == key]
+            for name in store.names:
+                np.testing.assert_array_equal(
+                    rows.decode(name), engagement.decode(name, engagement[name][expected]),
+                    err_msg='%s %s' % (key, name))
+            self.assertTrue(key in store)
+            self.assertEqual(len(store[key]), len(expected))
+        self.assertEqual(len(store), len(engagement))
+
+    def test_every_account(self):
+        store = self.build()
+        self.assertTrue(len(store.partitions) > 1)
+        engagement = load_cleaned_tables(DATA_DIR, self.cache_dir())['daily_engagement']
+        engagement.rename_column('acct', 'account_key')
+        self.assert_holds(store, engagement)
+        self.assertFalse('no such account' in store)
+        self.assertEqual(len(store.rows_for('no such account')), 0)
+
+    def test_excluded_accounts(self):
+        store = self.build(exclude=self.udacity_test_accounts)
+        self.assert_holds(store, self.tables['non_udacity_engagement'])
+        for key in self.udacity_test_accounts:
+            self.assertFalse(key in store)
+
+    def test_sample(self):
+        sample = AccountSample(0.5)
+        store = self.build(exclude=self.udacity_test_accounts, sample=sample)
+        engagement = self.tables['non_udacity_engagement']
+        sampled = engagement.take(sample.keeps(engagement.decode('account_key')))
+        self.assertTrue(0 < len(sampled) < len(engagement))
+        self.assert_holds(store, sampled)
+
+    def test_first_week_windows(self):
+        store = self.build(exclude=self.udacity_test_accounts)
+        engagement = self.tables['non_udacity_engagement']
+        paid_accounts, paid_join_dates = find_paid_students(self.tables['non_udacity_enrollments'])
+        windows = store.windows(engagement.decode('account_key', paid_accounts),
+                                paid_join_dates, 0, 7)
+        first_week = engagement.take(DayOffsetIndex(engagement, paid_accounts,
+                                                    paid_join_dates).window_rows(0, 7))
+        first_week_keys = first_week.decode('account_key')
+        self.assertEqual(sorted(windows.keys()), sorted(set(first_week_keys.tolist())))
+        for key, rows in windows.iteritems():
+            np.testing.assert_array_equal(rows['utc_date'],
+                                          np.sort(first_week['utc_date'][first_week_keys == key]))
+            self.assertTrue(isinstance(rows['utc_date'], np.memmap))
+
+
+# open_engagement_store builds the store once, and again only when the CSV or
+# the excluded accounts change; a sample's store is kept apart.
+class OpenEngagementStoreTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.data_dir = self.copy_data()
+        self.cache = self.cache_dir()
+        self.udacity_test_accounts = find_udacity_test_accounts(
+            load_cleaned_tables(self.data_dir, self.cache)['enrollments'])
+
+    def open(self, **options):
+        return open_engagement_store(self.data_dir, self.cache, **options)
+
+    def test_reused(self):
+        store = self.open(exclude=self.udacity_test_accounts)
+        self.assertEqual(self.open(exclude=self.udacity_test_accounts).info, store.info)
+        self.assertEqual(self.open(exclude=list(self.udacity_test_accounts)).info, store.info)
+
+    def test_rebuilt_for_other_exclusions(self):
+        store = self.open(exclude=self.udacity_test_accounts)
+        everything = self.open()
+        self.assertTrue(len(everything) > len(store))
+        self.assertEqual(len(self.open(exclude=self.udacity_test_accounts)), len(store))
+
+    def test_rebuilt_when_csv_changes(self):
+        store = self.open()
+        filename = os.path.join(self.data_dir, 'daily_engagement.csv')
+        with open(filename, 'rb') as f:
+            lines = f.readlines()
+        with open(filename, 'wb') as f:
+            f.writelines(lines[:-10])
+        self.assertEqual(len(self.open()), len(store) - 10)
+
+    def test_sample_kept_apart(self):
+        sample = AccountSample(0.5)
+        store = self.open()
+        sampled = self.open(sample=sample)
+        self.assertTrue(len(sampled) < len(store))
+        self.assertTrue(sampled.directory.startswith(os.path.join(self.cache, sample.name)))
+        self.assertEqual(self.open().info, store.info)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.columnar import load_enrollments
+from l1_analysis.first_week import find_paid_students, first_week_engagement_rows
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+# The notebook's loop: account key -> most recent paid join date, and every
+# paid enrollment as (account key, join day, cancel day).
+def paid_students_loop(enrollments, trial_days):
+    paid_students = {}
+    paid_intervals = []
+    for enrollment in enrollments:
+        account_key = enrollment['account_key']
+        join_date = enrollment['join_date']
+        cancel_date = enrollment['cancel_date']
+        if not enrollment['is_canceled'] or (cancel_date - join_date).days > trial_days:
+            if account_key not in paid_students or join_date > paid_students[account_key]:
+                paid_students[account_key] = join_date
+            paid_intervals.append((account_key, join_date, cancel_date))
+    return paid_students, paid_intervals
+
+
+class FindPaidStudentsTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        self.enrollments = self.tables['non_udacity_enrollments']
+
+    def test_matches_loop(self):
+        for trial_days in [0, 7, 14, 30]:
+            accounts, join_dates, intervals = find_paid_students(self.enrollments, trial_days,
+                                                                 intervals=True)
+            paid_students, paid_intervals = paid_students_loop(self.enrollments, trial_days)
+            found = zip(self.enrollments.decode('account_key', accounts).tolist(),
+                        join_dates.tolist())
+            expected = [(account_key, join_date.date())
+                        for account_key, join_date in paid_students.items()]
+            self.assertEqual(sorted(found), sorted(expected), trial_days)
+            self.assertEqual(sorted((row['account_key'], row['join_date'], row['cancel_date'])
+                                    for row in intervals), sorted(paid_intervals))
+
+    def test_sorted_by_account(self):
+        accounts, join_dates = find_paid_students(self.enrollments)
+        self.assertEqual(accounts.tolist(), sorted(set(accounts.tolist())))
+
+    def test_unencoded_table(self):
+        enrollments = load_enrollments(os.path.join(DATA_DIR, 'enrollments.csv'))
+        accounts, join_dates = find_paid_students(enrollments)
+        paid_students, paid_intervals = paid_students_loop(enrollments, 7)
+        self.assertEqual(accounts.tolist(), sorted(paid_students))
+
+
+class FirstWeekEngagementTest(TempDirTestCase):
+
+    def test_matches_loop(self):
+        tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        engagement = tables['non_udacity_engagement']
+        paid_accounts, paid_join_dates = find_paid_students(tables['non_udacity_enrollments'])
+        paid_students = dict(zip(paid_accounts.tolist(), paid_join_dates.tolist()))
+        for days in [1, 7, 30]:
+            expected = [row for row, (account, day) in enumerate(zip(
+                engagement['account_key'].tolist(), engagement['utc_date'].tolist()))
+                        if account in paid_students and
+                        0 <= (day - paid_students[account]).days < days]
+            self.assertEqual(first_week_engagement_rows(engagement, paid_accounts,
+                                                        paid_join_dates, days).tolist(), expected)
+        self.assertTrue(len(expected) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
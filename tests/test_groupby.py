@@ -0,0 +1,97 @@
+from collections import defaultdict
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.columnar import Table
+from l1_analysis.encoding import KeyEncoder
+from l1_analysis.groupby import GroupBy, aggregate, engagement_totals
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+# The notebook's way: a dict of key -> list of values, summed in a loop.
+def loop_sums(keys, values):
+    groups = defaultdict(list)
+    for key, value in zip(keys, values):
+        groups[key].append(value)
+    sums = {}
+    for key, group in groups.items():
+        total = 0
+        for value in group:
+            total += value
+        sums[key] = total
+    return sums
+
+
+class GroupByTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.keys = random.randint(0, 20, 500).astype(np.int32)
+        self.minutes = random.exponential(30.0, 500)
+        self.lessons = random.randint(0, 4, 500)
+
+    def test_sorted_and_dense_groups_agree(self):
+        by_sorting = GroupBy(self.keys)
+        by_code = GroupBy(self.keys, num_keys=25)
+        np.testing.assert_array_equal(by_sorting.keys, by_code.keys)
+        np.testing.assert_array_equal(by_sorting.group_of_row, by_code.group_of_row)
+        self.assertEqual(by_code.keys.dtype, self.keys.dtype)
+        self.assertEqual(len(by_code), len(np.unique(self.keys)))
+
+    def test_sums_match_loop(self):
+        group_by = GroupBy(self.keys)
+        keys = group_by.keys.tolist()
+        for values in [self.minutes, self.lessons]:
+            expected = loop_sums(self.keys.tolist(), values.tolist())
+            # the float sums are added in the same order, so they're equal
+            self.assertEqual(dict(zip(keys, group_by.sum(values).tolist())), expected)
+        self.assertEqual(group_by.sum(self.lessons).dtype, np.int64)
+
+    def test_count_count_where_and_mean(self):
+        group_by = GroupBy(self.keys)
+        counts = loop_sums(self.keys.tolist(), [1] * len(self.keys))
+        self.assertEqual(dict(zip(group_by.keys.tolist(), group_by.count().tolist())), counts)
+        visited = loop_sums(self.keys.tolist(), (self.lessons > 0).astype(int).tolist())
+        self.assertEqual(dict(zip(group_by.keys.tolist(),
+                                  group_by.count_where(self.lessons > 0).tolist())), visited)
+        np.testing.assert_allclose(group_by.mean(self.minutes),
+                                   group_by.sum(self.minutes) / group_by.count())
+
+    def test_sum_needs_one_value_per_row(self):
+        self.assertRaises(ValueError, GroupBy(self.keys).sum, self.minutes[1:])
+
+    def test_aggregate_keeps_encoder(self):
+        encoder = KeyEncoder([u'a', u'b', u'c'])
+        table = Table({'account_key': np.array([2, 0, 2], dtype=np.int32),
+                       'minutes': np.array([1.5, 2.0, 3.0])},
+                      ['account_key', 'minutes'], {'account_key': encoder})
+        totals = aggregate(table, 'account_key', [('minutes', 'sum', 'minutes'),
+                                                  ('rows', 'count', None)])
+        self.assertEqual(totals.names, ['account_key', 'minutes', 'rows'])
+        self.assertEqual(totals.decode('account_key').tolist(), [u'a', u'c'])
+        self.assertEqual(totals['minutes'].tolist(), [2.0, 4.5])
+        self.assertEqual(totals['rows'].tolist(), [1, 2])
+        self.assertRaises(ValueError, aggregate, table, 'account_key',
+                          [('minutes', 'median', 'minutes')])
+
+
+class EngagementTotalsTest(TempDirTestCase):
+
+    def test_matches_notebook_loop(self):
+        engagement = load_cleaned_tables(DATA_DIR, self.cache_dir())['non_udacity_engagement']
+        totals = engagement_totals(engagement)
+        accounts = totals.decode('account_key').tolist()
+        keys = engagement.decode('account_key').tolist()
+        for column, values in [
+                ('num_engagements', [1] * len(engagement)),
+                ('total_minutes_visited', engagement['total_minutes_visited'].tolist()),
+                ('lessons_completed', engagement['lessons_completed'].tolist()),
+                ('days_visited', (engagement['num_courses_visited'] > 0).astype(int).tolist())]:
+            self.assertEqual(dict(zip(accounts, totals[column].tolist())),
+                             loop_sums(keys, values), column)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import numpy as np
+
+from l1_analysis.histograms import FINE_BINS, MAX_EXACT_VALUES, Histogram, histograms_of
+
+
+class HistogramTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.lessons = random.poisson(4, 100000)
+        self.minutes = random.exponential(300, MAX_EXACT_VALUES)
+        self.many_minutes = random.exponential(300, 4 * MAX_EXACT_VALUES)
+
+    def assert_counts_match(self, values, bins, range=None, scale=1.0):
+        histogram = Histogram(values)
+        self.assertTrue(histogram.exact)
+        counts, edges = histogram.counts(bins, range, scale)
+        scaled = values * scale
+        expected, expected_edges = np.histogram(
+            scaled, bins, range=range or (scaled.min(), scaled.max()))
+        np.testing.assert_array_equal(counts, expected)
+        np.testing.assert_array_equal(edges, expected_edges)
+
+    def test_integer_data(self):
+        for bins, range in [(10, None), (41, [0, 41]), (41, [0, 15]), (3, [2, 5])]:
+            self.assert_counts_match(self.lessons, bins, range)
+
+    def test_float_data(self):
+        for bins, range, scale in [(60, None, 1.0), (10, None, 1.0), (21, [0, 21], 1 / 60.0),
+                                   (7, [100, 200], 1.0), (10, None, -2.0)]:
+            self.assert_counts_match(self.minutes, bins, range, scale)
+
+    # Past MAX_EXACT_VALUES distinct values, only the values within half a
+    # fine bin of an edge can be counted in the next bin.
+    def test_many_distinct_values(self):
+        histogram = Histogram(self.many_minutes)
+        self.assertFalse(histogram.exact)
+        self.assertTrue(len(histogram.values) <= FINE_BINS)
+        self.assertEqual(histogram.value_counts.sum(), len(self.many_minutes))
+        half_fine_bin = (self.many_minutes.max() - self.many_minutes.min()) / FINE_BINS / 2
+        for bins, range, scale in [(60, None, 1.0), (21, [0, 21], 1 / 60.0), (10, None, -2.0)]:
+            counts, edges = histogram.counts(bins, range, scale)
+            scaled = self.many_minutes * scale
+            expected, expected_edges = np.histogram(
+                scaled, bins, range=range or (scaled.min(), scaled.max()))
+            np.testing.assert_array_equal(edges, expected_edges)
+            near_edge = np.array([np.sum(abs(scaled - edge) <= half_fine_bin * abs(scale))
+                                  for edge in edges])
+            self.assertTrue((abs(counts - expected) <= near_edge[:-1] + near_edge[1:]).all())
+            if range is None:
+                self.assertEqual(counts.sum(), len(self.many_minutes))
+
+    # Values exactly on the bin edges, including the upper edge of the range.
+    def test_values_on_edges(self):
+        values = np.array([0.0, 0.1, 0.2, 0.3, 0.7, 0.9, 1.0, 1.0])
+        for bins in [3, 10, [0, 0.3, 0.5, 1.0]]:
+            self.assert_counts_match(values, bins)
+
+    def test_matches_plt_hist(self):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        for values, bins in [(self.minutes, 60), (self.lessons, 8)]:
+            expected, _, _ = plt.hist(values, bins=bins)
+            plt.close()
+            counts, _ = Histogram(values).counts(bins)
+            np.testing.assert_array_equal(counts, expected)
+
+    def test_single_value_and_empty(self):
+        self.assert_counts_match(np.array([3.5, 3.5]), 10)
+        counts, edges = Histogram([]).counts(4)
+        self.assertEqual(counts.tolist(), [0, 0, 0, 0])
+
+    def test_histograms_of(self):
+        histograms = histograms_of({'lessons': self.lessons, 'minutes': self.minutes},
+                                   ['lessons', 'minutes'])
+        self.assertEqual(sorted(histograms), ['lessons', 'minutes'])
+        self.assertEqual(len(histograms['minutes']), len(self.minutes))
+
+
+if __name__ == '__main__':
+    unittest.main()
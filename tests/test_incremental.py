@@ -0,0 +1,202 @@
+import os
+import unittest
+
+import unicodecsv
+
+from l1_analysis.incremental import FirstWeekState, read_students, update_first_week_state
+from l1_analysis.sampling import AccountSample
+from l1_analysis.streaming import stream_first_week_engagement
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+FIRST_REPLAYED_DAY = '2015-07-14'
+# A paid student with a single enrollment, who joined on 2015-04-02.
+STUDENT = '588'
+
+
+# Takes a CSV file, and returns its header line and a list of (row, line)
+# pairs, with each line's original bytes.
+def read_csv_lines(filename):
+    with open(filename, 'rb') as f:
+        lines = f.readlines()
+    rows = list(unicodecsv.reader(lines))
+    return lines[0], zip(rows[1:], lines[1:])
+
+def write_lines(filename, lines):
+    with open(filename, 'wb') as f:
+        f.writelines(lines)
+
+def append_lines(filename, lines):
+    with open(filename, 'ab') as f:
+        f.writelines(lines)
+
+
+# The first week aggregates worked out from scratch, in one streaming pass.
+def rebuilt(data_dir, sample=None):
+    udacity_test_accounts, paid_students = read_students(data_dir, sample=sample)
+    return stream_first_week_engagement(
+        udacity_test_accounts, paid_students, os.path.join(data_dir, 'daily_engagement.csv'),
+        sample=sample)
+
+
+class FirstWeekStateTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.data_dir = os.path.join(self.temp_dir, 'data')
+        os.makedirs(self.data_dir)
+        self.engagement_file = os.path.join(self.data_dir, 'daily_engagement.csv')
+        self.enrollments_file = os.path.join(self.data_dir, 'enrollments.csv')
+        self.engagement_header, engagement = read_csv_lines(
+            os.path.join(DATA_DIR, 'daily_engagement.csv'))
+        # in date order, so that the rows of a day can be appended
+        self.engagement = sorted(engagement, key=lambda pair: pair[0][1])
+        self.enrollments_header, self.enrollments = read_csv_lines(
+            os.path.join(DATA_DIR, 'enrollments.csv'))
+        self.state_file = os.path.join(self.temp_dir, 'state.pickle')
+
+    def write_engagement(self, keep):
+        write_lines(self.engagement_file, [self.engagement_header] +
+                    [line for row, line in self.engagement if keep(row)])
+
+    def write_enrollments(self, keep=lambda row: True, extra=()):
+        write_lines(self.enrollments_file, [self.enrollments_header] +
+                    [line for row, line in self.enrollments if keep(row)] + list(extra))
+
+    def update(self, sample=None):
+        state, result = update_first_week_state(self.data_dir, self.state_file, sample=sample)
+        self.assertEqual(state.aggregates, rebuilt(self.data_dir, sample))
+        return state, result
+
+    # Starts from the rows before FIRST_REPLAYED_DAY (and the enrollments
+    # that had joined by then), then appends a day of engagement rows and
+    # enrollments at a time.
+    def test_replay_days(self):
+        days = sorted(set(row[1] for row, line in self.engagement if row[1] >= FIRST_REPLAYED_DAY))
+        self.write_engagement(lambda row: row[1] < FIRST_REPLAYED_DAY)
+        self.write_enrollments(lambda row: row[2] < FIRST_REPLAYED_DAY)
+        state, result = self.update()
+        self.assertTrue(result['rebuilt'])
+        num_changed = 0
+        for day in days:
+            append_lines(self.engagement_file,
+                         [line for row, line in self.engagement if row[1] == day])
+            self.write_enrollments(lambda row: row[2] <= day)
+            state, result = self.update()
+            self.assertFalse(result['rebuilt'])
+            # the new students' rows are all new
+            self.assertEqual(result['rescanned_rows'], 0)
+            num_changed += result['changed_accounts']
+        self.assertEqual(num_changed, 4)
+
+    # A student who wasn't in the files before: only the new rows are read.
+    def test_new_student_reads_only_new_rows(self):
+        self.write_engagement(lambda row: row[0] != STUDENT)
+        self.write_enrollments(lambda row: row[0] != STUDENT)
+        self.update()
+        append_lines(self.engagement_file,
+                     [line for row, line in self.engagement if row[0] == STUDENT])
+        self.write_enrollments()
+        state, result = self.update()
+        self.assertEqual(result['changed_accounts'], 1)
+        self.assertEqual(result['rescanned_rows'], 0)
+        self.assertTrue(STUDENT in state.aggregates.students)
+
+    # A student who cancels during the free trial is no longer paid.
+    def test_cancellation(self):
+        self.write_engagement(lambda row: True)
+        self.write_enrollments()
+        state, result = self.update()
+        self.assertTrue(STUDENT in state.aggregates.students)
+        self.write_enrollments(lambda row: row[0] != STUDENT,
+                               ['%s,canceled,2015-04-02,2015-04-05,3,False,True\n' % STUDENT])
+        state, result = self.update()
+        self.assertEqual(result['changed_accounts'], 1)
+        self.assertEqual(result['rescanned_rows'], 0)
+        self.assertFalse(STUDENT in state.aggregates.students)
+
+    # A student who joins again: their first week moves, and only their own
+    # earlier rows are read again.
+    def test_rejoin(self):
+        self.write_engagement(lambda row: True)
+        self.write_enrollments()
+        state, result = self.update()
+        before = state.aggregates.total_minutes_by_account[STUDENT]
+        self.write_enrollments(extra=['%s,current,2015-05-01,,,False,False\n' % STUDENT])
+        state, result = self.update()
+        self.assertEqual(result['changed_accounts'], 1)
+        self.assertEqual(result['rescanned_rows'],
+                         len([row for row, line in self.engagement if row[0] == STUDENT]))
+        self.assertNotEqual(state.aggregates.total_minutes_by_account[STUDENT], before)
+
+    # A cancellation and a rejoin in the same update as a day of new rows.
+    def test_changes_with_new_rows(self):
+        self.write_engagement(lambda row: row[1] < '2015-05-03')
+        self.write_enrollments()
+        self.update()
+        append_lines(self.engagement_file,
+                     [line for row, line in self.engagement if row[1] == '2015-05-03'])
+        self.write_enrollments(lambda row: row[0] != '543', [
+            '543,canceled,2015-04-01,2015-04-03,2,False,True\n',
+            '%s,current,2015-05-01,,,False,False\n' % STUDENT,
+        ])
+        state, result = self.update()
+        self.assertFalse(result['rebuilt'])
+        self.assertEqual(result['changed_accounts'], 2)
+        self.assertTrue(result['rescanned_rows'] > 0)
+
+    # Days replayed for a sample of the accounts: only their rows are indexed.
+    def test_sample(self):
+        sample = AccountSample(0.5)
+        days = sorted(set(row[1] for row, line in self.engagement if row[1] >= '2015-05-01'))
+        self.write_engagement(lambda row: row[1] < days[0])
+        self.write_enrollments()
+        state, result = self.update(sample)
+        for day in days[:5]:
+            append_lines(self.engagement_file,
+                         [line for row, line in self.engagement if row[1] == day])
+            state, result = self.update(sample)
+            self.assertFalse(result['rebuilt'])
+        students = set(state.aggregates.students)
+        self.assertTrue(students)
+        self.assertTrue(all(sample.keeps_key(key) for key in students))
+        sampled_rows = [row for row, line in self.engagement
+                        if row[1] <= days[4] and sample.keeps_key(row[0])]
+        self.assertEqual(len(state.line_index), len(sampled_rows))
+        # the whole data is another state
+        state, result = self.update()
+        self.assertTrue(result['rebuilt'])
+        self.assertTrue(set(state.aggregates.students) > students)
+
+    # The states of the whole data and of a sample are saved apart.
+    def test_sample_state_file(self):
+        self.write_engagement(lambda row: True)
+        self.write_enrollments()
+        sample = AccountSample(0.5)
+        update_first_week_state(self.data_dir, sample=sample)
+        update_first_week_state(self.data_dir)
+        state, result = update_first_week_state(self.data_dir, sample=sample)
+        self.assertFalse(result['rebuilt'])
+        self.assertTrue(os.path.exists(os.path.join(self.data_dir, '.l1_cache', sample.name,
+                                                    'first_week_state.pickle')))
+
+    def test_rewritten_file_is_rebuilt(self):
+        self.write_engagement(lambda row: True)
+        self.write_enrollments()
+        self.update()
+        self.write_engagement(lambda row: row[0] != STUDENT)
+        state, result = self.update()
+        self.assertTrue(result['rebuilt'])
+
+    def test_state_is_saved(self):
+        self.write_engagement(lambda row: True)
+        self.write_enrollments()
+        state, result = self.update()
+        loaded = FirstWeekState.load(self.state_file)
+        self.assertEqual(loaded.aggregates, state.aggregates)
+        state, result = self.update()
+        self.assertEqual(result, {'rebuilt': False, 'new_bytes': 0, 'changed_accounts': 0,
+                                  'rescanned_rows': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import unittest
+
+from l1_analysis.columnar import ENGAGEMENT_TYPES, load_table
+from l1_analysis.encoding import make_encoders
+from l1_analysis.ingest import (
+    FILES,
+    load_all_parallel,
+    load_tables_parallel,
+    split_file,
+)
+from tests.helpers import DATA_DIR, TempDirTestCase, table_differences
+
+
+class SplitFileTest(unittest.TestCase):
+
+    def test_ranges_start_at_lines(self):
+        filename = os.path.join(DATA_DIR, 'daily_engagement.csv')
+        with open(filename, 'rb') as f:
+            data = f.read()
+        header, ranges = split_file(filename, 4096)
+        self.assertEqual(header[0], 'acct')
+        self.assertTrue(len(ranges) > 10)
+        self.assertEqual(ranges[0][0], data.index('\n') + 1)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[start - 1], '\n')
+
+
+# The parallel loads against the serial loader, with the whole of each file
+# in one range and in ranges small enough to give every file several.
+class LoadParallelTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.encoders = make_encoders()
+        self.serial = dict((name, load_table(os.path.join(DATA_DIR, filename), types,
+                                             encoders=self.encoders))
+                           for name, filename, types in FILES)
+
+    def assert_same_as_serial(self, tables, encoders):
+        for name, filename, types in FILES:
+            self.assertEqual(table_differences(self.serial[name], tables[name]), [], name)
+        for name in self.encoders:
+            self.assertEqual(encoders[name].keys, self.encoders[name].keys, name)
+
+    def test_matches_serial_load(self):
+        for processes in [1, 2]:
+            for chunk_bytes in [1 << 20, 4096, 512]:
+                encoders = make_encoders()
+                tables = load_all_parallel(DATA_DIR, processes, encoders, chunk_bytes=chunk_bytes)
+                self.assert_same_as_serial(tables, encoders)
+
+    def test_selected_names(self):
+        tables = load_all_parallel(DATA_DIR, 2, names=['project_submissions'], chunk_bytes=512)
+        self.assertEqual(sorted(tables), ['project_submissions'])
+
+    def test_file_without_rows(self):
+        filename = os.path.join(self.temp_dir, 'daily_engagement.csv')
+        with open(os.path.join(DATA_DIR, 'daily_engagement.csv'), 'rb') as f:
+            header = f.readline()
+        with open(filename, 'wb') as f:
+            f.write(header)
+        table, = load_tables_parallel([(filename, ENGAGEMENT_TYPES)], 2, make_encoders())
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table_differences(table, load_table(filename, ENGAGEMENT_TYPES,
+                                                             encoders=make_encoders())), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
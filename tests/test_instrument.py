@@ -0,0 +1,117 @@
+from StringIO import StringIO
+import json
+import os
+import sys
+import unittest
+
+from l1_analysis import instrument
+from l1_analysis.instrument import count_rows, instrumented, stage
+from tests.helpers import TempDirTestCase
+
+
+@instrumented()
+def double_all(values):
+    with stage('double'):
+        return [value * 2 for value in values]
+
+@instrumented('load')
+def load(rows):
+    return range(rows)
+
+
+# Calls instrument.finish() without printing the report, and returns the
+# Recorder.
+def finish_quietly():
+    stderr = sys.stderr
+    sys.stderr = StringIO()
+    try:
+        return instrument.finish()
+    finally:
+        sys.stderr = stderr
+
+
+class InstrumentTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        # in case L1_PROFILE switched it on for the whole run
+        finish_quietly()
+
+    def tearDown(self):
+        finish_quietly()
+        TempDirTestCase.tearDown(self)
+
+    def test_disabled_is_a_no_op(self):
+        self.assertFalse(instrument.enabled())
+        self.assertTrue(stage('a') is stage('b', rows_in=3))
+        with stage('a') as timing:
+            timing.rows_out = 1
+        self.assertEqual(double_all([1, 2]), [2, 4])
+        self.assertEqual(double_all.__name__, 'double_all')
+        self.assertTrue(finish_quietly() is None)
+
+    def test_calls_and_rows(self):
+        instrument.enable()
+        for values in [[1, 2, 3], [4]]:
+            double_all(values)
+        with stage('block', rows_in=10) as timing:
+            timing.rows_out = 7
+        stages = finish_quietly().stages
+        self.assertEqual(list(stages), [('double_all',), ('double_all', 'double'), ('block',)])
+        outer = stages[('double_all',)]
+        self.assertEqual((outer.calls, outer.rows_in, outer.rows_out), (2, 4, 4))
+        self.assertEqual(stages[('double_all', 'double')].calls, 2)
+        block = stages[('block',)]
+        self.assertEqual((block.calls, block.rows_in, block.rows_out), (1, 10, 7))
+        self.assertTrue(outer.wall_seconds >= stages[('double_all', 'double')].wall_seconds)
+
+    def test_nested_stages_are_kept_under_their_parent(self):
+        instrument.enable()
+        with stage('enrollments'):
+            load(5)
+        with stage('daily_engagement'):
+            load(20)
+            load(30)
+        load(1)
+        stages = finish_quietly().stages
+        self.assertEqual(list(stages), [
+            ('enrollments',), ('enrollments', 'load'),
+            ('daily_engagement',), ('daily_engagement', 'load'),
+            ('load',)])
+        self.assertEqual(stages[('enrollments', 'load')].rows_out, 5)
+        self.assertEqual(stages[('daily_engagement', 'load')].rows_out, 50)
+        self.assertEqual(stages[('daily_engagement', 'load')].calls, 2)
+        self.assertEqual([stats.depth for stats in stages.values()], [0, 1, 0, 1, 0])
+
+    def test_stage_closed_by_an_exception(self):
+        instrument.enable()
+        try:
+            with stage('outer'):
+                raise KeyError('x')
+        except KeyError:
+            pass
+        with stage('after'):
+            pass
+        self.assertEqual(list(finish_quietly().stages), [('outer',), ('after',)])
+
+    def test_report_file(self):
+        report_file = os.path.join(self.temp_dir, 'report.json')
+        instrument.enable(report_file)
+        with stage('outer'):
+            with stage('inner', rows_in=2):
+                pass
+        finish_quietly()
+        with open(report_file) as f:
+            report = json.load(f)
+        self.assertEqual([(entry['path'], entry['depth'], entry['rows_in'])
+                          for entry in report['stages']],
+                         [(['outer'], 0, None), (['outer', 'inner'], 1, 2)])
+
+    def test_count_rows(self):
+        self.assertEqual(count_rows([1, 2]), 2)
+        self.assertEqual(count_rows('ab'), None)
+        self.assertEqual(count_rows(3), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
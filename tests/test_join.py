@@ -0,0 +1,141 @@
+import unittest
+
+import numpy as np
+
+from l1_analysis.join import (
+    DenseIndex,
+    SortedIndex,
+    anti_join,
+    asof_join,
+    encode_keys,
+    inner_join,
+    left_join,
+    max_per_key,
+    semi_join,
+)
+
+
+def loop_inner_join(left_keys, right_keys):
+    return [(i, j) for i, left in enumerate(left_keys)
+            for j, right in enumerate(right_keys) if left == right]
+
+def loop_asof_join(left_keys, left_days, right_keys, right_days, direction):
+    result = []
+    for key, day in zip(left_keys, left_days):
+        best = -1
+        for j, (right_key, right_day) in enumerate(zip(right_keys, right_days)):
+            if right_key != key:
+                continue
+            if direction == 'backward' and right_day <= day and (
+                    best == -1 or right_day >= right_days[best]):
+                best = j
+            if direction == 'forward' and right_day >= day and (
+                    best == -1 or right_day < right_days[best]):
+                best = j
+        result.append(best)
+    return result
+
+
+class JoinTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.left = random.randint(0, 30, 200)
+        self.right = random.randint(0, 30, 50)
+        self.unique_right = random.permutation(40)[:25]
+
+    def test_inner_join_matches_loop(self):
+        for right in [self.right, SortedIndex(self.right)]:
+            left_rows, right_rows = inner_join(self.left, right)
+            self.assertEqual(list(zip(left_rows.tolist(), right_rows.tolist())),
+                             loop_inner_join(self.left, self.right))
+
+    def test_dense_index_matches_sorted_index(self):
+        dense = inner_join(self.left, DenseIndex(self.unique_right))
+        sorted_ = inner_join(self.left, SortedIndex(self.unique_right))
+        np.testing.assert_array_equal(dense[0], sorted_[0])
+        np.testing.assert_array_equal(dense[1], sorted_[1])
+
+    def test_dense_index_rejects_duplicates(self):
+        self.assertRaises(ValueError, DenseIndex, [1, 2, 1])
+
+    def test_left_join_keeps_unmatched_rows(self):
+        for right in [self.unique_right, DenseIndex(self.unique_right)]:
+            left_rows, right_rows = left_join(self.left, right)
+            np.testing.assert_array_equal(left_rows, np.arange(len(self.left)))
+            matched = right_rows >= 0
+            np.testing.assert_array_equal(matched, np.in1d(self.left, self.unique_right))
+            np.testing.assert_array_equal(self.unique_right[right_rows[matched]],
+                                          self.left[matched])
+
+    def test_semi_and_anti_join(self):
+        expected = np.array([key in set(self.right.tolist()) for key in self.left])
+        for right in [self.right, SortedIndex(self.right)]:
+            np.testing.assert_array_equal(semi_join(self.left, right), expected)
+            np.testing.assert_array_equal(anti_join(self.left, right), ~expected)
+
+    def test_encode_keys_shares_codes(self):
+        vocabulary, left, right = encode_keys(np.array(['b', 'a', 'c']), np.array(['c', 'b']))
+        self.assertEqual(vocabulary.tolist(), ['a', 'b', 'c'])
+        self.assertEqual(left.tolist(), [1, 0, 2])
+        self.assertEqual(right.tolist(), [2, 1])
+
+    def test_max_per_key(self):
+        values = np.arange(len(self.left))[::-1] % 17
+        keys, maxima = max_per_key(self.left, values)
+        expected = {}
+        for key, value in zip(self.left.tolist(), values.tolist()):
+            expected[key] = max(value, expected.get(key, value))
+        self.assertEqual(dict(zip(keys.tolist(), maxima.tolist())), expected)
+
+    def test_max_per_key_of_dates(self):
+        dates = np.array(['2015-01-02', '2015-03-01', '2014-12-31'], dtype='datetime64[D]')
+        keys, maxima = max_per_key(np.array([5, 5, 2]), dates)
+        self.assertEqual(keys.tolist(), [2, 5])
+        self.assertEqual(maxima.astype(str).tolist(), ['2014-12-31', '2015-03-01'])
+
+
+
+class AsofJoinTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(1)
+        self.left_keys = random.randint(0, 10, 300)
+        self.left_days = random.randint(16000, 16100, 300)
+        self.right_keys = random.randint(0, 12, 80)
+        self.right_days = random.randint(16000, 16100, 80)
+
+    def test_matches_loop(self):
+        for direction in ['backward', 'forward']:
+            rows = asof_join(self.left_keys, self.left_days, self.right_keys, self.right_days,
+                             direction)
+            self.assertEqual(rows.tolist(), loop_asof_join(
+                self.left_keys.tolist(), self.left_days.tolist(), self.right_keys.tolist(),
+                self.right_days.tolist(), direction), direction)
+
+    def test_dates(self):
+        left_dates = np.array(['2015-01-05', '2015-01-05', '2015-01-01'], dtype='datetime64[D]')
+        right_dates = np.array(['2015-01-02', '2015-01-04', '2015-01-03'], dtype='datetime64[D]')
+        rows = asof_join([1, 2, 1], left_dates, [1, 1, 2], right_dates)
+        self.assertEqual(rows.tolist(), [1, 2, -1])
+        rows = asof_join([1, 2, 1], left_dates, [1, 1, 2], right_dates, 'forward')
+        self.assertEqual(rows.tolist(), [-1, -1, 0])
+
+    def test_nat_dates_never_match(self):
+        left_dates = np.array(['2015-01-05', 'NaT', '2015-01-05'], dtype='datetime64[D]')
+        right_dates = np.array(['NaT', '2015-01-04', '2015-01-06'], dtype='datetime64[D]')
+        self.assertEqual(asof_join([1, 1, 2], left_dates, [1, 1, 2], right_dates).tolist(),
+                         [1, -1, -1])
+        self.assertEqual(asof_join([1, 1, 2], left_dates, [1, 1, 2], right_dates,
+                                   'forward').tolist(), [-1, -1, 2])
+        nat = np.array(['NaT', 'NaT'], dtype='datetime64[D]')
+        self.assertEqual(asof_join([1, 2], nat, [1, 2], nat).tolist(), [-1, -1])
+
+    def test_empty_and_bad_direction(self):
+        self.assertEqual(asof_join([1, 2], [5, 6], [], []).tolist(), [-1, -1])
+        self.assertEqual(asof_join([], [], [1], [5]).tolist(), [])
+        self.assertRaises(ValueError, asof_join, [1], [5], [1], [5], 'nearest')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import sys
+import unittest
+import weakref
+
+import numpy as np
+
+from l1_analysis.analysis import Analysis
+from l1_analysis.columnar import Table
+from l1_analysis.encoding import KeyEncoder
+from l1_analysis.memo import DerivedCache, dataset_token, freeze
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        return value
+
+
+class DatasetTokenTest(unittest.TestCase):
+
+    def test_same_contents_same_token(self):
+        self.assertEqual(dataset_token({'a': [1, 2], 'b': np.arange(3)}),
+                         dataset_token({'b': np.arange(3), 'a': [1, 2]}))
+        self.assertNotEqual(dataset_token([1, 2]), dataset_token((1, 2)))
+        self.assertNotEqual(dataset_token(np.arange(3)), dataset_token(np.arange(3.0)))
+
+    def test_fixed_arrays_are_known_by_identity(self):
+        array = freeze(np.arange(5))
+        fixed = []
+        token = dataset_token(Table({'x': array}), fixed)
+        self.assertEqual(len(fixed), 1)
+        self.assertTrue(fixed[0] is array)
+        self.assertNotEqual(token, dataset_token(Table({'x': freeze(np.arange(5))})))
+
+    def test_read_only_view_of_writable_array_is_read(self):
+        base = np.arange(5)
+        view = base[1:]
+        view.setflags(write=False)
+        fixed = []
+        token = dataset_token(view, fixed)
+        self.assertEqual(fixed, [])
+        base[2] = 10
+        self.assertNotEqual(dataset_token(view), token)
+
+    def test_encoder_growth_keeps_token(self):
+        encoder = KeyEncoder([u'a'])
+        table = Table({'account_key': freeze(np.zeros(2, dtype=np.int32))},
+                      encoders={'account_key': encoder})
+        token = dataset_token(table)
+        encoder.encode([u'b'])
+        self.assertEqual(dataset_token(table), token)
+
+
+class DerivedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = DerivedCache()
+        self.compute = Counter()
+
+    def get(self, name, dataset):
+        return self.cache.get(name, [dataset], lambda: self.compute(len(dataset)))
+
+    def test_hit(self):
+        table = Table({'x': np.arange(4)})
+        self.get('length', table)
+        self.get('length', table)
+        self.get('length', Table({'x': np.arange(4)}))
+        self.assertEqual(self.compute.calls, 1)
+        self.assertEqual(self.cache.hits, 2)
+        self.get('other', table)
+        self.assertEqual(self.compute.calls, 2)
+
+    def test_dict_changed_in_place(self):
+        engagement_by_account = {'1': [1, 2], '2': [3]}
+        self.assertEqual(self.get('num_accounts', engagement_by_account), 2)
+        engagement_by_account['3'] = [4]
+        self.assertEqual(self.get('num_accounts', engagement_by_account), 3)
+        engagement_by_account['3'].append(5)
+        self.get('num_accounts', engagement_by_account)
+        self.assertEqual(self.compute.calls, 3)
+
+    def test_list_changed_in_place(self):
+        rows = [1, 2, 3]
+        self.get('rows', rows)
+        rows[0] = 10
+        self.get('rows', rows)
+        self.assertEqual(self.compute.calls, 2)
+
+    def test_table_changed_in_place(self):
+        table = Table({'x': np.arange(4)})
+        self.get('sum', table)
+        table['x'][0] = 10
+        self.get('sum', table)
+        table.rename_column('x', 'y')
+        self.get('sum', table)
+        self.assertEqual(self.compute.calls, 3)
+
+    def test_fixed_array_replaced_by_an_equal_one(self):
+        table = Table({'x': freeze(np.arange(4))})
+        self.get('sum', table)
+        self.get('sum', table)
+        self.assertEqual(self.compute.calls, 1)
+        table.columns['x'] = freeze(np.arange(4))
+        self.get('sum', table)
+        self.assertEqual(self.compute.calls, 2)
+
+    def test_freeze(self):
+        table = freeze(Table({'x': np.arange(4)}))
+        self.assertRaises(ValueError, table['x'].__setitem__, 0, 1)
+        masked = freeze(np.ma.masked_array([1, 2], mask=[False, True]))
+        self.assertRaises(ValueError, masked.mask.__setitem__, 0, True)
+
+    def test_freeze_leaves_inputs_alone(self):
+        column = np.arange(4)
+        table = Table({'x': column})
+        computed = freeze((table, column * 2), [table])
+        column[0] = 10
+        self.assertRaises(ValueError, computed[1].__setitem__, 0, 1)
+
+    def test_holds_no_references_to_inputs(self):
+        engagement_by_account = {'1': [1, 2]}
+        references = sys.getrefcount(engagement_by_account)
+        self.get('num_accounts', engagement_by_account)
+        self.assertEqual(sys.getrefcount(engagement_by_account), references)
+        table = Table({'x': freeze(np.arange(4))})
+        column = weakref.ref(table['x'])
+        self.get('sum', table)
+        del table
+        self.assertTrue(column() is None)
+
+    def test_lru_eviction(self):
+        cache = DerivedCache(max_bytes=3 * 8000 + 100)
+        for name in ['a', 'b', 'c']:
+            cache.get(name, [], lambda: np.zeros(1000))
+        cache.get('a', [], lambda: np.zeros(1000))
+        cache.get('d', [], lambda: np.zeros(1000))
+        self.assertEqual(sorted(key[0] for key in cache.keys()), ['a', 'c', 'd'])
+        self.assertTrue(cache.total_bytes <= cache.max_bytes)
+
+    def test_clear(self):
+        self.get('a', [1])
+        self.get('b', [1])
+        self.cache.clear('a')
+        self.assertEqual([key[0] for key in self.cache.keys()], ['b'])
+        self.assertEqual(self.cache.total_bytes, sum(
+            entry[1] for entry in self.cache._entries.values()))
+
+
+
+class AnalysisSetTest(TempDirTestCase):
+
+    def test_set_table_changed_in_place_after_a_computation(self):
+        analysis = Analysis(DATA_DIR, self.cache_dir(), plot_dir=self.temp_dir)
+        engagement = analysis['non_udacity_engagement'].take(slice(None))
+        engagement.columns = dict((name, np.array(column))
+                                  for name, column in engagement.columns.items())
+        analysis.set('non_udacity_engagement', engagement)
+        windows = analysis['engagement_windows']
+        self.assertTrue(windows.engagement is engagement)
+        num_engagements = analysis['first_week_totals']['num_engagements'].sum()
+
+        # move a first week row a year later: it's not in the first week any more
+        row = analysis['engagement_windows'].window_rows(0, 7)[0]
+        engagement['utc_date'][row] += np.timedelta64(365, 'D')
+        self.assertEqual(analysis['first_week_totals']['num_engagements'].sum(),
+                         num_engagements - 1)
+        self.assertFalse(analysis['engagement_windows'] is windows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.cohorts import Cohort
+from l1_analysis.encoding import KeyEncoder
+from l1_analysis.first_week import find_paid_students, first_week_engagement_rows
+from l1_analysis.groupby import engagement_totals
+from l1_analysis.parallel import (
+    FIRST_WEEK_METRICS,
+    account_shards,
+    parallel_first_week_stats,
+    parallel_first_week_totals,
+    parallel_passing_totals,
+    partition_rows,
+)
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+class PartitionRowsTest(unittest.TestCase):
+
+    def test_each_shard_gets_its_rows_in_order(self):
+        shards = np.random.RandomState(0).randint(0, 4, 1000)
+        rows, bounds = partition_rows(shards, 4)
+        self.assertEqual(bounds.tolist()[0], 0)
+        self.assertEqual(bounds.tolist()[-1], len(shards))
+        self.assertEqual(sorted(rows.tolist()), range(len(shards)))
+        for shard in range(4):
+            shard_rows = rows[bounds[shard]:bounds[shard + 1]]
+            np.testing.assert_array_equal(shard_rows, np.flatnonzero(shards == shard))
+
+    def test_empty_shards(self):
+        rows, bounds = partition_rows(np.array([3, 3, 3]), 4)
+        self.assertEqual(bounds.tolist(), [0, 0, 0, 0, 3])
+        self.assertEqual(rows.tolist(), [0, 1, 2])
+
+    def test_shards_depend_on_the_keys_only(self):
+        keys = [unicode(key) for key in range(1000)]
+        shards = account_shards(KeyEncoder(keys), 8)
+        reversed_shards = account_shards(KeyEncoder(keys[::-1]), 8)
+        np.testing.assert_array_equal(shards, reversed_shards[::-1])
+        self.assertEqual(sorted(set(shards.tolist())), range(8))
+        # hashed, not code modulo 8
+        self.assertFalse((shards == np.arange(1000) % 8).all())
+
+
+class ParallelFirstWeekTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        self.engagement = tables['non_udacity_engagement']
+        self.paid_accounts, self.paid_join_dates = find_paid_students(
+            tables['non_udacity_enrollments'])
+        self.serial = engagement_totals(self.engagement.take(first_week_engagement_rows(
+            self.engagement, self.paid_accounts, self.paid_join_dates)))
+
+    def test_totals_match_serial(self):
+        for num_shards in [1, 3, 8]:
+            parallel = parallel_first_week_totals(self.engagement, self.paid_accounts,
+                                                  self.paid_join_dates, processes=2,
+                                                  num_shards=num_shards)
+            self.assertEqual(parallel.names, self.serial.names)
+            for name in self.serial.names:
+                np.testing.assert_array_equal(parallel[name], self.serial[name],
+                                              err_msg='%s, %d shards' % (name, num_shards))
+
+    def test_passing_split_matches_serial(self):
+        accounts = self.serial['account_key']
+        passing = Cohort.from_codes(accounts[::3], self.engagement.encoders['account_key'])
+        is_passing = passing.row_mask(self.serial)
+        for num_shards in [1, 4]:
+            halves = parallel_passing_totals(self.engagement, self.paid_accounts,
+                                             self.paid_join_dates, passing.codes(), processes=2,
+                                             num_shards=num_shards)
+            for half, expected in zip(halves, [self.serial.take(is_passing),
+                                               self.serial.take(~is_passing)]):
+                self.assertEqual(half.names, expected.names)
+                for name in expected.names:
+                    np.testing.assert_array_equal(half[name], expected[name],
+                                                  err_msg='%s, %d shards' % (name, num_shards))
+
+    def test_merged_stats_match_serial(self):
+        stats = parallel_first_week_stats(self.engagement, self.paid_accounts,
+                                          self.paid_join_dates, processes=2, num_shards=3)
+        for name in FIRST_WEEK_METRICS:
+            values = self.serial[name]
+            merged = stats[name]
+            self.assertEqual(merged.count, len(values))
+            self.assertEqual(merged.min, np.min(values))
+            self.assertEqual(merged.max, np.max(values))
+            np.testing.assert_allclose([merged.mean, merged.std], [np.mean(values), np.std(values)])
+
+
+if __name__ == '__main__':
+    unittest.main()
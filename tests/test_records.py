@@ -0,0 +1,93 @@
+import os
+import unittest
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.columnar import load_daily_engagement
+from l1_analysis.records import (
+    EngagementRecord,
+    EnrollmentRecord,
+    SubmissionRecord,
+    load_engagement_records,
+    load_enrollment_records,
+    load_submission_records,
+    records_from_table,
+)
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engagement = load_engagement_records(os.path.join(DATA_DIR, 'daily_engagement.csv'))
+
+    # The notebook's loop renaming 'acct' to 'account_key', as written for
+    # the dict rows.
+    def test_rename_loop_runs(self):
+        expected = [record.to_dict() for record in self.engagement]
+        for row in self.engagement:
+            if 'acct' in row:
+                val = row['acct']
+                row['account_key'] = val
+                del row['acct']
+        self.assertEqual([record.to_dict() for record in self.engagement], expected)
+
+    def test_rename_without_check(self):
+        row = self.engagement[0]
+        key = row['acct']
+        row['account_key'] = row['acct']
+        del row['acct']
+        self.assertEqual(row['account_key'], key)
+        self.assertEqual(row['acct'], key)
+
+    def test_fields_are_fixed(self):
+        row = self.engagement[0]
+        self.assertTrue('account_key' in row)
+        self.assertFalse('acct' in row)
+        self.assertFalse('missing' in row)
+        self.assertEqual(row.keys(), list(EngagementRecord.__slots__))
+        self.assertRaises(KeyError, row.__setitem__, 'missing', 1)
+        self.assertRaises(KeyError, row.__delitem__, 'account_key')
+        self.assertRaises(KeyError, row.__delitem__, 'missing')
+        self.assertFalse(hasattr(row, '__dict__'))
+
+    def test_types(self):
+        row = self.engagement[0]
+        self.assertEqual(type(row['lessons_completed']), int)
+        self.assertEqual(type(row['total_minutes_visited']), float)
+        self.assertEqual(row['utc_date'].year, 2014)
+
+    def test_repr_has_unicode_keys(self):
+        self.assertTrue("u'account_key': u'448'" in repr(self.engagement[0]))
+
+
+# Records hold the same values as the Table rows, whether read from the CSV
+# or made from a cached Table.
+class RecordsFromTableTest(TempDirTestCase):
+
+    def test_same_values_as_table_rows(self):
+        tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        for name, record_class, load in [
+                ('enrollments', EnrollmentRecord, load_enrollment_records),
+                ('daily_engagement', EngagementRecord, load_engagement_records),
+                ('project_submissions', SubmissionRecord, load_submission_records)]:
+            table = tables[name]
+            from_table = records_from_table(table, record_class)
+            from_csv = load(os.path.join(DATA_DIR, name + '.csv'))
+            self.assertEqual(from_table, from_csv, name)
+            for record, row in zip(from_table, table):
+                self.assertEqual([record[key] for key in row], row.values())
+        self.assertEqual(repr(records_from_table(tables['enrollments'], EnrollmentRecord)[0]),
+                         repr(tables['enrollments'][0]))
+
+    def test_unencoded_table(self):
+        table = load_daily_engagement(os.path.join(DATA_DIR, 'daily_engagement.csv'))
+        self.assertEqual(records_from_table(table, EngagementRecord),
+                         load_engagement_records(os.path.join(DATA_DIR, 'daily_engagement.csv')))
+
+    def test_columns_must_match(self):
+        tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        self.assertRaises(ValueError, records_from_table, tables['enrollments'], EngagementRecord)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.render import MANIFEST, FigureJob, FigureRenderer, digest_of
+from tests.helpers import TempDirTestCase, printed_by
+
+
+def draw_line(plt, values, title):
+    plt.plot(values)
+    plt.title(title)
+
+def draw_bars(plt, values, title):
+    plt.bar(range(len(values)), values)
+    plt.title(title)
+
+
+class DigestTest(unittest.TestCase):
+
+    def test_same_contents_same_digest(self):
+        values = np.arange(10.0)
+        self.assertEqual(digest_of((draw_line, [values, 'a'])),
+                         digest_of((draw_line, [values.copy(), 'a'])))
+        self.assertEqual(digest_of({'b': 1, 'a': 2}), digest_of({'a': 2, 'b': 1}))
+
+    def test_any_change_changes_the_digest(self):
+        values = np.arange(10.0)
+        digest = digest_of((draw_line, [values, 'a']))
+        for changed in [(draw_bars, [values, 'a']),
+                        (draw_line, [values, 'b']),
+                        (draw_line, [values + 1, 'a']),
+                        (draw_line, [values.astype(np.float32), 'a']),
+                        (draw_line, [values.reshape(2, 5), 'a'])]:
+            self.assertNotEqual(digest_of(changed), digest)
+
+
+class FigureRendererTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.plot_dir = os.path.join(self.temp_dir, 'plots')
+        self.jobs = [FigureJob('line', draw_line, (np.arange(5.0), 'line')),
+                     FigureJob('bars', draw_bars, ([3, 1, 2], 'bars'))]
+
+    def renderer(self, **options):
+        options.setdefault('processes', 0)
+        return FigureRenderer(self.plot_dir, **options)
+
+    # Submits the jobs to a new renderer, and returns it once they're saved.
+    def render(self, jobs, **options):
+        renderer = self.renderer(**options)
+        printed_by(renderer.submit, jobs)
+        printed_by(renderer.close)
+        return renderer
+
+    def manifest(self):
+        with open(os.path.join(self.plot_dir, MANIFEST)) as f:
+            return json.load(f)
+
+    def test_saves_figures_and_manifest(self):
+        renderer = self.render(self.jobs)
+        paths = [os.path.join(self.plot_dir, name) for name in ['line.png', 'bars.png']]
+        self.assertEqual(renderer.saved, paths)
+        for path in paths:
+            self.assertTrue(os.path.getsize(path) > 0, path)
+        self.assertEqual(self.manifest(),
+                         dict((job.name + '.png', digest_of((job.draw, job.args)))
+                              for job in self.jobs))
+
+    def test_worker_processes(self):
+        renderer = self.render(self.jobs, processes=2, format='svg')
+        self.assertEqual(sorted(os.path.basename(path) for path in renderer.saved),
+                         ['bars.svg', 'line.svg'])
+        self.assertEqual(sorted(self.manifest()), ['bars.svg', 'line.svg'])
+        self.assertEqual(renderer.pending, [])
+
+    def test_skip_unchanged(self):
+        self.render(self.jobs)
+        mtime = os.path.getmtime(os.path.join(self.plot_dir, 'line.png'))
+        renderer = self.render(self.jobs, skip_unchanged=True)
+        self.assertEqual(renderer.saved, [])
+        self.assertEqual([os.path.basename(path) for path in renderer.skipped],
+                         ['line.png', 'bars.png'])
+        self.assertEqual(os.path.getmtime(os.path.join(self.plot_dir, 'line.png')), mtime)
+
+    def test_changed_or_missing_figures_are_drawn_again(self):
+        self.render(self.jobs)
+        os.remove(os.path.join(self.plot_dir, 'bars.png'))
+        changed = [FigureJob('line', draw_line, (np.arange(6.0), 'line')), self.jobs[1]]
+        renderer = self.render(changed, skip_unchanged=True)
+        self.assertEqual([os.path.basename(path) for path in renderer.saved],
+                         ['line.png', 'bars.png'])
+        self.assertEqual(renderer.skipped, [])
+        self.assertEqual(self.manifest()['line.png'], digest_of((draw_line, changed[0].args)))
+
+    def test_without_skip_unchanged_everything_is_drawn(self):
+        self.render(self.jobs)
+        renderer = self.render(self.jobs)
+        self.assertEqual(len(renderer.saved), 2)
+        self.assertEqual(renderer.skipped, [])
+
+    def test_manifest_keeps_other_figures(self):
+        self.render(self.jobs)
+        self.render([FigureJob('line', draw_line, (np.arange(6.0), 'line'))])
+        self.assertEqual(sorted(self.manifest()), ['bars.png', 'line.png'])
+
+    def test_unreadable_manifest_is_ignored(self):
+        os.makedirs(self.plot_dir)
+        with open(os.path.join(self.plot_dir, MANIFEST), 'w') as f:
+            f.write('not json')
+        renderer = self.render(self.jobs, skip_unchanged=True)
+        self.assertEqual(len(renderer.saved), 2)
+        self.assertEqual(sorted(self.manifest()), ['bars.png', 'line.png'])
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, self.renderer, format='jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
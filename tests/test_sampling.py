@@ -0,0 +1,104 @@
+import os
+import pickle
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.columnar import load_table
+from l1_analysis.ingest import FILES, load_all_parallel
+from l1_analysis.sampling import (
+    MAX_CACHED_KEYS,
+    SAMPLE_ENV_VARIABLE,
+    SEED_ENV_VARIABLE,
+    AccountSample,
+    sample_from_environment,
+)
+from tests.helpers import DATA_DIR, TempDirTestCase, table_differences
+
+
+class AccountSampleTest(unittest.TestCase):
+
+    def test_keys_kept(self):
+        keys = np.array([unicode(key) for key in range(10000)])
+        sample = AccountSample(0.2)
+        kept = sample.keeps(keys)
+        self.assertTrue(0.18 < kept.mean() < 0.22)
+        self.assertEqual(kept.tolist(), [AccountSample(0.2).keeps_key(key) for key in keys])
+        # a larger fraction keeps the same accounts, and more
+        self.assertTrue((AccountSample(0.5).keeps(keys) >= kept).all())
+        self.assertNotEqual(AccountSample(0.2, seed=1).keeps(keys).tolist(), kept.tolist())
+        self.assertTrue(AccountSample(1.0).keeps(keys).all())
+
+    def test_remembered_keys_are_bounded(self):
+        sample = AccountSample(0.2)
+        keys = [unicode(key) for key in xrange(MAX_CACHED_KEYS + 10)]
+        kept = [sample.keeps_key(key) for key in keys]
+        self.assertTrue(len(sample._kept) <= MAX_CACHED_KEYS)
+        self.assertEqual([sample.keeps_key(key) for key in keys], kept)
+        self.assertTrue(len(sample._kept) <= MAX_CACHED_KEYS)
+
+    def test_fraction_checked(self):
+        for fraction in [0, -0.1, 1.5]:
+            self.assertRaises(ValueError, AccountSample, fraction)
+
+    def test_pickled_without_seen_keys(self):
+        sample = AccountSample(0.3, seed=2)
+        sample.keeps_key(u'448')
+        copy = pickle.loads(pickle.dumps(sample))
+        self.assertEqual(copy._kept, {})
+        self.assertEqual(copy.keeps_key(u'448'), sample.keeps_key(u'448'))
+        self.assertEqual(copy.name, sample.name)
+
+    def test_from_environment(self):
+        saved = dict((name, os.environ.pop(name, None))
+                     for name in [SAMPLE_ENV_VARIABLE, SEED_ENV_VARIABLE])
+        try:
+            self.assertTrue(sample_from_environment() is None)
+            os.environ[SAMPLE_ENV_VARIABLE] = '0.25'
+            os.environ[SEED_ENV_VARIABLE] = '3'
+            sample = sample_from_environment()
+            self.assertEqual((sample.fraction, sample.seed), (0.25, 3))
+        finally:
+            for name, value in saved.items():
+                os.environ.pop(name, None)
+                if value is not None:
+                    os.environ[name] = value
+
+
+# The sampled loads hold exactly the rows of the sampled accounts, in the
+# same order, whether read serially or in parallel.
+class SampledLoadTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.sample = AccountSample(0.5)
+
+    def expected(self, name, filename, types):
+        table = load_table(os.path.join(DATA_DIR, filename), types)
+        keys = table[table.names[self.sample.key_position(table.names)]]
+        return table.take(self.sample.keeps(keys))
+
+    def test_serial_and_parallel(self):
+        parallel = load_all_parallel(DATA_DIR, 2, chunk_bytes=512, sample=self.sample)
+        for name, filename, types in FILES:
+            expected = self.expected(name, filename, types)
+            self.assertTrue(len(expected) > 0, name)
+            sampled = load_table(os.path.join(DATA_DIR, filename), types, sample=self.sample)
+            self.assertEqual(table_differences(expected, sampled), [], name)
+            self.assertEqual(table_differences(expected, parallel[name]), [], name)
+
+    def test_cleaned_tables(self):
+        cache_dir = self.cache_dir()
+        full = load_cleaned_tables(DATA_DIR, cache_dir)
+        sampled = load_cleaned_tables(DATA_DIR, cache_dir, sample=self.sample)
+        self.assertTrue(os.path.exists(os.path.join(cache_dir, self.sample.name, 'manifest.json')))
+        for name in ['non_udacity_enrollments', 'non_udacity_engagement',
+                     'non_udacity_submissions']:
+            keys = full[name].decode('account_key')
+            self.assertEqual(sampled[name].decode('account_key').tolist(),
+                             keys[self.sample.keeps(keys)].tolist(), name)
+
+
+if __name__ == '__main__':
+    unittest.main()
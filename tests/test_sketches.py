@@ -0,0 +1,122 @@
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.columnar import ENGAGEMENT_TYPES, iter_table_chunks, load_daily_engagement
+from l1_analysis.encoding import make_encoders
+from l1_analysis.sketches import (
+    ApproximateStats,
+    HyperLogLog,
+    QuantileSketch,
+    SampledHistogram,
+    count_keys,
+)
+from tests.helpers import DATA_DIR
+
+
+# The sketches against exact answers on random data: the estimates should be
+# within their error bounds.
+class HyperLogLogTest(unittest.TestCase):
+
+    def test_within_bounds(self):
+        random = np.random.RandomState(0)
+        for size in [100, 5000, 200000]:
+            keys = random.randint(0, size, size)
+            for values in [keys, np.array(['account %d' % key for key in keys[:20000]])]:
+                sketch = HyperLogLog()
+                for start in xrange(0, len(values), 1000):
+                    sketch.add_values(values[start:start + 1000])
+                low, high = sketch.bounds(sigmas=3)
+                exact = len(np.unique(values))
+                self.assertTrue(low <= exact <= high, (exact, low, high))
+
+    def test_merge(self):
+        keys = np.arange(30000)
+        merged = HyperLogLog.from_values(keys[:20000]).merge(HyperLogLog.from_values(keys[10000:]))
+        np.testing.assert_array_equal(merged.registers, HyperLogLog.from_values(keys).registers)
+        self.assertRaises(ValueError, merged.merge, HyperLogLog(10))
+
+    # Counting the students chunk by chunk, as the sketch is meant to be used.
+    def test_column_chunks(self):
+        students = HyperLogLog()
+        keys = set()
+        for chunk in iter_table_chunks(os.path.join(DATA_DIR, 'daily_engagement.csv'),
+                                       ENGAGEMENT_TYPES, 500, make_encoders()):
+            students.add_column(chunk, 'acct')
+            keys.update(chunk.decode('acct').tolist())
+        low, high = students.bounds()
+        self.assertTrue(low <= len(keys) <= high)
+        filename = os.path.join(DATA_DIR, 'daily_engagement.csv')
+        num_rows, counted = count_keys(filename, ENGAGEMENT_TYPES, 'acct', 500)
+        self.assertEqual(num_rows, len(load_daily_engagement(filename)))
+        np.testing.assert_array_equal(counted.registers, students.registers)
+
+    def test_repeated_keys(self):
+        keys = np.random.RandomState(2).randint(0, 1000, 50000)
+        np.testing.assert_array_equal(HyperLogLog.from_values(keys).registers,
+                                      HyperLogLog.from_values(np.unique(keys)).registers)
+
+
+class QuantileSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.minutes = random.exponential(400, 200000)
+        self.minutes[random.random_sample(len(self.minutes)) < 0.1] = 0
+        self.sorted_minutes = np.sort(self.minutes)
+
+    def assert_within_bounds(self, sketch):
+        count = len(self.minutes)
+        for q in np.linspace(0, 1, 101):
+            low, high = sketch.quantile_bounds(q)
+            exact = self.sorted_minutes[min(int(q * count), count - 1)]
+            self.assertTrue(low <= exact <= high, (q, low, exact, high))
+            if q > 0.1:
+                rank = np.searchsorted(self.sorted_minutes, sketch.quantile(q),
+                                       side='right') / float(count)
+                self.assertTrue(abs(rank - q) <= sketch.rank_error, (q, rank))
+
+    def test_chunks(self):
+        sketch = QuantileSketch()
+        for start in xrange(0, len(self.minutes), 10000):
+            sketch.add_values(self.minutes[start:start + 10000])
+        self.assert_within_bounds(sketch)
+        self.assertTrue(sketch.num_kept < len(self.minutes) / 100)
+
+    def test_merge(self):
+        halves = [QuantileSketch(seed=1), QuantileSketch(seed=2)]
+        for start in xrange(0, len(self.minutes), 10000):
+            halves[start // 10000 % 2].add_values(self.minutes[start:start + 10000])
+        self.assert_within_bounds(halves[0].merge(halves[1]))
+
+    def test_approximate_stats(self):
+        stats = ApproximateStats.from_values(self.minutes)
+        self.assertEqual(stats.count, len(self.minutes))
+        self.assertEqual(stats.min, self.minutes.min())
+        self.assertEqual(stats.max, self.minutes.max())
+        np.testing.assert_allclose([stats.mean, stats.std],
+                                   [self.minutes.mean(), self.minutes.std()])
+        low, high = stats.quantile_bounds(0.5)
+        self.assertTrue(low <= np.median(self.minutes) <= high)
+
+
+class SampledHistogramTest(unittest.TestCase):
+
+    def test_within_errors(self):
+        lessons = np.random.RandomState(0).poisson(4, 300000)
+        counts, edges, errors = SampledHistogram.from_values(lessons).counts(10, [0, 10])
+        exact, exact_edges = np.histogram(lessons, 10, range=[0, 10])
+        np.testing.assert_array_equal(edges, exact_edges)
+        self.assertTrue((np.abs(counts - exact) <= 4 * errors + 1).all())
+
+    # With every value in the sample, the counts are exact.
+    def test_small_data_is_exact(self):
+        lessons = np.random.RandomState(1).poisson(4, 1000)
+        counts, edges, errors = SampledHistogram.from_values(lessons).counts(8)
+        np.testing.assert_array_equal(counts, np.histogram(lessons, 8)[0])
+        self.assertEqual(errors.tolist(), [0] * 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
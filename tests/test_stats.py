@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+
+from l1_analysis.stats import RunningStats, merge_all, summarize
+
+
+class RunningStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.values = random.exponential(40.0, 5000)
+        self.integers = random.randint(0, 12, 5000)
+
+    def assert_matches_numpy(self, stats, values):
+        self.assertEqual(stats.count, len(values))
+        self.assertEqual(stats.min, np.min(values))
+        self.assertEqual(stats.max, np.max(values))
+        np.testing.assert_allclose([stats.mean, stats.std], [np.mean(values), np.std(values)],
+                                   rtol=1e-12)
+
+    def test_from_values_is_exactly_numpy(self):
+        for values in [self.values, self.integers, [3.5]]:
+            stats = RunningStats.from_values(values)
+            self.assertEqual(stats.mean, np.mean(values))
+            self.assertEqual(stats.std, np.std(values))
+            self.assertEqual(stats.min, np.min(values))
+            self.assertEqual(stats.max, np.max(values))
+
+    def test_one_value_at_a_time(self):
+        stats = RunningStats()
+        for value in self.values.tolist():
+            stats.add(value)
+        self.assert_matches_numpy(stats, self.values)
+
+    def test_merged_chunks_match_numpy(self):
+        for values in [self.values, self.integers]:
+            for bounds in [[0, 1, 5000], [0, 2500, 5000], [0, 7, 1000, 1001, 4990, 5000]]:
+                chunks = [RunningStats.from_values(values[start:end])
+                          for start, end in zip(bounds[:-1], bounds[1:])]
+                self.assert_matches_numpy(merge_all(chunks), values)
+
+    def test_merge_with_empty(self):
+        stats = RunningStats.from_values(self.values)
+        stats.merge(RunningStats())
+        self.assert_matches_numpy(stats, self.values)
+        self.assert_matches_numpy(RunningStats().merge(stats), self.values)
+        self.assertTrue(np.isnan(RunningStats().mean))
+        self.assertTrue(np.isnan(merge_all([]).std))
+
+    def test_summarize(self):
+        stats = RunningStats.from_values(self.values)
+        self.assertTrue(summarize(stats) is stats)
+        self.assertEqual(summarize(self.values.tolist()).mean, np.mean(self.values))
+
+
+class ReservoirTest(unittest.TestCase):
+
+    def setUp(self):
+        self.values = np.random.RandomState(1).normal(100.0, 15.0, 20000)
+
+    def test_exact_while_everything_is_kept(self):
+        stats = RunningStats.from_values(self.values[:200], sample_size=500)
+        for q in [0.0, 0.1, 0.5, 0.9, 1.0]:
+            self.assertEqual(stats.quantile(q), np.percentile(self.values[:200], 100 * q))
+        stats = merge_all([RunningStats.from_values(self.values[:100], sample_size=500),
+                           RunningStats.from_values(self.values[100:200], sample_size=500)])
+        self.assertEqual(stats.median(), np.median(self.values[:200]))
+
+    def test_sample_is_bounded_and_close(self):
+        for stats in [RunningStats.from_values(self.values, sample_size=1000),
+                      merge_all([RunningStats.from_values(chunk, sample_size=1000)
+                                 for chunk in np.array_split(self.values, 7)])]:
+            self.assertEqual(len(stats.sample), 1000)
+            self.assertTrue(np.in1d(stats.sample, self.values).all())
+            # the median of a 1000 value sample is within a few percent of
+            # the distribution's spread
+            self.assertTrue(abs(stats.median() - np.median(self.values)) < 2.0)
+
+    def test_merge_draws_in_proportion(self):
+        zeros = RunningStats.from_values(np.zeros(10000), sample_size=400)
+        ones = RunningStats.from_values(np.ones(30000), sample_size=400)
+        merged = zeros.merge(ones)
+        self.assertEqual(len(merged.sample), 400)
+        self.assertEqual(merged.sample.count(0.0), 100)
+
+    def test_added_one_at_a_time(self):
+        stats = RunningStats(sample_size=500, seed=3)
+        for value in self.values.tolist():
+            stats.add(value)
+        self.assertEqual(len(stats.sample), 500)
+        self.assertTrue(abs(stats.median() - np.median(self.values)) < 3.0)
+
+    def test_quantile_needs_a_sample(self):
+        self.assertRaises(ValueError, RunningStats.from_values(self.values).median)
+
+
+if __name__ == '__main__':
+    unittest.main()
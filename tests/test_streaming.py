@@ -0,0 +1,158 @@
+from collections import defaultdict
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis import __main__ as cli
+from l1_analysis.analysis import Analysis, dependency_order
+from l1_analysis.incremental import read_students
+from l1_analysis.records import load_engagement_records, load_enrollment_records
+from l1_analysis.sampling import AccountSample
+from l1_analysis.streaming import FirstWeekAggregates, stream_first_week_engagement
+from tests.helpers import DATA_DIR, TempDirTestCase, printed_by
+
+TOTALS_COLUMNS = ['num_engagements', 'total_minutes_visited', 'lessons_completed',
+                  'days_visited']
+
+
+## The in-memory path, as written in L1_Starter_Code.py
+
+def find_udacity_test_accounts(enrollments):
+    udacity_test_accounts = set()
+    for enrollment in enrollments:
+        if enrollment['is_udacity']:
+            udacity_test_accounts.add(enrollment['account_key'])
+    return udacity_test_accounts
+
+def find_paid_students(enrollments, udacity_test_accounts):
+    paid_students = {}
+    for enrollment in enrollments:
+        student = enrollment['account_key']
+        if student in udacity_test_accounts:
+            continue
+        if (enrollment['is_canceled'] == False) or \
+                ((enrollment['cancel_date'] - enrollment['join_date']).days > 7):
+            date_enrolled = enrollment['join_date']
+            if (student not in paid_students) or (date_enrolled > paid_students[student]):
+                paid_students[student] = date_enrolled
+    return paid_students
+
+# Builds FirstWeekAggregates from the notebook's engagement_by_account dict.
+def aggregates_from_engagement_by_account(engagement_by_account):
+    aggregates = FirstWeekAggregates()
+    for account_key, engagements in engagement_by_account.items():
+        total_minutes = 0
+        lessons_completed = 0
+        days_visited = 0
+        for engagement in engagements:
+            total_minutes += engagement['total_minutes_visited']
+            lessons_completed += engagement['lessons_completed']
+            if engagement['num_courses_visited'] > 0:
+                days_visited += 1
+        aggregates.num_engagements += len(engagements)
+        aggregates.num_engagements_by_account[account_key] = len(engagements)
+        aggregates.total_minutes_by_account[account_key] = total_minutes
+        aggregates.lessons_completed_by_account[account_key] = lessons_completed
+        aggregates.days_visited_by_account[account_key] = days_visited
+    return aggregates
+
+def in_memory_first_week_engagement(udacity_test_accounts, paid_students,
+                                    filename='daily_engagement.csv', days=7):
+    # dict-like rows, with 'acct' already available as 'account_key'
+    daily_engagement = load_engagement_records(filename)
+    engagement_by_account = defaultdict(list)
+    for engagement in daily_engagement:
+        student = engagement['account_key']
+        if student in udacity_test_accounts or student not in paid_students:
+            continue
+        time_delta = engagement['utc_date'] - paid_students[student]
+        if (time_delta.days < days) and (time_delta.days >= 0):
+            engagement_by_account[student].append(engagement)
+    return aggregates_from_engagement_by_account(engagement_by_account)
+
+
+# The streaming aggregates against the notebook's in-memory loop.
+class StreamFirstWeekEngagementTest(unittest.TestCase):
+
+    def setUp(self):
+        self.udacity_test_accounts, self.paid_students = read_students(DATA_DIR)
+        self.filename = os.path.join(DATA_DIR, 'daily_engagement.csv')
+
+    def test_students_match_notebook(self):
+        enrollments = load_enrollment_records(os.path.join(DATA_DIR, 'enrollments.csv'))
+        udacity_test_accounts = find_udacity_test_accounts(enrollments)
+        self.assertEqual(self.udacity_test_accounts, udacity_test_accounts)
+        self.assertEqual(self.paid_students,
+                         find_paid_students(enrollments, udacity_test_accounts))
+
+    def test_matches_in_memory_path_for_any_chunk_size(self):
+        expected = in_memory_first_week_engagement(self.udacity_test_accounts,
+                                                   self.paid_students, self.filename)
+        self.assertTrue(expected.num_engagements > 0)
+        for chunk_size in [1, 7, 100, 1000000]:
+            streamed = stream_first_week_engagement(self.udacity_test_accounts,
+                                                    self.paid_students, self.filename, chunk_size)
+            self.assertEqual(streamed, expected, 'chunk_size=%d' % chunk_size)
+
+    def test_skips_udacity_accounts(self):
+        streamed = stream_first_week_engagement(self.udacity_test_accounts, self.paid_students,
+                                                self.filename, 50)
+        self.assertFalse(self.udacity_test_accounts & set(streamed.students))
+
+    def test_sample_keeps_only_sampled_accounts(self):
+        sample = AccountSample(0.5)
+        full = stream_first_week_engagement(self.udacity_test_accounts, self.paid_students,
+                                            self.filename)
+        sampled = stream_first_week_engagement(self.udacity_test_accounts, self.paid_students,
+                                               self.filename, 50, sample=sample)
+        kept = [key for key in full.students if sample.keeps_key(key)]
+        self.assertEqual(sorted(sampled.students), sorted(kept))
+        for key in kept:
+            self.assertEqual(sampled.num_engagements_by_account[key],
+                             full.num_engagements_by_account[key])
+            self.assertEqual(sampled.total_minutes_by_account[key],
+                             full.total_minutes_by_account[key])
+
+
+# Analysis(streaming=True) against the in-memory datasets and reports.
+class StreamingAnalysisTest(TempDirTestCase):
+
+    def analysis(self, streaming):
+        return Analysis(DATA_DIR, self.cache_dir('streaming' if streaming else 'exact'),
+                        plot_dir=self.temp_dir, streaming=streaming)
+
+    def test_first_week_totals_match(self):
+        exact = self.analysis(False)['first_week_totals']
+        streamed = self.analysis(True)['first_week_totals']
+        self.assertEqual(exact['account_key'].tolist(), streamed['account_key'].tolist())
+        for name in TOTALS_COLUMNS:
+            np.testing.assert_allclose(streamed[name], exact[name], err_msg=name)
+        self.assertEqual(exact.decode('account_key').tolist(),
+                         streamed.decode('account_key').tolist())
+
+    def test_reports_print_the_same(self):
+        exact = self.analysis(False)
+        streamed = self.analysis(True)
+        for name in ['table_sizes', 'unengaged_students', 'first_week', 'passing']:
+            self.assertEqual(printed_by(streamed.run_report, name),
+                             printed_by(exact.run_report, name), name)
+
+    def test_engagement_table_is_not_loaded(self):
+        analysis = self.analysis(True)
+        for name in ['table_sizes', 'unengaged_students', 'first_week', 'passing']:
+            self.assertFalse('daily_engagement' in dependency_order(name, streaming=True), name)
+            printed_by(analysis.run_report, name)
+        self.assertFalse(set(['daily_engagement', 'non_udacity_engagement']) &
+                         set(analysis.computed))
+
+    def test_command_line_switch(self):
+        def run(*options):
+            output = printed_by(cli.main, ['--data-dir', DATA_DIR, '--cache-dir',
+                                           self.cache_dir(), 'first_week'] + list(options))
+            return [line for line in output.splitlines() if not line.startswith('(')]
+        self.assertEqual(run('--streaming'), run())
+
+
+if __name__ == '__main__':
+    unittest.main()
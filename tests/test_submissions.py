@@ -0,0 +1,96 @@
+import os
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.columnar import load_project_submissions
+from l1_analysis.first_week import find_paid_students, find_passing_students
+from l1_analysis.submissions import SubmissionIndex
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+SUBWAY_PROJECT_LESSON_KEYS = ['746169184', '3176718735']
+PASSING_VALUES = ['PASSED', 'DISTINCTION']
+RATING_SETS = [PASSING_VALUES, ['PASSED'], ['INCOMPLETE', 'UNGRADED'], ['NO SUCH RATING']]
+
+
+# The index against scans of the submissions, for every lesson and several
+# sets of ratings.
+class SubmissionIndexTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        self.submissions = tables['non_udacity_submissions']
+        self.paid_accounts, self.paid_join_dates = find_paid_students(
+            tables['non_udacity_enrollments'])
+        self.index = SubmissionIndex(self.submissions)
+        lesson_keys = np.unique(self.submissions.decode('lesson_key')).tolist()
+        self.lesson_sets = ([[lesson_key] for lesson_key in lesson_keys] +
+                            [lesson_keys[:2], SUBWAY_PROJECT_LESSON_KEYS, ['no such lesson']])
+
+    # The (account, completion date) of every submission for one of
+    # lesson_keys rated one of ratings.
+    def matches(self, lesson_keys, ratings):
+        is_match = (np.in1d(self.submissions.decode('lesson_key'), lesson_keys) &
+                    np.in1d(self.submissions['assigned_rating'], ratings))
+        return zip(self.submissions['account_key'][is_match].tolist(),
+                   self.submissions['completion_date'][is_match])
+
+    # account -> the earliest completion date of its matching submissions
+    # (those without a date don't count).
+    def first_days(self, lesson_keys, ratings):
+        first = {}
+        for account, day in self.matches(lesson_keys, ratings):
+            if str(day) != 'NaT':
+                first[account] = min(first.get(account, day), day)
+        return first
+
+    def test_students(self):
+        for lesson_keys in self.lesson_sets:
+            for ratings in RATING_SETS:
+                for students in [None, self.paid_accounts]:
+                    np.testing.assert_array_equal(
+                        self.index.students(lesson_keys, ratings, students),
+                        find_passing_students(self.submissions, lesson_keys, ratings, students),
+                        err_msg='%s %s' % (lesson_keys, ratings))
+
+    def test_rows(self):
+        for lesson_keys in self.lesson_sets:
+            rows = self.index.rows(lesson_keys, PASSING_VALUES)
+            is_match = (np.in1d(self.submissions.decode('lesson_key'), lesson_keys) &
+                        np.in1d(self.submissions['assigned_rating'], PASSING_VALUES))
+            self.assertEqual(sorted(rows.tolist()), np.flatnonzero(is_match).tolist())
+
+    def test_first_pass_dates(self):
+        for lesson_keys in self.lesson_sets:
+            for ratings in RATING_SETS:
+                first = self.first_days(lesson_keys, ratings)
+                accounts, days = self.index.first_pass_dates(lesson_keys, ratings)
+                self.assertEqual(accounts.tolist(), sorted(first))
+                self.assertEqual(days.tolist(), [first[account].tolist()
+                                                 for account in accounts.tolist()])
+
+    def test_passed_within(self):
+        join_dates = dict(zip(self.paid_accounts.tolist(), self.paid_join_dates))
+        first = self.first_days(SUBWAY_PROJECT_LESSON_KEYS, PASSING_VALUES)
+        for days in [1, 30, 1000]:
+            expected = [account for account in self.paid_accounts.tolist() if account in first
+                        and (first[account] - join_dates[account]).astype(int) < days]
+            within = self.index.passed_within(SUBWAY_PROJECT_LESSON_KEYS, PASSING_VALUES,
+                                              self.paid_accounts, self.paid_join_dates, days)
+            self.assertEqual(within.tolist(), expected)
+        self.assertTrue(len(expected) > 0)
+
+    # Without encoded keys, the index gives the same students as strings.
+    def test_unencoded_table(self):
+        submissions = load_project_submissions(os.path.join(DATA_DIR, 'project_submissions.csv'))
+        index = SubmissionIndex(submissions)
+        for lesson_keys in self.lesson_sets:
+            np.testing.assert_array_equal(
+                index.students(lesson_keys, PASSING_VALUES),
+                find_passing_students(submissions, lesson_keys, PASSING_VALUES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import numpy as np
+
+from l1_analysis.cache import load_cleaned_tables
+from l1_analysis.first_week import find_paid_students, first_week_engagement_rows
+from l1_analysis.groupby import engagement_totals
+from l1_analysis.windows import DayOffsetIndex
+from tests.helpers import DATA_DIR, TempDirTestCase
+
+
+class DayOffsetIndexTest(TempDirTestCase):
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        tables = load_cleaned_tables(DATA_DIR, self.cache_dir())
+        self.engagement = tables['non_udacity_engagement']
+        self.paid_accounts, self.paid_join_dates = find_paid_students(
+            tables['non_udacity_enrollments'])
+        self.index = DayOffsetIndex(self.engagement, self.paid_accounts, self.paid_join_dates)
+
+    # The rows within [start, end) days of joining, one row at a time.
+    def loop_window_rows(self, start, end, accounts=None):
+        join_dates = dict(zip(self.paid_accounts.tolist(), self.paid_join_dates))
+        rows = []
+        for row, (account, date) in enumerate(zip(self.engagement['account_key'].tolist(),
+                                                  self.engagement['utc_date'])):
+            if account not in join_dates or (accounts is not None and account not in accounts):
+                continue
+            days = (date - join_dates[account]).astype(int)
+            if start <= days < end:
+                rows.append(row)
+        return rows
+
+    def test_first_week_matches_first_week_engagement_rows(self):
+        expected = first_week_engagement_rows(self.engagement, self.paid_accounts,
+                                              self.paid_join_dates)
+        self.assertTrue(len(expected) > 0)
+        np.testing.assert_array_equal(self.index.window_rows(0, 7), expected)
+
+    def test_other_windows(self):
+        for start, end in [(0, 14), (7, 14), (0, 30), (-3, 2), (500, 600)]:
+            self.assertEqual(self.index.window_rows(start, end).tolist(),
+                             self.loop_window_rows(start, end), (start, end))
+
+    def test_cohort(self):
+        accounts = self.paid_accounts[::3]
+        rows = self.index.window_rows(0, 30, accounts)
+        self.assertEqual(rows.tolist(), self.loop_window_rows(0, 30, set(accounts.tolist())))
+        totals = self.index.window_totals(0, 30, accounts)
+        expected = engagement_totals(self.engagement.take(rows))
+        for name in expected.names:
+            np.testing.assert_array_equal(totals[name], expected[name])
+
+
+if __name__ == '__main__':
+    unittest.main()